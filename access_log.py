@@ -0,0 +1,150 @@
+"""Background writer that persists access decisions to the access_events table."""
+import collections
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import database
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+
+class AccessLogWriter:
+    """Queues access events and writes them to SQLite in batches on its own thread.
+
+    Recognition threads only append to an in-memory queue; a writer thread
+    inserts up to `batch_size` events per transaction, at least every
+    `flush_interval` seconds. A grant for the same person at the same door
+    within `dedup_window` seconds of the last logged one is skipped. When
+    `max_pending` events are waiting, `policy` decides: DROP_OLDEST (default)
+    discards the oldest queued event, DROP_NEWEST discards the new one, and
+    BLOCK makes the caller wait up to `block_timeout` seconds for room.
+
+    Has the events-sink interface (emit/close), so it can be used wherever a
+    sink from events.py can.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, dedup_window: float = 30.0,
+                 max_pending: int = 10000, policy: str = DROP_OLDEST, block_timeout: float = 1.0):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Unknown policy {policy!r}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self.max_pending = max_pending
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.written = 0
+        self.deduped = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self._pending = collections.deque()
+        self._inflight = 0
+        self._flushing = False
+        self._last_grant: Dict[tuple, float] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self) -> "AccessLogWriter":
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+        return self
+
+    def emit(self, event: dict) -> bool:
+        """Queue one events.decision_event() dict. Returns False if it was deduplicated or dropped."""
+        with self._cond:
+            if event["granted"]:
+                key = (event.get("door"), event["name"])
+                last = self._last_grant.get(key)
+                if last is not None and event["time"] - last < self.dedup_window:
+                    self.deduped += 1
+                    return False
+                self._last_grant[key] = event["time"]
+            if len(self._pending) >= self.max_pending:
+                if self.policy == BLOCK:
+                    self._cond.wait_for(lambda: len(self._pending) < self.max_pending or self._closed,
+                                        self.block_timeout)
+                if len(self._pending) >= self.max_pending:
+                    self.dropped += 1
+                    if self.policy != DROP_OLDEST:
+                        return False
+                    self._pending.popleft()
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._pending) >= self.batch_size or self._closed or self._flushing,
+                                self.flush_interval)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._inflight = len(batch)
+            # Wake callers blocked on a full queue
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+                with self._cond:
+                    self._inflight = 0
+                    self._cond.notify_all()
+            elif self._closed:
+                break
+            self._forget_old_grants()
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            database.add_access_events(batch)
+        except Exception:
+            # Never let the audit log take recognition down; the batch is counted as lost
+            self.errors += 1
+            self.dropped += len(batch)
+            return
+        self.written += len(batch)
+        self.batches += 1
+        self.last_batch_ms = 1000 * (time.perf_counter() - start)
+
+    def _forget_old_grants(self):
+        with self._cond:
+            if len(self._last_grant) > 1000:
+                cutoff = time.time() - self.dedup_window
+                self._last_grant = {k: t for k, t in self._last_grant.items() if t >= cutoff}
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until everything queued so far has been written."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout)
+            self._flushing = False
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is still queued and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        elif self._pending:
+            self._write(list(self._pending))
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"written": self.written, "pending": len(self._pending), "deduped": self.deduped,
+                "dropped": self.dropped, "errors": self.errors, "batches": self.batches,
+                "last_batch_ms": self.last_batch_ms}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"access log: {s['written']} written in {s['batches']} batches ({s['last_batch_ms']:.1f}ms last), "
+                f"{s['pending']} pending, {s['deduped']} deduped, {s['dropped']} dropped")
@@ -1,106 +1,216 @@
-import cv2
-import sys
-import os
-import json
-import sqlite3
-import numpy as np
-from deepface import DeepFace
-import database
-
-# Use the same database initialization
-database.init_db()
-
-def capture_face(name):
-    print(f"Starting camera to capture face for '{name}'...")
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
-        print("Error: Could not open camera.")
-        return
-    
-    print("Look at the camera. Press 'c' to capture or 'q' to quit.")
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not read frame.")
-            break
-        
-        # Display the frame
-        cv2.imshow("Capture Face - Press 'c' to capture", frame)
-        
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('c'):
-            # Save temporary image for DeepFace
-            temp_path = f"temp_{name}.jpg"
-            cv2.imwrite(temp_path, frame)
-            
-            try:
-                # Extract face embedding
-                print(f"Extracting embedding for '{name}'...")
-                # DeepFace.represent returns a list of results (one per face)
-                results = DeepFace.represent(img_path=temp_path, model_name='VGG-Face', enforce_detection=True)
-                
-                if results and len(results) > 0:
-                    embedding = results[0]["embedding"]
-                    # Add to database
-                    database.add_member(name, embedding)
-                    print(f"Successfully added member '{name}' to database.")
-                    os.remove(temp_path)
-                    break
-                else:
-                    print("No face detected. Please try again.")
-                    os.remove(temp_path)
-            except Exception as e:
-                print(f"Error during extraction: {e}")
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-        
-        elif key == ord('q'):
-            print("Capture cancelled.")
-            break
-            
-    cap.release()
-    cv2.destroyAllWindows()
-
-def list_members():
-    members = database.get_all_members()
-    print("--- Current Members ---")
-    for idx, member in enumerate(members):
-        print(f"{idx + 1}. {member['name']}")
-    print("-----------------------")
-
-def delete_member(name):
-    # For simplicity, we can add a delete function in database.py
-    # or just use a placeholder here for now
-    conn = sqlite3.connect(database.DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM members WHERE name = ?", (name,))
-    conn.commit()
-    conn.close()
-    print(f"Member '{name}' deleted if existed.")
-
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python admin.py [add|list|delete] [name]")
-        return
-    
-    cmd = sys.argv[1].lower()
-    
-    if cmd == "add":
-        if len(sys.argv) < 3:
-            print("Usage: python admin.py add <name>")
-            return
-        capture_face(sys.argv[2])
-    elif cmd == "list":
-        list_members()
-    elif cmd == "delete":
-        if len(sys.argv) < 3:
-            print("Usage: python admin.py delete <name>")
-            return
-        delete_member(sys.argv[2])
-    else:
-        print("Unknown command.")
-
-if __name__ == "__main__":
-    main()
+import csv
+import sys
+import os
+import time
+from datetime import datetime
+import database
+import embedding_models
+
+# Use the same database initialization
+database.init_db()
+
+# OpenCV, deepface and TensorFlow are imported inside the commands that use them,
+# so list/delete/log answer in milliseconds
+
+# Members are enrolled with the model the entry system recognizes with
+MODEL_NAME = embedding_models.DEFAULT_MODEL
+
+def capture_face(name, source="0"):
+    import cv2
+    import recognition
+    from frame_source import open_source
+
+    print(f"Starting camera to capture face for '{name}'...")
+    # The model loads while the camera opens and the member gets in position
+    recognition.start_warm_up(MODEL_NAME)
+    cap = open_source(source)
+    
+    if not cap.isOpened():
+        print(f"Error: Could not open frame source {source!r}.")
+        return
+    
+    print("Look at the camera. Press 'c' to capture or 'q' to quit.")
+    
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("Error: Could not read frame.")
+            break
+        
+        # Display the frame
+        cv2.imshow("Capture Face - Press 'c' to capture", frame)
+        
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('c'):
+            # Several frames a moment apart make a template that copes with pose and lighting changes
+            print(f"Capturing {recognition.ENROLL_SAMPLES} samples for '{name}', keep looking at the camera...")
+            samples = recognition.capture_enrollment_samples(cap, model_name=MODEL_NAME)
+            if len(samples):
+                database.add_member(name, samples, model_name=MODEL_NAME)
+                print(f"Successfully added member '{name}' to database ({len(samples)} samples).")
+                break
+            print("No face detected. Please try again.")
+        
+        elif key == ord('q'):
+            print("Capture cancelled.")
+            break
+            
+    cap.release()
+    cv2.destroyAllWindows()
+
+def list_members():
+    # One row per member and model; show each member once with the models they are embedded with
+    models = {}
+    for member in database.list_members():
+        models.setdefault(member["name"], []).append(member["embedding_model"])
+    print("--- Current Members ---")
+    for idx, (name, member_models) in enumerate(models.items()):
+        other = [model for model in member_models if model != MODEL_NAME]
+        print(f"{idx + 1}. {name}" + (f" ({', '.join(member_models)})" if other else ""))
+    print("-----------------------")
+
+def list_models():
+    counts = database.count_members_by_model()
+    print(f"--- Embedding Models (recognizing with {MODEL_NAME}) ---")
+    for model, count in counts.items():
+        info = embedding_models.MODELS.get(model)
+        threshold = f"threshold {info['threshold']:.2f}" if info else "not in embedding_models"
+        print(f"{model}: {count} members, {threshold}")
+    print("-----------------------")
+
+def drop_model(model_name, force=False):
+    if model_name == MODEL_NAME and not force:
+        print(f"{model_name} is the model in use; switch DEFAULT_MODEL in embedding_models.py first "
+              "or pass --force.")
+        return
+    members = database.list_members()
+    orphaned = ({member["name"] for member in members}
+                - {member["name"] for member in members if member["embedding_model"] != model_name})
+    if orphaned and not force:
+        print(f"{len(orphaned)} members have no other embedding and would be removed "
+              f"(e.g. {', '.join(sorted(orphaned)[:5])}); re-embed them first or pass --force.")
+        return
+    removed = database.delete_model_embeddings(model_name)
+    print(f"Removed {removed} {model_name} embeddings.")
+
+def delete_member(name):
+    removed = database.delete_member(name)
+    if removed:
+        print(f"Member '{name}' deleted ({removed} record{'s' if removed > 1 else ''}).")
+    else:
+        print(f"No member named '{name}'.")
+
+def _parse_time(text):
+    # "2024-05-01", "2024-05-01 08:00" or unix seconds
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+def show_access_log(start=None, end=None):
+    end = _parse_time(end) if end else time.time()
+    start = _parse_time(start) if start else end - 24 * 3600
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")  # noqa: E731
+    print(f"--- Entered between {fmt(start)} and {fmt(end)} ---")
+    for name, first, last, count in database.who_entered(start, end):
+        print(f"{name}: first {fmt(first)}, last {fmt(last)} ({count}x)")
+    denied = database.get_access_events(start, end, granted=False, limit=20)
+    if denied:
+        print("--- Latest denied ---")
+        for event in denied:
+            door = f" at {event['door']}" if event["door"] else ""
+            print(f"{fmt(event['time'])}{door}: {event['name']} ({event['similarity']:.2f})")
+    print("-----------------------")
+
+def import_members(source, workers=None):
+    import bulk_enroll
+
+    if not os.path.exists(source):
+        print(f"Error: {source!r} not found.")
+        return
+    print(f"Importing members from {source}...")
+    report = lambda s: print(f"  {s['enrolled']} enrolled, {s['failed']} failed "  # noqa: E731
+                             f"({s['images_per_sec']:.1f} images/sec)", flush=True)
+    stats = bulk_enroll.import_members(source, workers=workers, model_name=MODEL_NAME, progress=report)
+    print(f"Done in {stats['elapsed']:.1f}s: {stats['enrolled']} enrolled from {stats['samples']} images, "
+          f"{stats['skipped']} images of already enrolled members skipped, {stats['failed']} failed "
+          f"({stats['images_per_sec']:.1f} images/sec)")
+    if stats["retried"]:
+        print(f"{stats['retried']} members with previously failed images were re-imported from all their images.")
+    if stats["failures"]:
+        failures_path = "import_failures.csv"
+        with open(failures_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["image", "error"])
+            writer.writerows(stats["failures"])
+        print(f"Failed images listed in {failures_path}; fix them and run the import again to resume.")
+
+def reembed_members(model_name, source, workers=None):
+    import bulk_enroll
+
+    if not os.path.exists(source):
+        print(f"Error: {source!r} not found.")
+        return
+    if model_name not in embedding_models.MODELS:
+        print(f"Unknown model {model_name!r}. Models: {', '.join(embedding_models.MODELS)}")
+        return
+    print(f"Re-embedding members with {model_name} from {source}...")
+    report = lambda s: print(f"  {s['enrolled']} re-embedded, {s['failed']} failed "  # noqa: E731
+                             f"({s['images_per_sec']:.1f} images/sec)", flush=True)
+    stats = bulk_enroll.reembed_members(source, model_name, workers=workers, progress=report)
+    print(f"Done in {stats['elapsed']:.1f}s: {stats['enrolled']} members re-embedded from {stats['samples']} images, "
+          f"{stats['failed']} images failed.")
+    if stats["missing"]:
+        print(f"{len(stats['missing'])} members still have no {model_name} embedding "
+              f"(e.g. {', '.join(stats['missing'][:5])}); add their photos and run again.")
+    else:
+        print(f"Every member has a {model_name} embedding. Set DEFAULT_MODEL in embedding_models.py to "
+              f"{model_name!r} to switch, then remove the old ones with: python admin.py drop-model <old model>")
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python admin.py [add|list|delete|log|import|models|reembed|drop-model] [name|source|model] [source]")
+        return
+    
+    cmd = sys.argv[1].lower()
+    
+    if cmd == "add":
+        if len(sys.argv) < 3:
+            print("Usage: python admin.py add <name> [camera index | video file | image directory]")
+            return
+        capture_face(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "0")
+    elif cmd == "list":
+        list_members()
+    elif cmd == "delete":
+        if len(sys.argv) < 3:
+            print("Usage: python admin.py delete <name>")
+            return
+        delete_member(sys.argv[2])
+    elif cmd == "import":
+        # python admin.py import <image dir | csv> [workers]
+        if len(sys.argv) < 3:
+            print("Usage: python admin.py import <image directory | csv with name,image columns> [workers]")
+            return
+        import_members(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    elif cmd == "models":
+        list_models()
+    elif cmd == "reembed":
+        # python admin.py reembed <model> <image dir | csv> [workers]
+        if len(sys.argv) < 4:
+            print("Usage: python admin.py reembed <model> <image directory | csv with name,image columns> [workers]")
+            print(f"Models: {', '.join(embedding_models.MODELS)}")
+            return
+        reembed_members(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else None)
+    elif cmd == "drop-model":
+        if len(sys.argv) < 3:
+            print("Usage: python admin.py drop-model <model> [--force]")
+            return
+        drop_model(sys.argv[2], force="--force" in sys.argv[3:])
+    elif cmd == "log":
+        # python admin.py log [from] [to]   (default: the last 24 hours)
+        show_access_log(*sys.argv[2:4])
+    else:
+        print("Unknown command.")
+
+if __name__ == "__main__":
+    main()
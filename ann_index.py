@@ -0,0 +1,226 @@
+import os
+import sys
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from matcher import GalleryMatcher, l2_normalize
+
+# Galleries smaller than this are scanned exactly; the index only pays off at scale
+MIN_INDEXED_MEMBERS = 20000
+INDEX_FORMAT_VERSION = 1
+
+
+def index_path_for(db_name: str, model_name: Optional[str] = None) -> str:
+    """Index file that lives next to the members database (members.db -> members.ivf.npz).
+
+    One model's gallery gets its own file (members.<model>.ivf.npz).
+    """
+    base = os.path.splitext(db_name)[0]
+    return base + ".ivf.npz" if model_name is None else f"{base}.{model_name.replace(os.sep, '_')}.ivf.npz"
+
+
+def _spherical_kmeans(data: np.ndarray, n_lists: int, iterations: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = ~np.bincount(assign, minlength=n_lists).astype(bool)
+        # Re-seed empty lists with random points so every list stays useful
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over a GalleryMatcher for very large galleries.
+
+    Members are partitioned into `n_lists` clusters by spherical k-means. A
+    query is compared with the cluster centroids, and only members in the
+    `nprobe` closest clusters are scored, exactly, against the full float32
+    vectors held by the matcher. Queries whose best candidate falls below
+    `verify_threshold` are re-scored against the whole gallery, so
+    grant/deny decisions at that threshold match the exact matcher. Which
+    member is granted is not guaranteed: when several score above the
+    threshold and the best of them sits in an unprobed cluster, the index
+    returns another of them. Raise `nprobe` to make that rarer.
+    Multi-sample members are reranked by their samples as in the matcher.
+
+    Exposes the same search/best_matches/top_k interface as GalleryMatcher.
+    """
+
+    def __init__(self, matcher: GalleryMatcher, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_rows: np.ndarray, nprobe: int = 8, verify_threshold: Optional[float] = None):
+        self.matcher = matcher
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe
+        self.verify_threshold = verify_threshold
+
+    @classmethod
+    def build(cls, matcher: GalleryMatcher, n_lists: Optional[int] = None, iterations: int = 10,
+              train_size: int = 100000, seed: int = 0, **kwargs) -> "IVFIndex":
+        n = len(matcher)
+        if n == 0:
+            raise ValueError("Cannot build an index over an empty gallery")
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        rng = np.random.default_rng(seed)
+        train = matcher.matrix
+        if n > train_size:
+            train = train[rng.choice(n, train_size, replace=False)]
+        centroids = _spherical_kmeans(train, n_lists, iterations, seed)
+
+        # Assign in chunks to keep the (chunk x n_lists) score matrix small
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            chunk = matcher.matrix[start:start + 65536]
+            assign[start:start + 65536] = np.argmax(chunk @ centroids.T, axis=1)
+        list_rows = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return cls(matcher, centroids, list_offsets, list_rows, **kwargs)
+
+    @classmethod
+    def from_members(cls, members, **kwargs) -> "IVFIndex":
+        """Build from database.get_all_members() output."""
+        return cls.build(GalleryMatcher.from_members(members), **kwargs)
+
+    def save(self, path: str) -> None:
+        # Rows are stored as member ids so the file survives reloading the gallery in another order
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=INDEX_FORMAT_VERSION, centroids=self.centroids,
+                     list_offsets=self.list_offsets, list_ids=self.matcher.ids[self.list_rows])
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, matcher: GalleryMatcher, **kwargs) -> Optional["IVFIndex"]:
+        """Load a saved index for `matcher`. Returns None if the file is missing or stale."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_FORMAT_VERSION:
+                return None
+            centroids = data["centroids"]
+            list_offsets = data["list_offsets"]
+            list_ids = data["list_ids"]
+        if len(list_ids) != len(matcher) or centroids.shape[1] != matcher.dim:
+            return None
+        order = np.argsort(matcher.ids)
+        pos = np.searchsorted(matcher.ids, list_ids, sorter=order)
+        pos = np.clip(pos, 0, len(order) - 1)
+        list_rows = order[pos]
+        if not np.array_equal(matcher.ids[list_rows], list_ids):
+            return None
+        return cls(matcher, centroids, list_offsets, list_rows, **kwargs)
+
+    def rebind(self, matcher: GalleryMatcher, reassign_ids=()) -> "IVFIndex":
+        """Return an index over a patched gallery, reusing the trained centroids.
+
+        Members already in the index keep their list; only new members (and
+        `reassign_ids`, e.g. updated embeddings) are assigned, so applying a
+        handful of inserts/deletes stays cheap.
+        """
+        list_of_row = np.empty(len(self.matcher), dtype=np.int64)
+        list_of_row[self.list_rows] = np.repeat(np.arange(self.n_lists), np.diff(self.list_offsets))
+        known = dict(zip(self.matcher.ids[self.list_rows].tolist(), list_of_row[self.list_rows].tolist()))
+        for member_id in reassign_ids:
+            known.pop(int(member_id), None)
+
+        assign = np.array([known.get(member_id, -1) for member_id in matcher.ids.tolist()], dtype=np.int64)
+        new_rows = np.where(assign < 0)[0]
+        if len(new_rows):
+            assign[new_rows] = np.argmax(matcher.matrix[new_rows] @ self.centroids.T, axis=1)
+        list_rows = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.n_lists))])
+        return IVFIndex(matcher, self.centroids, list_offsets, list_rows,
+                        nprobe=self.nprobe, verify_threshold=self.verify_threshold)
+
+    def __len__(self) -> int:
+        return len(self.matcher)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = l2_normalize(queries)
+        wanted = min(k, len(self.matcher))
+        k = min(self.matcher.candidates(k), len(self.matcher))
+        nprobe = min(self.nprobe, self.n_lists)
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        indices = np.zeros((len(queries), k), dtype=np.int64)
+        sims = np.full((len(queries), k), -1.0, dtype=np.float32)
+        for qi, query in enumerate(queries):
+            rows = np.concatenate([self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]]
+                                   for p in probes[qi]])
+            if len(rows) == 0:
+                continue
+            # Exact re-ranking of every candidate against the full float32 vectors
+            cand_sims = self.matcher.matrix[rows] @ query
+            top = min(k, len(rows))
+            best = np.argpartition(-cand_sims, top - 1)[:top]
+            best = best[np.argsort(-cand_sims[best], kind="stable")]
+            indices[qi, :top] = rows[best]
+            sims[qi, :top] = cand_sims[best]
+        indices, sims = self.matcher.rerank(queries, indices, sims, wanted)
+
+        if self.verify_threshold is not None:
+            unsure = np.where(sims[:, 0] < self.verify_threshold)[0]
+            if len(unsure):
+                indices[unsure], sims[unsure] = self.matcher.search(queries[unsure], wanted)
+        return indices, sims
+
+    def top_k(self, queries, k: int = 5) -> List[List[Tuple[str, float]]]:
+        indices, sims = self.search(queries, k)
+        names = self.matcher.names
+        return [[(names[i], float(s)) for i, s in zip(row_i, row_s)]
+                for row_i, row_s in zip(indices, sims)]
+
+    def best_matches(self, queries) -> List[Tuple[Optional[str], float]]:
+        indices, sims = self.search(queries, 1)
+        names = self.matcher.names
+        return [(names[i], float(s)) for i, s in zip(indices[:, 0], sims[:, 0])]
+
+
+def load_or_build(matcher: GalleryMatcher, path: str, min_members: Optional[int] = None, **kwargs):
+    """Return an IVFIndex for large galleries (loading or rebuilding `path`), else `matcher` itself."""
+    if min_members is None:
+        min_members = MIN_INDEXED_MEMBERS
+    if len(matcher) < min_members:
+        return matcher
+    index = IVFIndex.load(path, matcher, **kwargs)
+    if index is None:
+        index = IVFIndex.build(matcher, **kwargs)
+        index.save(path)
+    return index
+
+
+def main():
+    import database
+    import embedding_models
+
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python ann_index.py build [n_lists] [model_name]")
+        return
+    n_lists = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != "auto" else None
+    model_name = sys.argv[3] if len(sys.argv) > 3 else embedding_models.DEFAULT_MODEL
+    ids, names, matrix = database.load_embedding_matrix(model_name)
+    if not names:
+        print("No members in database.")
+        return
+    index = IVFIndex.build(GalleryMatcher(matrix, names, ids), n_lists=n_lists)
+    path = index_path_for(database.DB_NAME, model_name)
+    index.save(path)
+    print(f"Indexed {len(index)} members into {index.n_lists} lists -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,313 +1,403 @@
-import cv2
-import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from PIL import Image, ImageTk
-import threading
-import time
-import os
-import json
-import numpy as np
-
-# try importing DeepFace; if unavailable warn later
-try:
-    from deepface import DeepFace
-    HAS_DEEPFACE = True
-except ImportError:
-    DeepFace = None
-    HAS_DEEPFACE = False
-
-import sqlite3
-
-# --- Database Logic ---
-DB_NAME = "members.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS members (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            embedding TEXT NOT NULL,
-            membership_type TEXT DEFAULT 'Premium',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def add_member(name, embedding):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    embedding_json = json.dumps(embedding)
-    cursor.execute('INSERT INTO members (name, embedding) VALUES (?, ?)', (name, embedding_json))
-    conn.commit()
-    conn.close()
-
-def get_members():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT name, embedding FROM members')
-    rows = cursor.fetchall()
-    conn.close()
-    return [{"name": r[0], "embedding": json.loads(r[1])} for r in rows]
-
-# --- Main Application ---
-class PremiumEntryApp:
-    def __init__(self, window):
-        self.window = window
-        self.window.title("Premium Lounge Face-Recognition Entry")
-        self.window.geometry("1100x700")
-        self.window.configure(bg="#2c3e50")
-
-        self.style = ttk.Style()
-        self.style.theme_use('clam')
-        
-        # State
-        self.running = False
-        self.cap = None
-        self.members = []
-        self.process_every_n_frames = 5
-        self.frame_count = 0
-        self.last_results = []
-        self.threshold = 0.68
-        # recognition thread guard
-        self.processing = False
-        
-        init_db()
-        self.setup_ui()
-        self.load_members()
-
-    def setup_ui(self):
-        # Header
-        header = tk.Frame(self.window, bg="#1a252f", height=80)
-        header.pack(fill=tk.X)
-        lbl_title = tk.Label(header, text="PREMIUM LOUNGE ACCESS CONTROL", font=("Helvetica", 24, "bold"), 
-                             bg="#1a252f", fg="#ecf0f1", pady=20)
-        lbl_title.pack()
-
-        # Main Layout
-        main_frame = tk.Frame(self.window, bg="#2c3e50")
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-
-        # Left: Video Feed
-        self.video_frame = tk.Label(main_frame, bg="#34495e", bd=2, relief="groove")
-        self.video_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        # Right: Controls & Logs
-        right_panel = tk.Frame(main_frame, bg="#2c3e50", width=350)
-        right_panel.pack(side=tk.RIGHT, fill=tk.Y, padx=(20, 0))
-
-        # Buttons
-        btn_frame = tk.Frame(right_panel, bg="#2c3e50")
-        btn_frame.pack(fill=tk.X)
-
-        self.btn_toggle = tk.Button(btn_frame, text="START SYSTEM", command=self.toggle_system,
-                                   font=("Helvetica", 14, "bold"), bg="#27ae60", fg="white", 
-                                   padx=20, pady=10, relief="flat", cursor="hand2")
-        self.btn_toggle.pack(fill=tk.X, pady=5)
-
-        btn_register = tk.Button(btn_frame, text="REGISTER MEMBER", command=self.register_member,
-                                     font=("Helvetica", 12), bg="#2980b9", fg="white", 
-                                     padx=20, pady=8, relief="flat", cursor="hand2")
-        btn_register.pack(fill=tk.X, pady=5)
-
-        btn_refresh = tk.Button(btn_frame, text="REFRESH DATABASE", command=self.load_members,
-                                     font=("Helvetica", 12), bg="#7f8c8d", fg="white", 
-                                     padx=20, pady=8, relief="flat", cursor="hand2")
-        btn_refresh.pack(fill=tk.X, pady=5)
-
-        # Logs
-        tk.Label(right_panel, text="ACCESS LOGS", font=("Helvetica", 12, "bold"), 
-                 bg="#2c3e50", fg="#bdc3c7").pack(pady=(20, 5), anchor="w")
-        
-        self.log_list = tk.Listbox(right_panel, bg="#1a252f", fg="#2ecc71", font=("Consolas", 10),
-                                  borderwidth=0, highlightthickness=0)
-        self.log_list.pack(fill=tk.BOTH, expand=True)
-        
-        # Status Bar
-        self.status_var = tk.StringVar(value="System Offline")
-        status_bar = tk.Label(self.window, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, 
-                              anchor=tk.W, bg="#34495e", fg="#ecf0f1", font=("Helvetica", 10))
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-
-    def load_members(self):
-        self.members = get_members()
-        self.log(f"Loaded {len(self.members)} members.")
-
-    def log(self, message):
-        timestamp = time.strftime("%H:%M:%S")
-        self.log_list.insert(0, f"[{timestamp}] {message}")
-        if self.log_list.size() > 50:
-            self.log_list.delete(50, tk.END)
-
-    def toggle_system(self):
-        if not self.running:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                messagebox.showerror("Error", "Could not access camera.")
-                return
-            self.running = True
-            self.btn_toggle.config(text="STOP SYSTEM", bg="#e74c3c")
-            self.status_var.set("System Active - Monitoring...")
-            self.log("System started.")
-            self.update_frame()
-        else:
-            self.running = False
-            self.btn_toggle.config(text="START SYSTEM", bg="#27ae60")
-            if self.cap:
-                self.cap.release()
-            self.video_frame.config(image='')
-            self.status_var.set("System Offline")
-            self.log("System stopped.")
-
-    def update_frame(self):
-        if not self.running:
-            return
-
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.flip(frame, 1) # Mirror effect
-            display_frame = frame.copy()
-            
-            # Recognition Logic (offload heavy work to thread)
-            if self.frame_count % self.process_every_n_frames == 0 and not self.processing:
-                if HAS_DEEPFACE:
-                    # copy frame for thread to avoid mutation issues
-                    threading.Thread(target=self.process_recognition, args=(frame.copy(),), daemon=True).start()
-                else:
-                    # skip recognition when dependency missing
-                    self.last_results = []
-            
-            # Drawing
-            for res in self.last_results:
-                r = res["region"]
-                color = (0, 255, 0) if res["granted"] else (0, 0, 255)
-                # OpenCV uses BGR, PIL uses RGB
-                cv2.rectangle(display_frame, (r['x'], r['y']), (r['x'] + r['w'], r['y'] + r['h']), color, 2)
-                
-                label = f"{res['name']} ({res['similarity']:.2f})" if res["granted"] else "Unknown"
-                cv2.putText(display_frame, label, (r['x'], r['y'] - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                
-                if res["granted"]:
-                    cv2.putText(display_frame, "ACCESS GRANTED", (30, 60), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 0), 3)
-
-            # Convert to Tkinter Image
-            img = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)
-            # Resize to fit frame while keeping aspect ratio
-            img.thumbnail((700, 500), Image.Resampling.LANCZOS)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.video_frame.imgtk = imgtk
-            self.video_frame.configure(image=imgtk)
-            
-            self.frame_count += 1
-            
-        self.window.after(10, self.update_frame)
-
-    def process_recognition(self, frame):
-        # executed in background thread to avoid blocking UI
-        self.processing = True
-        try:
-            extractions = DeepFace.represent(img_path=frame, model_name='VGG-Face', 
-                                            enforce_detection=False, detector_backend='opencv')
-            
-            new_results = []
-            for face in extractions:
-                if face.get('face_confidence', 0) < 0.6:
-                    continue
-                
-                embedding = face["embedding"]
-                region = face["facial_area"]
-                
-                best_match = None
-                max_similarity = -1
-                
-                for member in self.members:
-                    # Dot product of normalized vectors
-                    v1 = np.array(embedding)
-                    v2 = np.array(member["embedding"])
-                    sim = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-                    
-                    if sim > max_similarity:
-                        max_similarity = sim
-                        best_match = member["name"]
-                
-                granted = max_similarity >= self.threshold
-                new_results.append({
-                    "name": best_match if granted else "Guest",
-                    "similarity": max_similarity,
-                    "region": region,
-                    "granted": granted
-                })
-                
-                if granted and (not self.last_results or not any(r["name"] == best_match for r in self.last_results)):
-                    # schedule log update on main thread
-                    self.window.after(0, self.log, f"Access Granted: {best_match} ({max_similarity:.2f})")
-            
-            # update results on main thread
-            self.window.after(0, setattr, self, 'last_results', new_results)
-        except Exception as e:
-            # log error for debugging
-            self.window.after(0, self.log, f"Recognition error: {e}")
-        finally:
-            self.processing = False
-
-    def register_member(self):
-        if not HAS_DEEPFACE:
-            messagebox.showerror("Feature Unavailable", 
-                                "Face registration requires deepface, which is not available on Python 3.14.\n\n"
-                                "To enable face registration:\n"
-                                "1. Install Python 3.11 or 3.12\n"
-                                "2. Create a virtual environment with that Python\n"
-                                "3. Install deepface: pip install deepface\n\n"
-                                "Alternatively, use admin.py to register members from command line.")
-            return
-        
-        name = simpledialog.askstring("Register", "Enter Member Name:")
-        if not name: return
-        
-        messagebox.showinfo("Capture", f"Prepare to capture face for {name}. Look at the camera.")
-        
-        # Stop monitoring if active
-        was_running = self.running
-        if was_running: self.toggle_system()
-        
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if ret:
-            try:
-                self.status_var.set("Processing New Member...")
-                # first pass enforce detection to avoid false positives
-                results = DeepFace.represent(img_path=frame, model_name='VGG-Face', enforce_detection=True)
-            except Exception as e:
-                err = str(e)
-                # common failure: face not detected, retry with relaxed settings
-                if "Face could not be detected" in err or "enforce_detection" in err:
-                    try:
-                        self.log("Primary detection failed, retrying without enforcement.")
-                        results = DeepFace.represent(img_path=frame, model_name='VGG-Face', enforce_detection=False)
-                    except Exception as e2:
-                        messagebox.showerror("Error", f"Registration failed: {e2}")
-                        results = None
-                else:
-                    messagebox.showerror("Error", f"Registration failed: {err}")
-                    results = None
-
-            if results:
-                add_member(name, results[0]["embedding"])
-                messagebox.showinfo("Success", f"Member {name} registered successfully!")
-                self.load_members()
-            else:
-                messagebox.showerror("Error", "No face could be extracted from the frame. Make sure your face is visible and try again.")
-        
-        self.status_var.set("System Offline")
-        if was_running: self.toggle_system()
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = PremiumEntryApp(root)
-    root.mainloop()
+import cv2
+import tkinter as tk
+from tkinter import ttk, messagebox, simpledialog
+from PIL import Image, ImageTk
+import time
+import os
+import numpy as np
+import embedding_models
+import recognition
+from access_log import AccessLogWriter
+from events import DecisionEmitter
+from gallery_cache import GalleryCache
+from metrics import FACE_BUCKETS, Metrics, open_metrics
+from pipeline import Pipeline
+from embed_cache import EmbeddingCache
+from frame_source import open_source
+from scheduler import AdaptiveScheduler
+from tracker import FaceTracker
+from utils import PhaseTimer
+
+# deepface (and TensorFlow) load in the background after the window opens; only check it is installed
+HAS_DEEPFACE = recognition.deepface_available()
+
+# All storage (connections, schema, member and event queries) lives in database.py
+import database
+
+# "9108" serves stage latency histograms, errors and queue depths at http://127.0.0.1:9108/metrics,
+# a file path dumps them there every 10 s (see metrics.py); None records nothing extra
+METRICS = None
+
+# Embedding model for enrollment and recognition (see embedding_models.py); its threshold comes with it
+MODEL_NAME = recognition.MODEL_NAME
+
+# How often the Tk loop checks whether the background model warm-up has finished
+WARM_UP_POLL_MS = 100
+
+# Map the gallery from a members.<seq>.gallery file shared with other recognizers (see gallery_snapshot.py);
+# False keeps a private copy in this process
+GALLERY_SNAPSHOT = True
+
+# --- Video Display ---
+class VideoDisplay:
+    """Shows frames in a Tk label through one persistent PhotoImage, updated in place.
+
+    Each frame is shrunk once (INTER_LINEAR) into a buffer allocated when the
+    frame size changes, annotated at display size, and copied into a PIL image
+    of the same size with the BGR->RGB swap done by the copy itself; that image
+    is pasted into the PhotoImage. No per-frame image allocations and no
+    full-resolution copy of the frame.
+    """
+
+    def __init__(self, label, max_size=(700, 500)):
+        self.label = label
+        self.max_size = max_size
+        self.scale = 1.0
+        self.photo = None
+        self._shape = None
+        self._small = None
+        self._image = None
+
+    def _allocate(self, shape):
+        h, w = shape[:2]
+        # keep the aspect ratio and never upscale, as PIL's thumbnail() did
+        self.scale = min(self.max_size[0] / w, self.max_size[1] / h, 1.0)
+        size = (max(1, int(w * self.scale)), max(1, int(h * self.scale)))
+        self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._image = Image.new("RGB", size)
+        self.photo = ImageTk.PhotoImage("RGB", size)
+        self.label.configure(image=self.photo)
+        self._shape = shape
+
+    def show(self, frame, results, **draw_options):
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+        if self.scale < 1.0:
+            cv2.resize(frame, (self._small.shape[1], self._small.shape[0]), dst=self._small,
+                       interpolation=cv2.INTER_LINEAR)
+        else:
+            # never draw on the pipeline's frame
+            np.copyto(self._small, frame)
+        recognition.draw_results(self._small, results, scale=self.scale, **draw_options)
+        self._image.frombytes(self._small, "raw", "BGR")
+        self.photo.paste(self._image)
+
+    def clear(self):
+        self.label.configure(image="")
+        self.photo = None
+        self._shape = None
+
+
+# --- Main Application ---
+class PremiumEntryApp:
+    def __init__(self, window, source="0", metrics=METRICS):
+        self.startup = PhaseTimer()
+        self.window = window
+        self.window.title("Premium Lounge Face-Recognition Entry")
+        self.window.geometry("1100x700")
+        self.window.configure(bg="#2c3e50")
+
+        self.style = ttk.Style()
+        self.style.theme_use('clam')
+        
+        # State
+        self.running = False
+        self.cap = None
+        self.source = source  # camera index, video file, image directory or "synthetic"
+        self.cpu_budget = 0.5
+        self.frame_count = 0
+        self._render_pending = False
+        self._ui_frames, self._ui_seconds, self._ui_since = 0, 0.0, time.perf_counter()
+        self.last_results = []
+        self.model_name = MODEL_NAME
+        self.threshold = embedding_models.threshold_for(self.model_name)
+        # gallery kept in sync with members.db in the background (mapped from the shared snapshot file by default)
+        self.gallery = GalleryCache(verify_threshold=self.threshold, model_name=self.model_name,
+                                    on_change=self.on_gallery_change, snapshot=GALLERY_SNAPSHOT)
+        self.pipeline = None
+        self.embedding_cache = EmbeddingCache(ttl=5.0)
+        # every decision is kept in members.db; the listbox only shows the last 50 lines
+        self.access_log = AccessLogWriter().start()
+        self.decisions = DecisionEmitter(self.access_log)
+        self.metrics = Metrics() if metrics else None
+        self.metrics_exporter = open_metrics(metrics, self.metrics) if metrics else None
+        self._pipeline_metrics = None
+        
+        # model build + dummy inference run while the operator looks at the window
+        self.warm_up = recognition.start_warm_up(self.model_name) if HAS_DEEPFACE else None
+        self._start_when_warm = False  # START was pressed while the model was still loading
+        
+        with self.startup.phase("database"):
+            database.init_db()
+        with self.startup.phase("window"):
+            self.setup_ui()
+        with self.startup.phase("gallery"):
+            self.load_members()
+        self.gallery.start()
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        if self.warm_up:
+            self.window.after(WARM_UP_POLL_MS, self._poll_warm_up)
+
+    def _poll_warm_up(self):
+        # Tk is not thread-safe: watch the Future from the Tk loop rather than a callback on the warm-up thread
+        if not self.warm_up.done():
+            self.window.after(WARM_UP_POLL_MS, self._poll_warm_up)
+            return
+        self.on_warm_up(self.warm_up)
+
+    def on_warm_up(self, future):
+        error = future.exception()
+        if error is not None:
+            # recognition cannot run on a broken model: keep START disabled
+            self._start_when_warm = False
+            self.btn_toggle.config(state=tk.DISABLED)
+            self.status_var.set(f"Recognition model failed to load: {error}")
+            self.log(f"Could not load the recognition model: {error}")
+            return
+        self.startup.add("model warm-up (background)", future.result())
+        self.log(self.startup.format())
+        if self._start_when_warm:
+            self._start_when_warm = False
+            self.btn_toggle.config(state=tk.NORMAL)
+            self.toggle_system()
+
+    def on_close(self):
+        if self.running:
+            self.toggle_system()
+        self.gallery.stop()
+        self.access_log.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.close()
+        self.window.destroy()
+
+    def setup_ui(self):
+        # Header
+        header = tk.Frame(self.window, bg="#1a252f", height=80)
+        header.pack(fill=tk.X)
+        lbl_title = tk.Label(header, text="PREMIUM LOUNGE ACCESS CONTROL", font=("Helvetica", 24, "bold"), 
+                             bg="#1a252f", fg="#ecf0f1", pady=20)
+        lbl_title.pack()
+
+        # Main Layout
+        main_frame = tk.Frame(self.window, bg="#2c3e50")
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+
+        # Left: Video Feed
+        self.video_frame = tk.Label(main_frame, bg="#34495e", bd=2, relief="groove")
+        self.video_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.display = VideoDisplay(self.video_frame)
+
+        # Right: Controls & Logs
+        right_panel = tk.Frame(main_frame, bg="#2c3e50", width=350)
+        right_panel.pack(side=tk.RIGHT, fill=tk.Y, padx=(20, 0))
+
+        # Buttons
+        btn_frame = tk.Frame(right_panel, bg="#2c3e50")
+        btn_frame.pack(fill=tk.X)
+
+        self.btn_toggle = tk.Button(btn_frame, text="START SYSTEM", command=self.toggle_system,
+                                   font=("Helvetica", 14, "bold"), bg="#27ae60", fg="white", 
+                                   padx=20, pady=10, relief="flat", cursor="hand2")
+        self.btn_toggle.pack(fill=tk.X, pady=5)
+
+        btn_register = tk.Button(btn_frame, text="REGISTER MEMBER", command=self.register_member,
+                                     font=("Helvetica", 12), bg="#2980b9", fg="white", 
+                                     padx=20, pady=8, relief="flat", cursor="hand2")
+        btn_register.pack(fill=tk.X, pady=5)
+
+        btn_refresh = tk.Button(btn_frame, text="REFRESH DATABASE", command=self.refresh_members,
+                                     font=("Helvetica", 12), bg="#7f8c8d", fg="white", 
+                                     padx=20, pady=8, relief="flat", cursor="hand2")
+        btn_refresh.pack(fill=tk.X, pady=5)
+
+        # Logs
+        tk.Label(right_panel, text="ACCESS LOGS", font=("Helvetica", 12, "bold"), 
+                 bg="#2c3e50", fg="#bdc3c7").pack(pady=(20, 5), anchor="w")
+        
+        self.log_list = tk.Listbox(right_panel, bg="#1a252f", fg="#2ecc71", font=("Consolas", 10),
+                                  borderwidth=0, highlightthickness=0)
+        self.log_list.pack(fill=tk.BOTH, expand=True)
+        
+        # Status Bar
+        self.status_var = tk.StringVar(value="System Offline")
+        status_bar = tk.Label(self.window, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, 
+                              anchor=tk.W, bg="#34495e", fg="#ecf0f1", font=("Helvetica", 10))
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        # UI frame rate and render cost, refreshed once a second while running
+        self.ui_stats_var = tk.StringVar(value="")
+        tk.Label(status_bar, textvariable=self.ui_stats_var, bg="#34495e", fg="#bdc3c7",
+                 font=("Helvetica", 10)).pack(side=tk.RIGHT, padx=5)
+
+    def load_members(self):
+        # full load; later changes are pulled incrementally by the gallery cache
+        self.gallery.load()
+        self.log(f"Loaded {len(self.gallery)} members ({self.model_name}).")
+        unmigrated = database.count_members_without_model(self.model_name)
+        if unmigrated:
+            self.log(f"{unmigrated} members need re-embedding with {self.model_name} (admin.py reembed).")
+
+    def refresh_members(self):
+        if not self.gallery.sync():
+            self.log(f"Database up to date ({len(self.gallery)} members).")
+
+    def on_gallery_change(self, gallery, added, removed):
+        # called from the sync thread; hop to the Tk thread
+        self.window.after(0, self.log, f"Members updated: +{added} / -{removed} ({len(gallery)} total)")
+
+    def log(self, message):
+        timestamp = time.strftime("%H:%M:%S")
+        self.log_list.insert(0, f"[{timestamp}] {message}")
+        if self.log_list.size() > 50:
+            self.log_list.delete(50, tk.END)
+
+    def toggle_system(self):
+        if not self.running and self.warm_up and not self.warm_up.done():
+            # Only report "active" once the model is warm; on_warm_up starts as soon as it is
+            self.btn_toggle.config(state=tk.DISABLED)
+            self.status_var.set("Loading recognition model...")
+            self._start_when_warm = True
+            return
+        if not self.running and self.warm_up and self.warm_up.exception() is not None:
+            messagebox.showerror("Error", f"Recognition model failed to load: {self.warm_up.exception()}")
+            return
+        if not self.running:
+            self.cap = open_source(self.source)
+            if not self.cap.isOpened():
+                messagebox.showerror("Error", "Could not access camera.")
+                return
+            # capture and recognition run on pipeline threads; the Tk thread only renders
+            self.scheduler = AdaptiveScheduler(cpu_budget=self.cpu_budget)
+            self.pipeline = Pipeline(recognition.camera_source(self.cap, mirror=True), # Mirror effect
+                                     should_process=self.scheduler.should_process,
+                                     on_result=self.process_recognition, on_error=self.on_recognition_error,
+                                     histograms=self.metrics is not None, on_frame=self.on_frame)
+            if self.metrics:
+                self._pipeline_metrics = self.metrics.add_pipeline(self.pipeline)
+            if HAS_DEEPFACE:
+                recognition.get_embedder(self.model_name).cache = self.embedding_cache
+                recognition.add_recognition_stages(self.pipeline, lambda: self.gallery.matcher, self.threshold,
+                                                   model_name=self.model_name, min_confidence=0.6, unknown_name="Guest",
+                                                   tracker=FaceTracker(interval=self.scheduler.current_interval))
+            else:
+                # skip recognition when dependency missing
+                self.last_results = []
+            self._ui_frames, self._ui_seconds, self._ui_since = 0, 0.0, time.perf_counter()
+            self.pipeline.start()
+            self.running = True
+            self.btn_toggle.config(text="STOP SYSTEM", bg="#e74c3c")
+            self.status_var.set("System Active - Monitoring...")
+            self.log("System started.")
+        else:
+            self.running = False
+            self.btn_toggle.config(text="START SYSTEM", bg="#27ae60")
+            if self.pipeline:
+                self.pipeline.stop()
+                self.pipeline = None
+            if self._pipeline_metrics:
+                self.metrics.remove_collector(self._pipeline_metrics)
+                self._pipeline_metrics = None
+            if self.cap:
+                self.cap.release()
+            self.display.clear()
+            self.ui_stats_var.set("")
+            self.status_var.set("System Offline")
+            self.log("System stopped.")
+
+    def on_frame(self, job):
+        # executed on the capture thread: ask the Tk thread for one render, however many frames
+        # arrive before it gets to it (it always shows the newest)
+        if not self._render_pending:
+            self._render_pending = True
+            self.window.after(0, self.update_frame)
+
+    def update_frame(self):
+        self._render_pending = False
+        if not self.running:
+            return
+
+        job = self.pipeline.frames.get_nowait()
+        if job is None:
+            return
+        start = time.perf_counter()
+        # latest recognition results drawn on the newest frame, at display size
+        self.display.show(job["frame"], self.last_results, denied_label="Unknown",
+                          banner_origin=(30, 60), banner_scale=1.5)
+        seconds = time.perf_counter() - start
+        self.pipeline.record("render", seconds)
+        self.frame_count += 1
+
+        self._ui_frames += 1
+        self._ui_seconds += seconds
+        elapsed = time.perf_counter() - self._ui_since
+        if elapsed >= 1.0:
+            self.ui_stats_var.set(f"UI {self._ui_frames / elapsed:.1f} fps, "
+                                  f"render {1000 * self._ui_seconds / self._ui_frames:.1f} ms/frame")
+            self._ui_frames, self._ui_seconds, self._ui_since = 0, 0.0, time.perf_counter()
+
+    def process_recognition(self, job):
+        # executed on the pipeline's match thread; UI updates are scheduled on the main thread
+        self.scheduler.observe(job)
+        self.decisions.handle(job)
+        new_results = job["results"]
+        if self.metrics:
+            self.metrics.observe("faces_per_frame", len(job["faces"]), buckets=FACE_BUCKETS)
+            for res in new_results:
+                self.metrics.inc("decisions_total", outcome="granted" if res["granted"] else "denied")
+        for res in new_results:
+            if res["granted"] and (not self.last_results or not any(r["name"] == res["name"] for r in self.last_results)):
+                self.window.after(0, self.log, f"Access Granted: {res['name']} ({res['similarity']:.2f})")
+        
+        # update results on main thread
+        self.window.after(0, setattr, self, 'last_results', new_results)
+
+    def on_recognition_error(self, stage, error):
+        # log error for debugging
+        self.window.after(0, self.log, f"Recognition error ({stage}): {error}")
+
+    def register_member(self):
+        if not HAS_DEEPFACE:
+            messagebox.showerror("Feature Unavailable", 
+                                "Face registration requires deepface, which is not available on Python 3.14.\n\n"
+                                "To enable face registration:\n"
+                                "1. Install Python 3.11 or 3.12\n"
+                                "2. Create a virtual environment with that Python\n"
+                                "3. Install deepface: pip install deepface\n\n"
+                                "Alternatively, use admin.py to register members from command line.")
+            return
+        
+        name = simpledialog.askstring("Register", "Enter Member Name:")
+        if not name: return
+        
+        messagebox.showinfo("Capture", f"Prepare to capture face for {name}. Look at the camera.")
+        
+        # Stop monitoring if active
+        was_running = self.running
+        if was_running: self.toggle_system()
+        
+        self.status_var.set("Processing New Member...")
+        self.window.update_idletasks()
+        cap = open_source(self.source)
+        try:
+            # A few frames a moment apart: the template then copes with small pose and lighting changes
+            samples = recognition.capture_enrollment_samples(cap, model_name=self.model_name)
+        except Exception as e:
+            samples = None
+            messagebox.showerror("Error", f"Registration failed: {e}")
+        finally:
+            cap.release()
+
+        if samples is not None and len(samples):
+            database.add_member(name, samples, model_name=self.model_name)
+            messagebox.showinfo("Success", f"Member {name} registered successfully ({len(samples)} samples)!")
+            self.refresh_members()
+        elif samples is not None:
+            messagebox.showerror("Error", "No face could be extracted from the camera. Make sure your face is visible and try again.")
+        
+        self.status_var.set("System Offline")
+        if was_running: self.toggle_system()
+if __name__ == "__main__":
+    import sys
+    root = tk.Tk()
+    # optional frame source argument: python app.py [0 | door.mp4 | frames/ | synthetic]
+    app = PremiumEntryApp(root, source=sys.argv[1] if len(sys.argv) > 1 else "0")
+    root.mainloop()
@@ -0,0 +1,68 @@
+"""Recall-vs-latency benchmark of the IVF index against the exact GalleryMatcher.
+
+    python benchmarks/bench_ann.py --members 100000 --dim 512
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex  # noqa: E402
+from matcher import GalleryMatcher  # noqa: E402
+from synthetic import make_gallery, make_probes  # noqa: E402
+
+
+def time_search(index, probes, batch):
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(probes), batch):
+        results.append(index.search(probes[i:i + batch], 1)[0][:, 0])
+    elapsed = time.perf_counter() - start
+    return np.concatenate(results), elapsed * 1000 / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1, help="faces scored per search call")
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    gallery = make_gallery(args.members, args.dim)
+    probes, _ = make_probes(gallery, args.probes)
+    matcher = GalleryMatcher(gallery, [str(i) for i in range(args.members)])
+
+    exact_rows, exact_ms = time_search(matcher, probes, args.batch)
+    start = time.perf_counter()
+    index = IVFIndex.build(matcher, n_lists=args.n_lists)
+    build_s = time.perf_counter() - start
+
+    rows = [{"method": "exact", "nprobe": None, "recall_at_1": 1.0, "ms_per_query": exact_ms}]
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        found, ms = time_search(index, probes, args.batch)
+        rows.append({"method": "ivf", "nprobe": nprobe,
+                     "recall_at_1": float(np.mean(found == exact_rows)), "ms_per_query": ms})
+
+    if args.json:
+        for row in rows:
+            print(json.dumps({"members": args.members, "dim": args.dim, "n_lists": index.n_lists, **row}))
+        return
+    print(f"{args.members} members x {args.dim} dims, {index.n_lists} lists (built in {build_s:.1f}s)")
+    print(f"{'method':<8}{'nprobe':>8}{'recall@1':>10}{'ms/query':>10}{'speedup':>9}")
+    for row in rows:
+        print(f"{row['method']:<8}{str(row['nprobe'] or '-'):>8}{row['recall_at_1']:>10.3f}"
+              f"{row['ms_per_query']:>10.3f}{exact_ms / row['ms_per_query']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
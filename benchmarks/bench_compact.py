@@ -0,0 +1,126 @@
+"""Memory vs accuracy of compact galleries (float16, int8, PCA) against the float32 GalleryMatcher.
+
+Reports, per representation: bytes per member and the RAM a 1M-member
+gallery would need, how often the approximate top candidates contain the
+exact best match, and how often the final answer (after exact rescoring)
+and the grant/deny decision at --threshold agree with float32.
+
+    python benchmarks/bench_compact.py --members 100000 --dim 4096 --rank 256
+    python benchmarks/bench_compact.py --db members.db      # a real gallery
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_gallery import CompactMatcher  # noqa: E402
+from matcher import GalleryMatcher, l2_normalize  # noqa: E402
+from synthetic import make_gallery, make_probes  # noqa: E402
+
+
+def synthetic_gallery(members, dim, rank, seed=0):
+    """Synthetic gallery; with `rank`, members live near a random rank-dim subspace like real embeddings."""
+    if not rank or rank >= dim:
+        return make_gallery(members, dim, seed=seed)
+    basis = np.linalg.qr(np.random.default_rng(seed).standard_normal((dim, rank)))[0].T.astype(np.float32)
+    return l2_normalize(make_gallery(members, rank, seed=seed) @ basis)
+
+
+def chunks_of(gallery, chunk_size=10000):
+    for start in range(0, len(gallery), chunk_size):
+        rows = np.arange(start, min(start + chunk_size, len(gallery)))
+        yield rows, [str(i) for i in rows], gallery[rows]
+
+
+def run_search(matcher, probes, batch):
+    start = time.perf_counter()
+    rows, sims = [], []
+    for i in range(0, len(probes), batch):
+        found, found_sims = matcher.search(probes[i:i + batch], 1)
+        rows.append(found[:, 0])
+        sims.append(found_sims[:, 0])
+    elapsed = time.perf_counter() - start
+    return np.concatenate(rows), np.concatenate(sims), elapsed * 1000 / len(probes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--rank", type=int, default=256,
+                        help="intrinsic dimension of the synthetic gallery (0: isotropic)")
+    parser.add_argument("--db", default=None, help="benchmark the gallery of this members.db instead")
+    parser.add_argument("--probes", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=1.0, help="probe noise (see synthetic.make_probes)")
+    parser.add_argument("--threshold", type=float, default=0.68)
+    parser.add_argument("--pca-dim", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--candidates", type=int, default=CompactMatcher.rescore_candidates,
+                        help="approximate hits re-scored exactly per query")
+    parser.add_argument("--batch", type=int, default=8, help="faces scored per search call")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    if args.db:
+        import database
+        database.DB_NAME = args.db
+        _, _, gallery = database.load_embedding_matrix()
+        gallery = l2_normalize(gallery)
+    else:
+        gallery = synthetic_gallery(args.members, args.dim, args.rank)
+    members, dim = gallery.shape
+    probes, _ = make_probes(gallery, args.probes, noise=args.noise)
+    exact = GalleryMatcher(gallery, [str(i) for i in range(members)])
+    exact_rows, exact_sims, exact_ms = run_search(exact, probes, args.batch)
+    exact_granted = exact_sims >= args.threshold
+
+    def fetch(member_ids):
+        member_ids = np.asarray(member_ids, dtype=np.int64)
+        return member_ids, gallery[member_ids]
+
+    results = [{"mode": "float32", "bytes_per_member": 4 * dim, "candidate_recall": 1.0, "top1_agreement": 1.0,
+                "decision_agreement": 1.0, "approx_top1_agreement": 1.0, "ms_per_query": exact_ms,
+                "build_s": 0.0}]
+    configs = [("float16", None), ("int8", None)] + [("pca", n) for n in args.pca_dim if n < dim]
+    for mode, pca_dim in configs:
+        start = time.perf_counter()
+        compact = CompactMatcher.build(chunks_of(gallery), mode, pca_dim=pca_dim or 256, fetch=fetch)
+        build_s = time.perf_counter() - start
+        compact.rescore_candidates = args.candidates
+
+        # Candidate recall: is the exact best among the approximate top candidates?
+        approx = np.argsort(-compact.scores(probes), axis=1)[:, :args.candidates]
+        recall = float(np.mean([row in top for row, top in zip(exact_rows, approx)]))
+
+        rows, sims, ms = run_search(compact, probes, args.batch)
+        results.append({
+            "mode": mode if pca_dim is None else f"pca{pca_dim}",
+            "bytes_per_member": compact.nbytes / members,
+            "candidate_recall": recall,
+            "top1_agreement": float(np.mean(rows == exact_rows)),
+            "decision_agreement": float(np.mean((sims >= args.threshold) == exact_granted)),
+            "approx_top1_agreement": float(np.mean(approx[:, 0] == exact_rows)),
+            "ms_per_query": ms,
+            "build_s": build_s,
+        })
+
+    if args.json:
+        for row in results:
+            print(json.dumps({"members": members, "dim": dim, "candidates": args.candidates, **row}))
+        return
+    print(f"{members} members x {dim} dims, {args.probes} probes, "
+          f"{exact_granted.mean():.0%} granted by float32 at {args.threshold}")
+    print(f"{'mode':<9}{'B/member':>9}{'1M RAM':>9}{'recall@' + str(args.candidates):>11}{'approx@1':>10}"
+          f"{'top-1':>8}{'decision':>10}{'ms/query':>10}{'build s':>9}")
+    for row in results:
+        print(f"{row['mode']:<9}{row['bytes_per_member']:>9.0f}{row['bytes_per_member'] * 1e6 / 2 ** 30:>7.1f}GB"
+              f"{row['candidate_recall']:>11.3f}{row['approx_top1_agreement']:>10.3f}{row['top1_agreement']:>8.3f}"
+              f"{row['decision_agreement']:>10.3f}{row['ms_per_query']:>10.2f}{row['build_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
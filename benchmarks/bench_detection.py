@@ -0,0 +1,140 @@
+"""Detection latency and recall vs. detection resolution and door ROI.
+
+Runs the face detector on the same frames at full resolution and on
+downscaled copies (recognition.detection_view), and reports ms per frame
+and recall: the share of full-resolution detections (inside the ROI) that
+are found again, matched by IoU >= 0.5 after mapping boxes back to frame
+coordinates. `--detector haar` runs OpenCV's frontal-face cascade directly
+(what deepface's "opencv" backend uses) and needs no deepface install.
+
+Recall needs footage with real faces; the default synthetic 1080p frames
+only measure latency.
+
+    python benchmarks/bench_detection.py --source door_1080p.mp4 --widths 0 1280 960 640 480
+    python benchmarks/bench_detection.py --source frames/ --roi 0.3,0.1,0.4,0.8 --detector retinaface
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recognition  # noqa: E402
+from frame_source import SyntheticSource, open_source  # noqa: E402
+from tracker import box_iou  # noqa: E402
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+def haar_detector():
+    if not hasattr(cv2, "CascadeClassifier"):
+        # OpenCV 5 moved the Haar cascades out of the main package
+        sys.exit("This OpenCV build has no CascadeClassifier; pass --detector with a deepface backend.")
+    cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+
+    def detect(frame, roi, width):
+        image, scale, offset = recognition.detection_view(frame, roi, width)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        # Same parameters as deepface's opencv backend
+        boxes = cascade.detectMultiScale(gray, 1.1, 10)
+        return [recognition.to_frame_area({"x": int(x), "y": int(y), "w": int(w), "h": int(h)}, scale, offset)
+                for x, y, w, h in boxes]
+
+    return detect
+
+
+def deepface_detector(backend):
+    def detect(frame, roi, width):
+        faces = recognition.detect_faces(frame, backend, roi=roi, detection_width=width)
+        return [face["facial_area"] for face in faces]
+
+    return detect
+
+
+def in_roi(area, frame_shape, roi):
+    if roi is None:
+        return True
+    h, w = frame_shape[:2]
+    cx, cy = (area["x"] + area["w"] / 2) / w, (area["y"] + area["h"] / 2) / h
+    return roi[0] <= cx < roi[0] + roi[2] and roi[1] <= cy < roi[1] + roi[3]
+
+
+def read_frames(spec, count):
+    source = SyntheticSource(count, width=1920, height=1080) if spec is None else open_source(spec, paced=False)
+    frames = []
+    while len(frames) < count:
+        ok, frame = source.read()
+        if not ok:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=None, help="video file, image directory or camera (default: synthetic 1080p)")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--widths", type=int, nargs="+", default=[0, 1280, 960, 640, 480, 320],
+                        help="detection widths in pixels (0: full resolution)")
+    parser.add_argument("--roi", default=None, help="door area as x,y,w,h fractions of the frame")
+    parser.add_argument("--detector", default="haar" if cv2 is not None else recognition.DETECTOR_BACKEND,
+                        help="haar, or a deepface detector backend (opencv, retinaface, mtcnn, ...)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    roi = tuple(float(v) for v in args.roi.split(",")) if args.roi else None
+    detect = haar_detector() if args.detector == "haar" else deepface_detector(args.detector)
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        print(f"No frames read from {args.source!r}.")
+        return
+
+    # Reference (and speedup baseline): the whole frame at full resolution
+    for frame in frames[:2]:
+        detect(frame, None, None)  # warm-up
+    start = time.perf_counter()
+    reference = [detect(frame, None, None) for frame in frames]
+    base_ms = 1000 * (time.perf_counter() - start) / len(frames)
+    reference = [[area for area in ref if in_roi(area, frame.shape, roi)] for ref, frame in zip(reference, frames)]
+    n_reference = sum(len(r) for r in reference)
+
+    rows = []
+    for width in args.widths:
+        for frame in frames[:2]:
+            detect(frame, roi, width or None)  # warm-up
+        found, matched, start = 0, 0, time.perf_counter()
+        detections = [detect(frame, roi, width or None) for frame in frames]
+        ms = 1000 * (time.perf_counter() - start) / len(frames)
+        for ref, got in zip(reference, detections):
+            found += len(got)
+            matched += sum(any(box_iou(r, g) >= 0.5 for g in got) for r in ref)
+        scanned = recognition.detection_view(frames[0], roi, width or None)[0]
+        rows.append({"width": scanned.shape[1], "height": scanned.shape[0], "ms_per_frame": ms,
+                     "recall": matched / n_reference if n_reference else None, "faces_found": found})
+
+    if args.json:
+        for row in rows:
+            print(json.dumps({"detector": args.detector, "frame": list(frames[0].shape[:2][::-1]), "roi": roi,
+                              "frames": len(frames), "reference_faces": n_reference,
+                              "full_frame_ms": base_ms, **row}))
+        return
+    h, w = frames[0].shape[:2]
+    print(f"{args.detector} detector, {len(frames)} frames of {w}x{h}, roi={roi or 'full frame'}, "
+          f"{n_reference} reference faces at full resolution ({base_ms:.1f} ms/frame on the whole frame)")
+    print(f"{'scanned':>11}{'ms/frame':>10}{'speedup':>9}{'recall':>8}{'found':>7}")
+    for row in rows:
+        recall = f"{row['recall']:.3f}" if row["recall"] is not None else "n/a"
+        print(f"{str(row['width']) + 'x' + str(row['height']):>11}{row['ms_per_frame']:>10.1f}{base_ms / row['ms_per_frame']:>8.1f}x"
+              f"{recall:>8}{row['faces_found']:>7}")
+    if not n_reference:
+        print("No faces at full resolution: pass --source with real footage to measure recall.")
+
+
+if __name__ == "__main__":
+    main()
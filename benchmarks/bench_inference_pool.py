@@ -0,0 +1,69 @@
+"""Faces/sec of the process-pool inference backend versus worker count.
+
+Uses the stub model by default so it runs without deepface weights;
+pass --real to load the configured deepface model in each worker.
+
+    python benchmarks/bench_inference_pool.py --workers 1 2 4 8 16
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+
+# One BLAS thread per worker, otherwise numpy's own threading hides the process scaling
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, "1")
+
+import numpy as np  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_model  # noqa: E402
+from inference_pool import InferencePool  # noqa: E402
+
+
+def run(workers, frames, frame, analyze, warmup):
+    with InferencePool(workers, analyze=analyze, warmup=warmup) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(frame, frame_id=i) for i in range(frames)]
+        faces = sum(len(f.result()) for f in futures)
+        elapsed = time.perf_counter() - start
+    return faces / elapsed, frames / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--faces", type=int, default=2, help="faces per frame (stub only)")
+    parser.add_argument("--work", type=int, default=40, help="stub forward-pass cost")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--real", action="store_true", help="use recognition.analyze_frame with deepface")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.resolution.split("x"))
+    frame = np.random.default_rng(0).integers(0, 255, (h, w, 3), dtype=np.uint8)
+    if args.real:
+        analyze = warmup = None
+    else:
+        analyze = functools.partial(stub_model.analyze_frame, n_faces=args.faces, work=args.work)
+        warmup = None
+
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        faces_per_sec, fps = run(workers, args.frames, frame, analyze, warmup)
+        baseline = baseline or faces_per_sec
+        row = {"workers": workers, "faces_per_sec": faces_per_sec, "frames_per_sec": fps,
+               "speedup": faces_per_sec / baseline}
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print(f"workers={workers:<3} {faces_per_sec:8.1f} faces/s {fps:8.1f} frames/s "
+                  f"x{row['speedup']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
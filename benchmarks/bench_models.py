@@ -0,0 +1,173 @@
+"""Latency per face and match accuracy of each embedding model, to pick the fastest that meets a false-accept target.
+
+Faces come from --faces, laid out like an enrollment import (one sub-folder
+of photos per person, or a CSV with name,image columns). The largest face in
+each photo is detected once and the same crops are fed to every model. Per
+model the benchmark reports ms per face at batch size 1 and --batch, then
+scores every same-person pair (genuine) and up to --impostor-pairs
+different-person pairs (impostor). From those it gives the false and true
+accept rates at the model's configured threshold, plus the threshold that
+meets --far and the true accept rate there. Without --faces, random crops
+measure latency only.
+
+    python benchmarks/bench_models.py --faces lfw_people/ --models VGG-Face Facenet512 SFace SFace-OpenCV --far 0.001
+    python benchmarks/bench_models.py --models SFace Facenet512      # latency only
+    python benchmarks/bench_models.py --smoke    # every deepface client embeds a few crops, exit 1 if one fails
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import embedding_models  # noqa: E402
+import recognition  # noqa: E402
+from bulk_enroll import read_items  # noqa: E402
+from matcher import l2_normalize  # noqa: E402
+
+# Covers both kinds of deepface client: Keras models and SFace's OpenCV wrapper
+SMOKE_MODELS = ["VGG-Face", "Facenet512", "SFace"]
+
+
+def load_crops(source, aligned, min_confidence):
+    """(crops, labels) for the largest face of every photo in `source`; photos without a face are skipped."""
+    crops, labels = [], []
+    for name, path, _ in read_items(source):
+        image = recognition.cv2.imread(path)
+        if image is None:
+            continue
+        if aligned:
+            crops.append(image)
+        else:
+            face = recognition.largest_face(recognition.detect_faces(image, min_confidence=min_confidence))
+            if face is None:
+                continue
+            crops.append(face["face"])
+        labels.append(name)
+    return crops, np.array(labels)
+
+
+def pair_scores(embeddings, labels, max_impostors, seed=0):
+    """(genuine, impostor) cosine similarities: every same-person pair, sampled different-person pairs."""
+    rows, cols = np.triu_indices(len(labels), k=1)
+    same = labels[rows] == labels[cols]
+    genuine = np.einsum("ij,ij->i", embeddings[rows[same]], embeddings[cols[same]])
+    impostor_rows, impostor_cols = rows[~same], cols[~same]
+    if len(impostor_rows) > max_impostors:
+        pick = np.random.default_rng(seed).choice(len(impostor_rows), max_impostors, replace=False)
+        impostor_rows, impostor_cols = impostor_rows[pick], impostor_cols[pick]
+    impostor = np.einsum("ij,ij->i", embeddings[impostor_rows], embeddings[impostor_cols])
+    return genuine, impostor
+
+
+def threshold_at_far(impostor, far):
+    """Lowest threshold whose false accept rate on `impostor` is at most `far`."""
+    ordered = np.sort(impostor)[::-1]
+    allowed = int(far * len(ordered))
+    return float(np.nextafter(ordered[allowed], np.float32(2))) if allowed < len(ordered) else float(ordered[-1])
+
+
+def ms_per_face(embedder, crops, batch, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        embedder._forward(crops, batch)
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times)) / len(crops)
+
+
+def bench_model(model, crops, labels, args):
+    row = {"model": model, "threshold": embedding_models.threshold_for(model)}
+    try:
+        embedder = recognition.get_embedder(model)
+        embedder._forward(crops[:1], 1)  # warm-up
+    except Exception as e:
+        return dict(row, error=f"{type(e).__name__}: {e}")
+    timed = crops[:args.latency_faces]
+    row["ms_per_face_single"] = ms_per_face(embedder, timed, 1, args.repeat)
+    row["ms_per_face_batched"] = ms_per_face(embedder, timed, args.batch, args.repeat)
+    embeddings = l2_normalize(embedder._forward(crops, args.batch))
+    row["dim"] = embeddings.shape[1]
+    if labels is None:
+        return row
+    genuine, impostor = pair_scores(embeddings, labels, args.impostor_pairs)
+    threshold = threshold_at_far(impostor, args.far)
+    row.update(genuine_pairs=len(genuine), impostor_pairs=len(impostor),
+               far_at_threshold=float(np.mean(impostor >= row["threshold"])),
+               tar_at_threshold=float(np.mean(genuine >= row["threshold"])) if len(genuine) else None,
+               threshold_at_far=threshold,
+               tar_at_far=float(np.mean(genuine >= threshold)) if len(genuine) else None)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=list(embedding_models.MODELS),
+                        choices=list(embedding_models.MODELS))
+    parser.add_argument("--faces", default=None, help="photos by person: image directory or name,image CSV")
+    parser.add_argument("--aligned", action="store_true", help="photos are already face crops; skip detection")
+    parser.add_argument("--min-confidence", type=float, default=0.5)
+    parser.add_argument("--far", type=float, default=0.001, help="false accept target")
+    parser.add_argument("--min-tar", type=float, default=0.9, help="true accept rate the pick must reach at --far")
+    parser.add_argument("--impostor-pairs", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--latency-faces", type=int, default=32, help="crops timed per model")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--smoke", action="store_true",
+                        help=f"latency only on a few random crops for {', '.join(SMOKE_MODELS)} (unless --models "
+                             "is given); exits with status 1 if any model fails")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+    if args.smoke:
+        args.faces, args.latency_faces, args.repeat = None, min(args.latency_faces, 4), 1
+        if "--models" not in sys.argv:
+            args.models = SMOKE_MODELS
+
+    if args.faces:
+        crops, labels = load_crops(args.faces, args.aligned, args.min_confidence)
+        if len(crops) < 2:
+            print(f"Fewer than two usable faces in {args.faces!r}.")
+            return
+    else:
+        rng = np.random.default_rng(0)
+        crops, labels = [rng.integers(0, 255, (160, 160, 3), dtype=np.uint8) for _ in range(args.latency_faces)], None
+    rows = [bench_model(model, crops, labels, args) for model in args.models]
+    failed = args.smoke and any("error" in row for row in rows)
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(dict(row, faces=len(crops), far_target=args.far)))
+        sys.exit(1 if failed else 0)
+    people = f", {len(set(labels))} people" if labels is not None else " (random crops: latency only)"
+    print(f"{len(crops)} faces{people}; false accept target {args.far:g}")
+    print(f"{'model':>14}{'dim':>6}{'ms/face':>9}{'batched':>9}{'thresh':>8}{'FAR':>8}{'TAR':>7}"
+          f"{'thr@FAR':>9}{'TAR@FAR':>9}")
+    for row in rows:
+        if "error" in row:
+            print(f"{row['model']:>14}  skipped: {row['error']}")
+            continue
+        accuracy = "".join(f"{row[key]:>{width}.{digits}f}" if row.get(key) is not None else f"{'-':>{width}}"
+                           for key, width, digits in (("far_at_threshold", 8, 4), ("tar_at_threshold", 7, 3),
+                                                      ("threshold_at_far", 9, 3), ("tar_at_far", 9, 3)))
+        print(f"{row['model']:>14}{row['dim']:>6}{row['ms_per_face_single']:>9.1f}{row['ms_per_face_batched']:>9.1f}"
+              f"{row['threshold']:>8.2f}{accuracy}")
+    if labels is None:
+        sys.exit(1 if failed else 0)
+    if rows and 0 < rows[0].get("impostor_pairs", 0) < 10 / args.far:
+        print(f"Note: {rows[0]['impostor_pairs']} impostor pairs are too few to measure a {args.far:g} "
+              "false accept rate reliably; add more people.")
+    eligible = [row for row in rows if (row.get("tar_at_far") or 0) >= args.min_tar]
+    if eligible:
+        pick = min(eligible, key=lambda row: row["ms_per_face_batched"])
+        print(f"Fastest model reaching TAR {args.min_tar:g} at FAR {args.far:g}: {pick['model']} "
+              f"(set its threshold to {pick['threshold_at_far']:.3f} in embedding_models.py)")
+    else:
+        print(f"No model reaches TAR {args.min_tar:g} at FAR {args.far:g} on these faces.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""End-to-end benchmark of the recognition pipeline with the stub model.
+
+Times each stage on its own -- gallery load from SQLite, legacy JSON
+decoding, similarity (utils.cosine_similarity loop vs GalleryMatcher),
+drawing -- and the full frame loop, across gallery sizes and faces per
+frame. Needs no deepface weights or camera. Results are one JSON object
+per measurement, so runs from different releases can be diffed.
+
+    python benchmarks/bench_pipeline.py --sizes 10 1000 100000 1000000 --faces 1 5 20 --out results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import recognition  # noqa: E402
+import stub_model  # noqa: E402
+import utils  # noqa: E402
+from frame_source import SyntheticSource  # noqa: E402
+from matcher import GalleryMatcher  # noqa: E402
+from pipeline import Pipeline  # noqa: E402
+from synthetic import make_gallery, make_probes  # noqa: E402
+
+THRESHOLD = 0.68
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return 1000 * float(np.median(times))
+
+
+def build_db(path, gallery):
+    """A members.db at `path` holding `gallery`, bulk-inserted through database.add_members."""
+    database.DB_NAME = path
+    for start in range(0, len(gallery), 10000):
+        database.add_members((f"member{start + i}", row) for i, row in enumerate(gallery[start:start + 10000]))
+
+
+def bench_db(gallery, repeat, tmpdir):
+    path = os.path.join(tmpdir, f"bench_{len(gallery)}.db")
+    build_db(path, gallery)
+    try:
+        yield {"stage": "db_get_all_members", "ms": median_ms(database.get_all_members, repeat)}
+        yield {"stage": "db_load_embedding_matrix", "ms": median_ms(database.load_embedding_matrix, repeat)}
+    finally:
+        database.close_connection()
+        os.remove(path)
+
+
+def bench_decode(gallery, repeat):
+    # The pre-BLOB schema stored each embedding as a JSON list of floats
+    texts = [json.dumps(row.tolist()) for row in gallery]
+    blobs = [database.embedding_to_blob(row) for row in gallery]
+    yield {"stage": "decode_json", "ms": median_ms(lambda: [json.loads(t) for t in texts], repeat)}
+    yield {"stage": "decode_blob", "ms": median_ms(lambda: [database.blob_to_embedding(b) for b in blobs], repeat)}
+
+
+def bench_similarity(gallery, matcher, n_faces, repeat, loop_max):
+    probes, _ = make_probes(gallery, n_faces)
+    if len(gallery) <= loop_max:
+        def loop():
+            for probe in probes:
+                max(utils.cosine_similarity(probe, row) for row in gallery)
+        yield {"stage": "similarity_loop", "ms": median_ms(loop, 1)}
+    yield {"stage": "similarity_matcher", "ms": median_ms(lambda: matcher.best_matches(probes), repeat)}
+
+
+def fake_results(n_faces, width=640, height=480):
+    faces = stub_model.stub_detect(np.zeros((height, width, 3), dtype=np.uint8), n_faces)
+    return [{"name": f"member{i}", "similarity": 0.9, "region": face["facial_area"], "granted": i % 2 == 0}
+            for i, face in enumerate(faces)]
+
+
+def bench_draw(n_faces, repeat):
+    frame = SyntheticSource().frame(0)
+    results = fake_results(n_faces)
+    yield {"stage": "draw", "ms": median_ms(lambda: recognition.draw_results(frame.copy(), results), repeat)}
+
+
+def bench_frame_loop(matcher, n_faces, frames, work):
+    """Sequential read -> detect -> embed -> match -> draw, timed per step."""
+    source = SyntheticSource(frames, n_faces=n_faces)
+    steps = {"read": 0.0, "detect": 0.0, "embed": 0.0, "match": 0.0, "draw": 0.0}
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        ok, frame = source.read()
+        if not ok:
+            break
+        t1 = time.perf_counter()
+        faces = stub_model.stub_detect(frame, n_faces)
+        t2 = time.perf_counter()
+        embeddings = stub_model.stub_embed([face["face"] for face in faces], work)
+        t3 = time.perf_counter()
+        results = recognition.match_faces(faces, embeddings, matcher, THRESHOLD)
+        t4 = time.perf_counter()
+        if recognition.cv2 is not None:
+            recognition.draw_results(frame, results)
+        t5 = time.perf_counter()
+        for name, seconds in zip(steps, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            steps[name] += seconds
+    elapsed = time.perf_counter() - start
+    yield {"stage": "frame_loop", "fps": frames / elapsed, "ms": 1000 * elapsed / frames,
+           **{f"{name}_ms": 1000 * seconds / frames for name, seconds in steps.items()}}
+
+
+def bench_pipelined(matcher, n_faces, frames, work):
+    """The same steps on pipeline.Pipeline threads; frames that arrive while a stage is busy are dropped."""
+    source = SyntheticSource(frames, n_faces=n_faces)
+    pipeline = Pipeline(recognition.camera_source(source))
+    pipeline.add_stage("detect", lambda job: dict(job, faces=stub_model.stub_detect(job["frame"], n_faces)))
+    pipeline.add_stage("embed", lambda job: dict(job, embeddings=stub_model.stub_embed(
+        [face["face"] for face in job["faces"]], work)))
+    pipeline.add_stage("match", lambda job: dict(job, results=recognition.match_faces(
+        job["faces"], job["embeddings"], matcher, THRESHOLD)))
+    start = time.perf_counter()
+    pipeline.start()
+    while True:
+        job = pipeline.frames.get(timeout=0.1)
+        if job is None:
+            if pipeline.finished.is_set():
+                break
+            continue
+        latest = pipeline.latest
+        if recognition.cv2 is not None:
+            recognition.draw_results(job["frame"], latest["results"] if latest else [])
+    pipeline.stop()
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    yield {"stage": "frame_loop_pipelined", "fps": frames / elapsed,
+           "recognized_per_sec": stats["match"]["items"] / elapsed}
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {"commit": commit or None, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "args": vars(args)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000],
+                        help="gallery sizes (members)")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 5, 20], help="faces per frame")
+    parser.add_argument("--dim", type=int, default=stub_model.STUB_DIM,
+                        help="embedding size for the load/decode/similarity stages (the frame loop uses the stub's)")
+    parser.add_argument("--frames", type=int, default=100, help="frames per frame-loop run")
+    parser.add_argument("--work", type=int, default=40, help="stub forward-pass cost")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db-max", type=int, default=100000,
+                        help="largest gallery written to SQLite and JSON-decoded (both are slow to set up)")
+    parser.add_argument("--loop-max", type=int, default=10000,
+                        help="largest gallery timed with the pure-Python utils.cosine_similarity loop")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--out", help="also write {meta, results} as one JSON document to this file")
+    args = parser.parse_args()
+
+    rows = []
+
+    def emit(row):
+        rows.append(row)
+        if args.json:
+            print(json.dumps(row), flush=True)
+        else:
+            extra = "".join(f" {k}={v:.3f}" for k, v in row.items()
+                            if k not in ("stage", "members", "faces", "ms") and isinstance(v, float))
+            print(f"{row['stage']:<26} members={row.get('members', '-'):<8} faces={row.get('faces', '-'):<3} "
+                  f"{row['ms']:10.3f} ms{extra}" if "ms" in row else f"{row['stage']:<26}{extra}", flush=True)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            gallery = make_gallery(size, args.dim)
+            matcher = GalleryMatcher(gallery, [f"member{i}" for i in range(size)])
+            if size <= args.db_max:
+                for row in bench_db(gallery, args.repeat, tmpdir):
+                    emit({"members": size, "dim": args.dim, **row})
+                for row in bench_decode(gallery, args.repeat):
+                    emit({"members": size, "dim": args.dim, **row})
+            for n_faces in args.faces:
+                for row in bench_similarity(gallery, matcher, n_faces, args.repeat, args.loop_max):
+                    emit({"members": size, "faces": n_faces, "dim": args.dim, **row})
+            if args.dim != stub_model.STUB_DIM:
+                gallery = make_gallery(size, stub_model.STUB_DIM)
+                matcher = GalleryMatcher(gallery, [f"member{i}" for i in range(size)])
+            for n_faces in args.faces:
+                for bench in (bench_frame_loop, bench_pipelined):
+                    for row in bench(matcher, n_faces, args.frames, args.work):
+                        emit({"members": size, "faces": n_faces, **row})
+            del gallery, matcher
+    if recognition.cv2 is not None:
+        for n_faces in args.faces:
+            for row in bench_draw(n_faces, args.repeat):
+                emit({"faces": n_faces, **row})
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": metadata(args), "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Load test for recognition_service: p50/p99 latency versus request rate.
+
+Sends frames open-loop at each --rates value (requests/sec, Poisson
+arrivals) for --duration seconds and reports achieved throughput, latency
+percentiles, errors by status and the mean faces per forward pass. By default the
+service runs in-process with the stub detector and model and a synthetic
+gallery, once per --windows value, so micro-batching can be compared with
+none (0 ms). With --url, a running service is tested instead.
+
+    python benchmarks/bench_service.py --rates 20 50 100 200 --windows 0 5
+    python benchmarks/bench_service.py --url 127.0.0.1:8088 --image face.jpg --rates 5 10 20
+    python benchmarks/bench_service.py --url unix:/run/entry-recognize.sock --image face.jpg
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_model  # noqa: E402
+from matcher import GalleryMatcher  # noqa: E402
+from recognition_service import RecognitionService  # noqa: E402
+from synthetic import make_gallery  # noqa: E402
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+async def post(address, body, path):
+    """(status, response dict, seconds) for one POST; a new connection per request, like the service."""
+    start = time.perf_counter()
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    content_type, data = body
+    head = (f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n")
+    writer.write(head.encode("latin-1") + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    header, _, payload = response.partition(b"\r\n\r\n")
+    status = int(header.split()[1])
+    return status, json.loads(payload or b"{}"), time.perf_counter() - start
+
+
+async def run_rate(address, body, path, rate, duration, seed=0):
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, int(rate * duration) + 1))
+    arrivals = arrivals[arrivals < duration]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def one(at):
+        await asyncio.sleep(max(0.0, start + at - loop.time()))
+        try:
+            return await post(address, body, path)
+        except OSError as e:
+            return type(e).__name__, {}, 0.0
+
+    results = await asyncio.gather(*(one(at) for at in arrivals))
+    elapsed = loop.time() - start
+    latencies = np.array([seconds for status, _, seconds in results if status == 200])
+    errors = {}
+    for status, _, _ in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "rate": rate,
+        "sent": len(results),
+        "achieved_per_sec": len(latencies) / elapsed,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p99_ms": 1000 * float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "errors": errors,
+    }
+
+
+def request_body(args):
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+        return ("image/png" if args.image.lower().endswith(".png") else "image/jpeg"), data, ""
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    if cv2 is not None:
+        return "image/jpeg", cv2.imencode(".jpg", frame)[1].tobytes(), ""
+    return "application/octet-stream", frame.tobytes(), "&width=640&height=480"
+
+
+async def main_async(args):
+    content_type, data, extra = request_body(args)
+    body = (content_type, data)
+    path = f"/recognize?door=bench{extra}"
+    rows = []
+    if args.url:
+        address = args.url[len("unix:"):] if args.url.startswith("unix:") else \
+            (args.url.rpartition(":")[0] or "127.0.0.1", int(args.url.rpartition(":")[2]))
+        for rate in args.rates:
+            rows.append(dict(await run_rate(address, body, path, rate, args.duration), window_ms=None))
+        return rows
+
+    gallery = make_gallery(args.members, stub_model.STUB_DIM)
+    matcher = GalleryMatcher(gallery, [f"member{i}" for i in range(len(gallery))])
+    for window_ms in args.windows:
+        service = RecognitionService(
+            lambda: matcher, detect=functools.partial(stub_model.stub_detect, n_faces=args.faces),
+            embed=functools.partial(stub_model.stub_embed, work=args.work), batch_window=window_ms / 1000,
+            max_pending=args.max_pending, request_timeout=args.timeout, workers=args.workers)
+        await service.start("127.0.0.1:0")
+        address = service.address[:2]
+        await post(address, body, path)  # warm-up
+        for rate in args.rates:
+            batches, items = service.batcher.batches, service.batcher.items
+            row = await run_rate(address, body, path, rate, args.duration)
+            batches = service.batcher.batches - batches
+            row.update(window_ms=window_ms,
+                       faces_per_batch=(service.batcher.items - items) / batches if batches else 0.0)
+            rows.append(row)
+        await service.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="HOST:PORT or unix:/path.sock of a running service")
+    parser.add_argument("--image", default=None, help="JPEG/PNG to send (default: a synthetic 640x480 frame)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per rate")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5],
+                        help="batch windows in ms to compare (in-process service only)")
+    parser.add_argument("--faces", type=int, default=1, help="faces per frame (stub only)")
+    parser.add_argument("--work", type=int, default=40, help="stub forward-pass cost")
+    parser.add_argument("--members", type=int, default=10000, help="synthetic gallery size")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    rows = asyncio.run(main_async(args))
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    print(f"{'window':>7}{'rate/s':>8}{'ok/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'faces/batch':>13}  errors")
+    for row in rows:
+        window = "-" if row["window_ms"] is None else f"{row['window_ms']:g}ms"
+        p50 = f"{row['p50_ms']:.1f}" if row["p50_ms"] is not None else "-"
+        p99 = f"{row['p99_ms']:.1f}" if row["p99_ms"] is not None else "-"
+        batch = f"{row['faces_per_batch']:.1f}" if "faces_per_batch" in row else "-"
+        errors = ", ".join(f"{status}: {n}" for status, n in row["errors"].items()) or "-"
+        print(f"{window:>7}{row['rate']:>8g}{row['achieved_per_sec']:>8.1f}{p50:>9}{p99:>9}{batch:>13}  {errors}")
+
+
+if __name__ == "__main__":
+    main()
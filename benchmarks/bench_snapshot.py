@@ -0,0 +1,125 @@
+"""Startup time and memory of a private gallery per process versus a shared memory-mapped snapshot.
+
+Builds a synthetic members.db in a temporary directory, then for each
+--processes count starts that many recognizer-like processes which load the
+gallery, score a probe against every member (so every page is touched) and
+report their memory from /proc/self/smaps_rollup while all of them are
+alive. "private" is the pre-snapshot path (load_embedding_matrix into a
+GalleryMatcher per process); "snapshot" maps the gallery_snapshot file.
+PSS (proportional set size) splits shared pages between the processes
+mapping them, so the PSS total is what the processes really cost the box.
+Memory columns need Linux; startup times are reported everywhere.
+
+    python benchmarks/bench_snapshot.py --members 100000 --dim 2622 --processes 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import gallery_snapshot  # noqa: E402
+from matcher import GalleryMatcher  # noqa: E402
+from synthetic import make_gallery  # noqa: E402
+
+MODES = ("private", "snapshot")
+
+
+def memory_mb():
+    """{"rss", "pss", "private"} of this process in MB, or None off Linux."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.rstrip().endswith("kB")}
+    except OSError:
+        return None
+    return {"rss": fields["Rss"] / 1024, "pss": fields["Pss"] / 1024,
+            "private": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024}
+
+
+def load_gallery(mode):
+    if mode == "snapshot":
+        return gallery_snapshot.GallerySnapshot(gallery_snapshot.latest_snapshot()).matcher()
+    ids, names, matrix = database.load_embedding_matrix()
+    return GalleryMatcher(matrix, names, ids, database.load_samples(ids))
+
+
+def worker(mode, db_path, barrier, results):
+    database.DB_NAME = db_path
+    start = time.perf_counter()
+    matcher = load_gallery(mode) if mode != "baseline" else None
+    startup = time.perf_counter() - start
+    if matcher is not None:
+        matcher.best_matches(np.ones((1, matcher.dim), dtype=np.float32))
+    # Measure only once every process holds its gallery, so shared pages are split between all of them
+    barrier.wait()
+    results.put({"startup_ms": 1000 * startup, "memory": memory_mb()})
+    barrier.wait()
+
+
+def run_processes(mode, db_path, n):
+    ctx = multiprocessing.get_context("spawn")  # a fresh interpreter, like separately started services
+    barrier, results = ctx.Barrier(n), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, db_path, barrier, results)) for _ in range(n)]
+    for proc in procs:
+        proc.start()
+    rows = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    row = {"mode": mode, "processes": n, "startup_ms": float(np.median([r["startup_ms"] for r in rows]))}
+    if all(r["memory"] is not None for r in rows):
+        for key in ("rss", "pss", "private"):
+            row[f"{key}_mb"] = float(np.mean([r["memory"][key] for r in rows]))
+        row["pss_total_mb"] = float(sum(r["memory"]["pss"] for r in rows))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=2622, help="embedding size (VGG-Face: 2622)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = database.DB_NAME = os.path.join(tmpdir, "members.db")
+        gallery = make_gallery(args.members, args.dim)
+        for start in range(0, len(gallery), 10000):
+            database.add_members((f"member{start + i}", row) for i, row in enumerate(gallery[start:start + 10000]))
+        del gallery
+        start = time.perf_counter()
+        path = gallery_snapshot.export_snapshot()
+        export_ms = 1000 * (time.perf_counter() - start)
+        database.close_connection()
+
+        rows.append(dict(run_processes("baseline", db_path, 1), processes=0))
+        for n in args.processes:
+            for mode in MODES:
+                rows.append(run_processes(mode, db_path, n))
+        snapshot_mb = os.path.getsize(path) / 2 ** 20
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(dict(row, members=args.members, dim=args.dim, export_ms=export_ms,
+                                  snapshot_mb=snapshot_mb)))
+        return
+    print(f"{args.members} members x {args.dim} dims: snapshot {snapshot_mb:.0f} MB, exported once in "
+          f"{export_ms:.0f} ms")
+    print(f"{'mode':>9}{'procs':>7}{'startup ms':>12}{'RSS MB':>9}{'PSS MB':>9}{'private MB':>12}{'PSS total':>11}")
+    for row in rows:
+        memory = (f"{row['rss_mb']:>9.0f}{row['pss_mb']:>9.0f}{row['private_mb']:>12.0f}{row['pss_total_mb']:>11.0f}"
+                  if "rss_mb" in row else f"{'n/a':>9}{'n/a':>9}{'n/a':>12}{'n/a':>11}")
+        print(f"{row['mode']:>9}{row['processes'] or '-':>7}{row['startup_ms']:>12.1f}{memory}")
+    print("baseline: the interpreter and imports alone, without a gallery.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""CPU-bound stand-ins for the face detector and embedding model.
+
+Lets the benchmarks exercise the real pipeline code paths without deepface
+weights or a camera. Costs are tunable so the stubs can be calibrated to
+roughly match a real detector/model on the target box.
+"""
+import numpy as np
+
+STUB_DIM = 512
+CROP_SIZE = 32
+_PROJECTION = np.random.default_rng(0).standard_normal((CROP_SIZE * CROP_SIZE * 3, STUB_DIM)).astype(np.float32)
+_BURN = np.random.default_rng(1).standard_normal((STUB_DIM, STUB_DIM)).astype(np.float32) / np.sqrt(STUB_DIM)
+
+
+def stub_detect(frame, n_faces=1, face_size=96):
+    """Fixed grid of `n_faces` square boxes, shaped like recognition.detect_faces() output."""
+    h, w = frame.shape[:2]
+    per_row = max(1, w // face_size)
+    faces = []
+    for i in range(n_faces):
+        x = (i % per_row) * face_size % max(1, w - face_size)
+        y = (i // per_row) * face_size % max(1, h - face_size)
+        crop = frame[y:y + face_size, x:x + face_size]
+        faces.append({"face": crop, "facial_area": {"x": x, "y": y, "w": face_size, "h": face_size},
+                      "confidence": 0.99})
+    return faces
+
+
+def stub_embed(crops, work=40):
+    """(len(crops), STUB_DIM) embeddings; `work` extra matmuls per crop simulate the forward pass."""
+    if len(crops) == 0:
+        return np.zeros((0, STUB_DIM), dtype=np.float32)
+    step_h = max(1, crops[0].shape[0] // CROP_SIZE)
+    step_w = max(1, crops[0].shape[1] // CROP_SIZE)
+    small = [np.resize(c[::step_h, ::step_w], (CROP_SIZE, CROP_SIZE, 3)) for c in crops]
+    x = np.stack(small).reshape(len(crops), -1).astype(np.float32) / 255.0
+    out = x @ _PROJECTION
+    for _ in range(work):
+        out = np.tanh(out @ _BURN)
+    return out
+
+
+def analyze_frame(frame, n_faces=1, work=40):
+    """Drop-in for recognition.analyze_frame, usable as an InferencePool worker function."""
+    faces = stub_detect(frame, n_faces)
+    embeddings = stub_embed([face["face"] for face in faces], work)
+    return [{"facial_area": face["facial_area"], "confidence": face["confidence"], "embedding": embedding}
+            for face, embedding in zip(faces, embeddings)]
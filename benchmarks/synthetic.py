@@ -0,0 +1,27 @@
+"""Synthetic galleries and probe faces for the benchmarks (no model or camera needed)."""
+import numpy as np
+
+
+def make_gallery(n_members, dim=512, n_clusters=None, seed=0):
+    """Return an (n_members, dim) float32 gallery of unit vectors.
+
+    Members are drawn around `n_clusters` random centres, which roughly mimics
+    how real face embeddings crowd together by age/pose/ethnicity.
+    """
+    rng = np.random.default_rng(seed)
+    if n_clusters is None:
+        n_clusters = max(1, n_members // 100)
+    centres = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    gallery = centres[rng.integers(0, n_clusters, n_members)]
+    gallery += 0.8 * rng.standard_normal((n_members, dim)).astype(np.float32)
+    gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+    return gallery
+
+
+def make_probes(gallery, n_probes, noise=0.5, seed=1):
+    """Noisy re-captures of random gallery members: (probes, true_rows)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery), n_probes)
+    dim = gallery.shape[1]
+    probes = gallery[rows] + noise / np.sqrt(dim) * rng.standard_normal((n_probes, dim)).astype(np.float32)
+    return probes.astype(np.float32), rows
@@ -0,0 +1,201 @@
+"""Offline bulk enrollment from a folder of photos or a CSV export.
+
+Images are decoded in worker processes (no temp files), faces are detected
+per image and embedded a batch at a time in one forward pass, and each
+finished batch is written with one bulk insert. Members whose name is
+already in the database are skipped, so an interrupted import resumes
+where it stopped when run again. Photos that fail are recorded in the
+import_failures table, and a member with failed photos is imported again
+from all of their photos on the next run, so fixed photos are picked up
+too. Several photos of one person (a
+sub-folder, or repeated CSV rows) become one multi-sample template.
+
+Re-embedding runs the same import with another model over the enrollment
+photos, for members only: each gets a second row tagged with the new model
+next to the old one, so the running system keeps matching with the old
+gallery until it is switched over.
+
+    python admin.py import photos/            # photos/John_Doe.jpg or photos/John Doe/*.jpg -> "John Doe"
+    python admin.py import members.csv        # columns: name, image[, membership_type]
+    python admin.py reembed SFace photos/     # migrate the gallery to SFace
+"""
+import csv
+import multiprocessing as mp
+import os
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import database
+import recognition
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# (name, image path, membership type)
+Item = Tuple[str, str, str]
+
+
+def read_items(source: str) -> Iterator[Item]:
+    """Enrollment items from an image directory or a CSV file.
+
+    In a directory, an image is named after its file and every image in a
+    sub-folder after the folder.
+    """
+    if os.path.isdir(source):
+        for entry in sorted(os.listdir(source)):
+            path = os.path.join(source, entry)
+            stem, ext = os.path.splitext(entry)
+            if os.path.isdir(path):
+                for image in sorted(os.listdir(path)):
+                    if os.path.splitext(image)[1].lower() in IMAGE_EXTENSIONS:
+                        yield entry.replace("_", " ").strip(), os.path.join(path, image), "Premium"
+            elif ext.lower() in IMAGE_EXTENSIONS:
+                yield stem.replace("_", " ").strip(), path, "Premium"
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            path = row.get("image") or row.get("path") or row.get("photo")
+            if not row.get("name") or not path:
+                continue
+            yield row["name"], os.path.join(base, path), row.get("membership_type") or "Premium"
+
+
+_embedder = None
+_worker_config = {}
+
+
+def _init_worker(model_name, detector_backend, min_confidence):
+    global _embedder
+    _embedder = recognition.get_embedder(model_name)
+    _worker_config.update(detector_backend=detector_backend, min_confidence=min_confidence)
+
+
+def _embed_batch(items: List[Item]):
+    """[(item, embedding or None, error or None)] for a batch of items, one forward pass for all faces."""
+    crops, ok_items, results = [], [], []
+    for item in items:
+        try:
+            if not os.path.isfile(item[1]):
+                raise ValueError("file not found")
+            image = recognition.cv2.imread(item[1])
+            if image is None:
+                raise ValueError("unreadable image")
+            faces = recognition.detect_faces(image, _worker_config["detector_backend"],
+                                             _worker_config["min_confidence"])
+            if not faces:
+                raise ValueError("no face detected")
+            # ID photos: the biggest confident face is the member
+            crops.append(recognition.largest_face(faces)["face"])
+            ok_items.append(item)
+        except Exception as e:
+            results.append((item, None, str(e) or type(e).__name__))
+    if crops:
+        embeddings = _embedder.embed(crops)
+        results.extend((item, embedding, None) for item, embedding in zip(ok_items, embeddings))
+    return results
+
+
+def _batches(items: List[Item], size: int) -> Iterator[List[Item]]:
+    # Items arrive grouped by name; a member's images never straddle two batches
+    batch = []
+    for i, item in enumerate(items):
+        batch.append(item)
+        if len(batch) >= size and (i + 1 == len(items) or items[i + 1][0] != item[0]):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_members(source: str, workers: Optional[int] = None, batch_size: int = 16,
+                   model_name: str = recognition.MODEL_NAME, detector_backend: str = recognition.DETECTOR_BACKEND,
+                   min_confidence: float = 0.5, progress: Optional[Callable[[dict], None]] = None,
+                   members_only: bool = False) -> dict:
+    """Enroll every new member found in `source`; returns the final stats dict.
+
+    A member is new until they have an embedding from `model_name`. With
+    `members_only`, people who are not members yet are skipped and members
+    keep their membership type (see reembed_members). `workers` processes
+    (default: up to 4, each loads its own model; 0 runs in this process)
+    embed batches of `batch_size` images. `progress(stats)` is called after
+    every written batch. Members with photos that failed last time are
+    imported again from all of their photos and their template replaced.
+    """
+    existing = {member["name"] for member in database.list_members(model_name)}
+    # Enrolled from the good photos only: retry them, or their fixed photos would never be read
+    retry = existing & database.names_with_import_failures(model_name)
+    existing -= retry
+    members = {member["name"]: member["membership_type"] for member in database.list_members()}
+    grouped = {}
+    stats = {"total": 0, "enrolled": 0, "retried": 0, "samples": 0, "skipped": 0, "failed": 0,
+             "images_per_sec": 0.0, "elapsed": 0.0, "failures": []}
+    for name, path, membership_type in read_items(source):
+        stats["total"] += 1
+        if name in existing or (members_only and name not in members):
+            stats["skipped"] += 1
+        else:
+            if members_only:
+                membership_type = members[name] or membership_type
+            grouped.setdefault(name, []).append((name, path, membership_type))
+    items = [item for member_items in grouped.values() for item in member_items]
+
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    start = time.perf_counter()
+    initargs = (model_name, detector_backend, min_confidence)
+    if workers:
+        pool = mp.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=initargs)
+        results = pool.imap_unordered(_embed_batch, _batches(items, batch_size))
+    else:
+        pool = None
+        _init_worker(*initargs)
+        results = map(_embed_batch, _batches(items, batch_size))
+    try:
+        done = 0
+        for batch in results:
+            templates, failures = {}, []
+            for item, embedding, error in batch:
+                if error is None:
+                    templates.setdefault(item[0], (item[2], []))[1].append(embedding)
+                else:
+                    failures.append((item[0], item[1], error))
+            stats["failed"] += len(failures)
+            stats["failures"].extend((image, error) for _, image, error in failures)
+            rows = [(name, np.array(samples), membership_type)
+                    for name, (membership_type, samples) in templates.items()]
+            # Failures first: a member written without them would never be retried
+            database.replace_import_failures({item[0] for item, _, _ in batch}, failures, model_name=model_name)
+            # One transaction per batch: an interruption loses at most the batches in flight
+            database.add_members([row for row in rows if row[0] not in retry], model_name=model_name)
+            stats["retried"] += database.upsert_members([row for row in rows if row[0] in retry],
+                                                        model_name=model_name)[1]
+            stats["enrolled"] += len(rows)
+            stats["samples"] += sum(len(samples) for _, samples in templates.values())
+            done += len(batch)
+            stats["elapsed"] = time.perf_counter() - start
+            stats["images_per_sec"] = done / stats["elapsed"] if stats["elapsed"] else 0.0
+            if progress is not None:
+                progress(stats)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return stats
+
+
+def reembed_members(source: str, model_name: str, **options) -> dict:
+    """Embed every member with `model_name` from their enrollment photos in `source`.
+
+    The stored embeddings cannot be converted between models, so the photos
+    are needed again. Members who already have a `model_name` embedding are
+    skipped, so an interrupted run resumes. The stats gain "missing": members
+    without a `model_name` embedding afterwards (no usable photo in `source`).
+    Options are those of import_members.
+    """
+    stats = import_members(source, model_name=model_name, members_only=True, **options)
+    migrated = {member["name"] for member in database.list_members(model_name)}
+    stats["missing"] = sorted({member["name"] for member in database.list_members()} - migrated)
+    return stats
@@ -0,0 +1,204 @@
+"""Compact in-memory galleries for memory-bound deployments.
+
+A float32 VGG-Face template costs 16 KB per member (4096 dims). CompactMatcher
+keeps a reduced-precision copy instead and scores every query against it,
+then re-scores the top candidates exactly against float32 rows fetched on
+demand (from members.db by default, see gallery_cache.GalleryCache), so
+access decisions stay those of the exact matcher:
+
+    float16  2 bytes/dim, practically lossless
+    int8     1 byte/dim plus a per-vector float32 scale
+    pca      `pca_dim` float16 components of a projection fitted on the gallery
+
+The PCA basis is fitted on the oldest `fit_size` members. Members enrolled
+later are encoded with it but need not lie in it, so their approximate
+scores are noisier, and pca recall depends on the exact rescoring window
+(`rescore_candidates`) catching them. A gallery with fewer members than
+components has no full basis yet: it reports needs_refit, and
+gallery_cache rebuilds it as members arrive.
+
+Measure the accuracy impact with `python benchmarks/bench_compact.py`.
+"""
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from matcher import GalleryMatcher, l2_normalize
+
+MODES = ("float16", "int8", "pca")
+
+# Rows dequantized per step while scoring, so the float32 working set stays around 16 MB
+SCORE_CHUNK_BYTES = 16 * 1024 * 1024
+
+# fetch(ids) -> (found_ids, (len(found_ids), dim) float32 matrix); missing ids are left out
+FetchExact = Callable[[Sequence[int]], Tuple[np.ndarray, np.ndarray]]
+
+
+def fit_pca(vectors: np.ndarray, n_components: int) -> np.ndarray:
+    """(n_components, dim) orthonormal projection keeping most of the rows' energy.
+
+    Uncentered, so dot products between projected unit vectors approximate
+    the original cosine similarities.
+    """
+    n_components = min(n_components, *vectors.shape)
+    _, _, vt = np.linalg.svd(l2_normalize(vectors), full_matrices=False)
+    return np.ascontiguousarray(vt[:n_components], dtype=np.float32)
+
+
+class CompactMatcher(GalleryMatcher):
+    """GalleryMatcher over float16, int8 or PCA codes, with exact rescoring of the top candidates.
+
+    The `rescore_candidates` best approximate hits per query are re-scored
+    exactly with `fetch`; without one the approximate scores are final.
+    Multi-sample members are then reranked by their samples as usual
+    (samples are kept in float32).
+    """
+
+    rescore_candidates = 32
+
+    def __init__(self, mode: str = "int8", input_dim: int = 0, projection: Optional[np.ndarray] = None,
+                 fetch: Optional[FetchExact] = None, pca_dim: int = 256, fit_size: int = 2000):
+        if mode not in MODES:
+            raise ValueError(f"Unknown compact mode {mode!r}; expected one of {MODES}")
+        if mode == "pca" and projection is None and input_dim:
+            raise ValueError("pca mode needs a projection (see fit_pca)")
+        self.mode = mode
+        self.input_dim = input_dim
+        self.projection = projection
+        self.fetch = fetch
+        self.pca_dim = pca_dim
+        self.fit_size = fit_size
+        self.codes = np.zeros((0, self._code_dim()), dtype=np.int8 if mode == "int8" else np.float16)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.names = np.array([], dtype=object)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.samples = {}
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[Sequence[int], Sequence[str], np.ndarray]], mode: str = "int8",
+              pca_dim: int = 256, fit_size: int = 2000, fetch: Optional[FetchExact] = None) -> GalleryMatcher:
+        """Encode a gallery arriving as (ids, names, float32 matrix) chunks, e.g. from
+        database.iter_embedding_matrix(), without ever holding it all in float32.
+
+        In pca mode the projection is fitted on the first `fit_size` members;
+        an empty gallery has none until members are added (see needs_refit).
+        """
+        matcher, parts = None, []
+        for ids, names, matrix in chunks:
+            if len(names) == 0:
+                continue
+            if matcher is None:
+                projection = fit_pca(matrix[:fit_size], pca_dim) if mode == "pca" else None
+                matcher = cls(mode, matrix.shape[1], projection, fetch, pca_dim, fit_size)
+            parts.append((np.asarray(ids, dtype=np.int64), list(names), matcher.encode(matrix)))
+        if matcher is None:
+            return cls(mode, fetch=fetch, pca_dim=pca_dim, fit_size=fit_size)
+        matcher.ids = np.concatenate([ids for ids, _, _ in parts])
+        matcher.names = np.array([name for _, names, _ in parts for name in names], dtype=object)
+        matcher.codes = np.concatenate([codes for _, _, (codes, _) in parts])
+        matcher.scales = np.concatenate([scales for _, _, (_, scales) in parts])
+        return matcher
+
+    def _code_dim(self) -> int:
+        return len(self.projection) if self.projection is not None else self.input_dim
+
+    @property
+    def needs_refit(self) -> bool:
+        """pca mode only: the basis was fitted on fewer members than it has components (or on none)."""
+        if self.mode != "pca":
+            return False
+        return self.projection is None or len(self.projection) < min(self.pca_dim, self.input_dim)
+
+    def _copy(self) -> "CompactMatcher":
+        matcher = CompactMatcher(self.mode, self.input_dim, self.projection, self.fetch, self.pca_dim, self.fit_size)
+        matcher.rescore_candidates = self.rescore_candidates
+        return matcher
+
+    def encode(self, embeddings) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes, per-row scales) for raw embeddings; scales are 1 except in int8 mode."""
+        vectors = l2_normalize(embeddings)
+        if self.projection is not None:
+            vectors = l2_normalize(vectors @ self.projection.T)
+        scales = np.ones(len(vectors), dtype=np.float32)
+        if self.mode == "int8":
+            peak = np.abs(vectors).max(axis=1)
+            scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales
+        return vectors.astype(np.float16), scales
+
+    def with_changes(self, remove_ids: Iterable[int] = (), embeddings=None, names: Sequence[str] = (),
+                     ids: Sequence[int] = (), samples: Optional[Dict[int, np.ndarray]] = None) -> "CompactMatcher":
+        """Same as GalleryMatcher.with_changes; new members are encoded with the existing projection."""
+        names = list(names)
+        drop = set(int(i) for i in remove_ids) | set(int(i) for i in ids)
+        keep = ~np.isin(self.ids, list(drop)) if drop else np.ones(len(self), dtype=bool)
+        matcher = self._copy()
+        matcher.codes, matcher.scales = self.codes[keep], self.scales[keep]
+        matcher.names, matcher.ids = self.names[keep], self.ids[keep]
+        matcher.samples = {k: v for k, v in self.samples.items() if k not in drop}
+        matcher.samples.update((int(k), l2_normalize(v)) for k, v in (samples or {}).items())
+        if names:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            if matcher.input_dim and embeddings.shape[1] != matcher.input_dim:
+                raise ValueError(f"New embeddings have dimension {embeddings.shape[1]}, "
+                                 f"gallery has {matcher.input_dim}")
+            if not matcher.input_dim:
+                matcher.input_dim = embeddings.shape[1]
+                if matcher.mode == "pca":
+                    # Started empty: fit on what arrives; needs_refit tells the owner to refit on more
+                    matcher.projection = fit_pca(embeddings[:matcher.fit_size], matcher.pca_dim)
+                matcher.codes = matcher.codes.reshape(0, matcher._code_dim())
+            codes, scales = matcher.encode(embeddings)
+            matcher.codes = np.concatenate([matcher.codes, codes])
+            matcher.scales = np.concatenate([matcher.scales, scales])
+            matcher.names = np.concatenate([matcher.names, np.array(names, dtype=object)])
+            matcher.ids = np.concatenate([matcher.ids, np.asarray(ids, dtype=np.int64)])
+        return matcher
+
+    @property
+    def dim(self) -> int:
+        return self.input_dim
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the codes and scales (names, ids and samples not included)."""
+        return self.codes.nbytes + self.scales.nbytes
+
+    def scores(self, queries) -> np.ndarray:
+        """Approximate cosine similarity of every query against every member."""
+        queries = l2_normalize(queries)
+        if len(self) == 0:
+            return np.zeros((queries.shape[0], 0), dtype=np.float32)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match gallery dimension {self.dim}")
+        if self.projection is not None:
+            queries = l2_normalize(queries @ self.projection.T)
+        sims = np.empty((len(queries), len(self)), dtype=np.float32)
+        step = max(1, SCORE_CHUNK_BYTES // (4 * self.codes.shape[1]))
+        for start in range(0, len(self), step):
+            chunk = self.codes[start:start + step].astype(np.float32)
+            sims[:, start:start + step] = queries @ chunk.T
+        if self.mode == "int8":
+            sims *= self.scales
+        return sims
+
+    def candidates(self, k: int) -> int:
+        return max(super().candidates(k), self.rescore_candidates if self.fetch is not None else k)
+
+    def rerank(self, queries, indices: np.ndarray, sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact float32 scores for the approximate candidates, then the usual sample rerank."""
+        if self.fetch is not None and indices.size:
+            rows = np.unique(indices)
+            found_ids, matrix = self.fetch(self.ids[rows].tolist())
+            exact = dict(zip(np.asarray(found_ids).tolist(), l2_normalize(matrix))) if len(found_ids) else {}
+            sims = sims.copy()
+            for qi, query in enumerate(queries):
+                for ci, row in enumerate(indices[qi]):
+                    vector = exact.get(int(self.ids[row]))
+                    # Members deleted since this matcher was built keep their approximate score
+                    if vector is not None and sims[qi, ci] > -1.0:
+                        sims[qi, ci] = vector @ query
+            order = np.argsort(-sims, axis=1, kind="stable")
+            indices = np.take_along_axis(indices, order, axis=1)
+            sims = np.take_along_axis(sims, order, axis=1)
+        return super().rerank(queries, indices, sims, k)
@@ -1,52 +1,535 @@
-import sqlite3
-import json
-import numpy as np
-
-DB_NAME = "members.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS members (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            embedding TEXT NOT NULL,
-            membership_type TEXT DEFAULT 'Premium',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def add_member(name, embedding, membership_type='Premium'):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    # Convert embedding (list of floats) to JSON string
-    embedding_json = json.dumps(embedding.tolist() if isinstance(embedding, np.ndarray) else embedding)
-    cursor.execute('INSERT INTO members (name, embedding, membership_type) VALUES (?, ?, ?)', 
-                   (name, embedding_json, membership_type))
-    conn.commit()
-    conn.close()
-
-def get_all_members():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('SELECT name, embedding FROM members')
-    rows = cursor.fetchall()
-    conn.close()
-    
-    members = []
-    for row in rows:
-        members.append({
-            "name": row[0],
-            "embedding": json.loads(row[1])
-        })
-    return members
-
-# Ensure database is initialized when module is imported
-init_db()
-
-if __name__ == "__main__":
-    # When run as script, also print confirmation
-    print("Database initialized.")
+import sqlite3
+import json
+import threading
+import numpy as np
+
+from matcher import template_centroid
+
+DB_NAME = "members.db"
+
+# Bump when the members table layout changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 2
+DEFAULT_MODEL = "VGG-Face"  # model of rows enrolled before embeddings were tagged (see embedding_models)
+EMBEDDING_DTYPE = np.float32
+
+MEMBERS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        embedding_dim INTEGER NOT NULL,
+        embedding_model TEXT NOT NULL DEFAULT 'VGG-Face',
+        membership_type TEXT DEFAULT 'Premium',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Change log written by triggers, so running processes can pull only what changed
+CHANGE_LOG_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS member_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        member_id INTEGER NOT NULL,
+        op TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS members_after_insert AFTER INSERT ON members
+    BEGIN
+        INSERT INTO member_changes (member_id, op) VALUES (NEW.id, 'insert');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS members_after_update AFTER UPDATE ON members
+    BEGIN
+        INSERT INTO member_changes (member_id, op) VALUES (NEW.id, 'update');
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS members_after_delete AFTER DELETE ON members
+    BEGIN
+        INSERT INTO member_changes (member_id, op) VALUES (OLD.id, 'delete');
+    END
+    ''',
+]
+
+# Audit trail of access decisions, written in batches by access_log.AccessLogWriter
+ACCESS_EVENTS_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS access_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        door TEXT,
+        name TEXT NOT NULL,
+        granted INTEGER NOT NULL,
+        similarity REAL,
+        track_id INTEGER,
+        latency_ms REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_access_events_ts ON access_events (ts)',
+    'CREATE INDEX IF NOT EXISTS idx_access_events_name_ts ON access_events (name, ts)',
+]
+
+# Per-frame embeddings of members enrolled from several frames; members.embedding holds their
+# normalized centroid. Deleting a member deletes its samples.
+MEMBER_SAMPLES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS member_samples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        member_id INTEGER NOT NULL,
+        embedding BLOB NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_member_samples_member ON member_samples (member_id)',
+    '''
+    CREATE TRIGGER IF NOT EXISTS members_delete_samples AFTER DELETE ON members
+    BEGIN
+        DELETE FROM member_samples WHERE member_id = OLD.id;
+    END
+    ''',
+]
+
+# Photos that failed in a bulk import (see bulk_enroll), so the next run re-imports those members
+IMPORT_FAILURES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS import_failures (
+        name TEXT NOT NULL,
+        embedding_model TEXT NOT NULL,
+        image TEXT NOT NULL,
+        error TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_import_failures_model_name ON import_failures (embedding_model, name)',
+]
+
+# Rebuilding the members table during migration drops its indexes, so these run afterwards
+MEMBERS_INDEX_SQL = [
+    'CREATE INDEX IF NOT EXISTS idx_members_name ON members (name)',
+]
+
+# Per-connection settings for a read-heavy workload (journal_mode=WAL is stored in the file itself)
+CONNECTION_PRAGMAS = [
+    'PRAGMA synchronous=NORMAL',  # safe with WAL; a power cut can only lose the last commits
+    'PRAGMA cache_size=-16000',  # 16 MB page cache
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',  # read pages straight from the OS page cache
+    'PRAGMA busy_timeout=5000',  # wait for a concurrent writer instead of failing
+]
+
+_local = threading.local()
+_initialized = set()
+_init_lock = threading.Lock()
+
+def get_connection():
+    """This thread's connection to DB_NAME, opened (and the schema ensured) on first use.
+
+    sqlite3 connections must not be shared between threads, so each thread
+    keeps one per database file and every function below reuses it instead
+    of connecting per call.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(DB_NAME)
+    if conn is None:
+        if DB_NAME not in _initialized:
+            init_db()
+        conn = sqlite3.connect(DB_NAME)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conns[DB_NAME] = conn
+    return conn
+
+def close_connection():
+    """Close this thread's connection; the next call opens a new one."""
+    conn = getattr(_local, "conns", {}).pop(DB_NAME, None)
+    if conn is not None:
+        conn.close()
+
+def embedding_to_blob(embedding):
+    # Raw little-endian float32 bytes: 4 bytes per dimension, no parsing on load
+    return np.asarray(embedding, dtype='<f4').tobytes()
+
+def blob_to_embedding(blob):
+    return np.frombuffer(blob, dtype='<f4')
+
+def init_db():
+    """Create or migrate the schema. Runs once per process automatically; calling it again is harmless."""
+    with _init_lock:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        cursor.execute(MEMBERS_TABLE_SQL.format(table="members"))
+        conn.commit()
+        migrate_db(conn)
+        # Triggers and indexes go on after migrating: rebuilding the members table drops them
+        for statement in (CHANGE_LOG_SQL + MEMBERS_INDEX_SQL + MEMBER_SAMPLES_SQL + ACCESS_EVENTS_SQL
+                          + IMPORT_FAILURES_SQL):
+            cursor.execute(statement)
+        conn.commit()
+        # WAL lets the event writer append while the UI and gallery poller read
+        cursor.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+        _initialized.add(DB_NAME)
+
+def migrate_db(conn):
+    """Bring an existing members.db up to SCHEMA_VERSION.
+
+    Version 0 databases stored embeddings as JSON text. They are rewritten in
+    place as float32 BLOBs with dimension/model metadata, then vacuumed so the
+    file actually shrinks. Version 1 gained the member_samples table, which
+    init_db creates; existing members simply have no samples.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(members)')}
+    if "embedding_dim" not in columns:
+        _migrate_json_to_blob(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+        conn.execute('VACUUM')
+    else:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+
+def _migrate_json_to_blob(conn, batch_size=500):
+    with conn:
+        # One explicit transaction so an interrupted migration leaves the old table untouched
+        conn.execute('BEGIN')
+        conn.execute('DROP TABLE IF EXISTS members_new')
+        conn.execute(MEMBERS_TABLE_SQL.format(table="members_new"))
+        # Copy in id order a batch at a time so large galleries never sit fully in memory
+        last_id = -1
+        while True:
+            rows = conn.execute('''
+                SELECT id, name, embedding, membership_type, created_at FROM members
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            converted = []
+            for member_id, name, embedding, membership_type, created_at in rows:
+                if isinstance(embedding, str):
+                    embedding = json.loads(embedding)
+                else:
+                    embedding = blob_to_embedding(embedding)
+                converted.append((member_id, name, embedding_to_blob(embedding), len(embedding),
+                                  DEFAULT_MODEL, membership_type, created_at))
+            conn.executemany('''
+                INSERT INTO members_new (id, name, embedding, embedding_dim, embedding_model,
+                                         membership_type, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', converted)
+            last_id = rows[-1][0]
+        conn.execute('DROP TABLE members')
+        conn.execute('ALTER TABLE members_new RENAME TO members')
+
+INSERT_MEMBER_SQL = '''
+    INSERT INTO members (name, embedding, embedding_dim, embedding_model, membership_type)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+INSERT_SAMPLE_SQL = 'INSERT INTO member_samples (member_id, embedding) VALUES (?, ?)'
+
+def _member_row(name, embedding, membership_type='Premium', model_name=DEFAULT_MODEL):
+    # Store embedding as raw float32 bytes
+    blob = embedding_to_blob(embedding)
+    return (name, blob, len(blob) // np.dtype(EMBEDDING_DTYPE).itemsize, model_name, membership_type)
+
+def _template(embedding):
+    """(stored embedding, sample blobs) for one embedding or a (samples, dim) array of several."""
+    samples = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    if samples.ndim == 1 or len(samples) == 1:
+        return samples.reshape(-1), []
+    return template_centroid(samples), [embedding_to_blob(sample) for sample in samples]
+
+def add_member(name, embedding, membership_type='Premium', model_name=DEFAULT_MODEL):
+    """Insert one member and return its id.
+
+    `embedding` may be a (samples, dim) array of several frames: the samples
+    are stored in member_samples and their normalized centroid in members.
+    """
+    centroid, samples = _template(embedding)
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(INSERT_MEMBER_SQL, _member_row(name, centroid, membership_type, model_name))
+        conn.executemany(INSERT_SAMPLE_SQL, [(cursor.lastrowid, blob) for blob in samples])
+    return cursor.lastrowid
+
+def add_members(members, model_name=DEFAULT_MODEL):
+    """Insert (name, embedding[, membership_type]) tuples in one transaction; returns how many.
+
+    Embeddings may be multi-sample arrays as in add_member.
+    """
+    rows, multi = [], []
+    for name, embedding, *rest in members:
+        centroid, samples = _template(embedding)
+        row = _member_row(name, centroid, *rest, model_name=model_name)
+        if samples:
+            multi.append((row, samples))
+        else:
+            rows.append(row)
+    conn = get_connection()
+    with conn:
+        conn.executemany(INSERT_MEMBER_SQL, rows)
+        # Multi-sample members need their new id for the samples, so they go one by one
+        for row, samples in multi:
+            member_id = conn.execute(INSERT_MEMBER_SQL, row).lastrowid
+            conn.executemany(INSERT_SAMPLE_SQL, [(member_id, blob) for blob in samples])
+    return len(rows) + len(multi)
+
+def upsert_members(members, model_name=DEFAULT_MODEL):
+    """Replace the `model_name` embedding of members that exist by name, insert the rest; returns (inserted, updated).
+
+    An updated member's samples are replaced as well. Embeddings from other
+    models are left alone. A name given more than once is stored once, with
+    its last embedding.
+    """
+    members = {member[0]: member for member in members}.values()
+    templates = [(name, *_template(embedding), *rest) for name, embedding, *rest in members]
+    rows = [_member_row(name, centroid, *rest, model_name=model_name) for name, centroid, _, *rest in templates]
+    conn = get_connection()
+    with conn:
+        existing = set()
+        names = [row[0] for row in rows]
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            existing.update(name for (name,) in conn.execute(
+                f'SELECT DISTINCT name FROM members WHERE name IN ({",".join("?" * len(chunk))}) '
+                'AND embedding_model = ?', chunk + [model_name]))
+        updates = [(blob, dim, membership_type, name, model)
+                   for name, blob, dim, model, membership_type in rows if name in existing]
+        inserts = [row for row in rows if row[0] not in existing]
+        updated = conn.executemany('''
+            UPDATE members SET embedding = ?, embedding_dim = ?, membership_type = ?
+            WHERE name = ? AND embedding_model = ?
+        ''', updates).rowcount
+        conn.executemany(INSERT_MEMBER_SQL, inserts)
+        for name, _, samples, *_ in templates:
+            if name in existing:
+                conn.execute('DELETE FROM member_samples WHERE member_id IN '
+                             '(SELECT id FROM members WHERE name = ? AND embedding_model = ?)', (name, model_name))
+            if samples:
+                conn.executemany('INSERT INTO member_samples (member_id, embedding) SELECT id, ? FROM members '
+                                 'WHERE name = ? AND embedding_model = ?',
+                                 [(blob, name, model_name) for blob in samples])
+    return len(inserts), updated
+
+def delete_member(name):
+    """Delete every member called `name`; returns how many rows were removed."""
+    return delete_members([name])
+
+def delete_members(names):
+    """Delete members by name in one transaction; returns how many rows were removed."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany('DELETE FROM members WHERE name = ?', [(name,) for name in names])
+    return cursor.rowcount
+
+def delete_model_embeddings(model_name):
+    """Delete every embedding produced by `model_name` (e.g. after re-embedding); returns how many rows."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('DELETE FROM members WHERE embedding_model = ?', (model_name,))
+    return cursor.rowcount
+
+def replace_import_failures(names, failures, model_name=DEFAULT_MODEL):
+    """Set the failed photos of `names` to `failures` ((name, image, error) tuples) in one transaction."""
+    names = list(names)
+    conn = get_connection()
+    with conn:
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            conn.execute(f'DELETE FROM import_failures WHERE embedding_model = ? '
+                         f'AND name IN ({",".join("?" * len(chunk))})', [model_name] + chunk)
+        conn.executemany('INSERT INTO import_failures (name, embedding_model, image, error) VALUES (?, ?, ?, ?)',
+                         [(name, model_name, image, error) for name, image, error in failures])
+
+def names_with_import_failures(model_name=DEFAULT_MODEL):
+    """Names with photos that failed in their last bulk import with `model_name`."""
+    rows = get_connection().execute('SELECT DISTINCT name FROM import_failures WHERE embedding_model = ?',
+                                    (model_name,))
+    return {name for (name,) in rows}
+
+def list_members(model_name=None):
+    """Member rows without embeddings: [{"id", "name", "membership_type", "created_at", "embedding_model"}].
+
+    A member re-embedded with another model has one row per model; pass
+    `model_name` for one model's rows only.
+    """
+    query = 'SELECT id, name, membership_type, created_at, embedding_model FROM members'
+    params = ()
+    if model_name is not None:
+        query += ' WHERE embedding_model = ?'
+        params = (model_name,)
+    rows = get_connection().execute(query + ' ORDER BY id', params).fetchall()
+    return [dict(zip(("id", "name", "membership_type", "created_at", "embedding_model"), row)) for row in rows]
+
+def count_members_by_model():
+    """{embedding_model: number of members with an embedding from it}."""
+    rows = get_connection().execute(
+        'SELECT embedding_model, COUNT(DISTINCT name) FROM members GROUP BY embedding_model ORDER BY 2 DESC')
+    return dict(rows.fetchall())
+
+def count_members_without_model(model_name):
+    """Members with no embedding from `model_name` (enrolled with another model and not re-embedded)."""
+    return get_connection().execute('''
+        SELECT COUNT(DISTINCT name) FROM members
+        WHERE name NOT IN (SELECT name FROM members WHERE embedding_model = ?)
+    ''', (model_name,)).fetchone()[0]
+
+def get_all_members():
+    rows = get_connection().execute('SELECT id, name, embedding FROM members').fetchall()
+    
+    members = []
+    for row in rows:
+        members.append({
+            "id": row[0],
+            "name": row[1],
+            "embedding": blob_to_embedding(row[2])
+        })
+    return members
+
+def load_embedding_matrix(model_name=None):
+    """Load the gallery as (ids, names, matrix) with one frombuffer call.
+
+    `matrix` is an (N, dim) float32 array. Pass `model_name` to restrict the
+    gallery to embeddings produced by one model.
+    """
+    conn = get_connection()
+    query = 'SELECT id, name, embedding_dim, embedding FROM members'
+    params = ()
+    if model_name is not None:
+        query += ' WHERE embedding_model = ?'
+        params = (model_name,)
+    rows = conn.execute(query + ' ORDER BY id', params).fetchall()
+    return _rows_to_matrix(rows)
+
+def iter_embedding_matrix(model_name=None, chunk_size=10000):
+    """Yield the gallery as (ids, names, matrix) chunks of up to `chunk_size` members, in id order.
+
+    For galleries that should never be fully materialized in float32 (see compact_gallery).
+    """
+    conn = get_connection()
+    model_filter = '' if model_name is None else ' AND embedding_model = ?'
+    last_id = -1
+    while True:
+        params = (last_id,) + (() if model_name is None else (model_name,)) + (chunk_size,)
+        rows = conn.execute(f'''
+            SELECT id, name, embedding_dim, embedding FROM members
+            WHERE id > ?{model_filter} ORDER BY id LIMIT ?
+        ''', params).fetchall()
+        if not rows:
+            return
+        yield _rows_to_matrix(rows)
+        last_id = rows[-1][0]
+
+def load_members_by_ids(member_ids, model_name=None):
+    """Like load_embedding_matrix, restricted to the given ids (missing ids are skipped)."""
+    member_ids = [int(member_id) for member_id in member_ids]
+    model_filter = '' if model_name is None else ' AND embedding_model = ?'
+    rows = []
+    conn = get_connection()
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(member_ids), 500):
+        chunk = member_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        params = chunk if model_name is None else chunk + [model_name]
+        rows.extend(conn.execute(f'''
+            SELECT id, name, embedding_dim, embedding FROM members
+            WHERE id IN ({placeholders}){model_filter} ORDER BY id
+        ''', params).fetchall())
+    return _rows_to_matrix(rows)
+
+def load_samples(member_ids):
+    """Samples of the given members that have several: {member_id: (samples, dim) float32 array}."""
+    member_ids = [int(member_id) for member_id in member_ids]
+    rows = []
+    conn = get_connection()
+    for start in range(0, len(member_ids), 500):
+        chunk = member_ids[start:start + 500]
+        rows.extend(conn.execute(f'''
+            SELECT member_id, embedding FROM member_samples
+            WHERE member_id IN ({",".join("?" * len(chunk))}) ORDER BY member_id, id
+        ''', chunk).fetchall())
+    grouped = {}
+    for member_id, blob in rows:
+        grouped.setdefault(member_id, []).append(blob)
+    return {member_id: np.frombuffer(b"".join(blobs), dtype='<f4').reshape(len(blobs), -1)
+            for member_id, blobs in grouped.items()}
+
+def _rows_to_matrix(rows):
+    if not rows:
+        return np.zeros(0, dtype=np.int64), [], np.zeros((0, 0), dtype=EMBEDDING_DTYPE)
+
+    dims = {row[2] for row in rows}
+    if len(dims) > 1:
+        raise ValueError(f"Members have mixed embedding dimensions {sorted(dims)}; "
+                         "pass model_name to load a single model's gallery")
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    names = [row[1] for row in rows]
+    matrix = np.frombuffer(b"".join(row[3] for row in rows), dtype='<f4').reshape(len(rows), dims.pop())
+    return ids, names, matrix
+
+def get_change_seq():
+    """Sequence number of the latest change to the members table (0 if none)."""
+    conn = get_connection()
+    seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM member_changes').fetchone()[0]
+    return seq
+
+def get_changes_since(seq):
+    """Return [(seq, member_id, op), ...] recorded after `seq`, oldest first."""
+    conn = get_connection()
+    rows = conn.execute('SELECT seq, member_id, op FROM member_changes WHERE seq > ? ORDER BY seq',
+                        (seq,)).fetchall()
+    return rows
+
+def add_access_events(events):
+    """Insert events.decision_event() style dicts in one transaction."""
+    conn = get_connection()
+    with conn:
+        conn.executemany('''
+            INSERT INTO access_events (ts, door, name, granted, similarity, track_id, latency_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(e["time"], e.get("door"), e["name"], int(e["granted"]), e.get("similarity"),
+               e.get("track_id"), e.get("latency_ms")) for e in events])
+
+def get_access_events(start=None, end=None, name=None, door=None, granted=None, limit=None):
+    """Access events with start <= ts < end (unix seconds), newest first."""
+    clauses, params = [], []
+    for clause, value in (('ts >= ?', start), ('ts < ?', end), ('name = ?', name), ('door = ?', door),
+                          ('granted = ?', None if granted is None else int(granted))):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    query = 'SELECT ts, door, name, granted, similarity, track_id, latency_ms FROM access_events'
+    if clauses:
+        query += ' WHERE ' + ' AND '.join(clauses)
+    query += ' ORDER BY ts DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(int(limit))
+    conn = get_connection()
+    rows = conn.execute(query, params).fetchall()
+    keys = ("time", "door", "name", "granted", "similarity", "track_id", "latency_ms")
+    return [dict(zip(keys, row), granted=bool(row[3])) for row in rows]
+
+def who_entered(start, end, door=None):
+    """Members granted access with start <= ts < end: [(name, first_ts, last_ts, count)], earliest first."""
+    query = '''
+        SELECT name, MIN(ts), MAX(ts), COUNT(*) FROM access_events
+        WHERE ts >= ? AND ts < ? AND granted = 1
+    '''
+    params = [start, end]
+    if door is not None:
+        query += ' AND door = ?'
+        params.append(door)
+    conn = get_connection()
+    rows = conn.execute(query + ' GROUP BY name ORDER BY MIN(ts)', params).fetchall()
+    return rows
+
+if __name__ == "__main__":
+    init_db()
+    print("Database initialized.")
@@ -0,0 +1,134 @@
+"""LRU + TTL cache of face embeddings keyed by a perceptual hash of the crop."""
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+def dhash(crop, hash_size: int = 16) -> bytes:
+    """Difference hash of a face crop: hash_size**2 bits, packed into bytes.
+
+    The crop is shrunk to a (hash_size + 1) x hash_size grayscale thumbnail and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    sensor noise and small shifts between frames flip only a few bits.
+    """
+    if cv2 is not None:
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    else:
+        gray = crop.mean(axis=2) if crop.ndim == 3 else crop
+        rows = np.linspace(0, gray.shape[0] - 1, hash_size).astype(int)
+        cols = np.linspace(0, gray.shape[1] - 1, hash_size + 1).astype(int)
+        small = gray[np.ix_(rows, cols)].astype(np.int16)
+    return np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+
+class EmbeddingCache:
+    """Bounded cache in front of an embedding call.
+
+    embed(crops, embed_fn) returns cached embeddings for crops whose hash is
+    within `max_distance` bits of a stored one (younger than `ttl` seconds)
+    and runs `embed_fn` only on the rest, in one batch. At most `max_entries`
+    embeddings are kept; the least recently used one is evicted first.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 5.0, hash_size: int = 16, max_distance: int = 6):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._entries: "collections.OrderedDict[bytes, tuple]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, crop) -> bytes:
+        return dhash(crop, self.hash_size)
+
+    def _nearest(self, key: bytes) -> Optional[bytes]:
+        if key in self._entries or self.max_distance <= 0 or not self._entries:
+            return key if key in self._entries else None
+        keys = list(self._entries)
+        stored = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), -1)
+        query = np.frombuffer(key, dtype=np.uint8)
+        distances = np.unpackbits(stored ^ query, axis=1).sum(axis=1)
+        best = int(np.argmin(distances))
+        return keys[best] if distances[best] <= self.max_distance else None
+
+    def lookup(self, key: bytes, now: Optional[float] = None) -> Optional[np.ndarray]:
+        """Cached embedding for a near-identical crop, or None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            match = self._nearest(key)
+            if match is not None and now - self._entries[match][1] > self.ttl:
+                del self._entries[match]
+                self.expired += 1
+                match = None
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return self._entries[match][0]
+
+    def store(self, key: bytes, embedding: np.ndarray, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[key] = (embedding, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def embed(self, crops: List[np.ndarray], embed_fn: Callable[[List[np.ndarray]], np.ndarray]) -> np.ndarray:
+        """Embeddings for `crops`, calling embed_fn only for the cache misses."""
+        now = time.time()
+        keys = [self.key(crop) for crop in crops]
+        out: List[Optional[np.ndarray]] = [self.lookup(key, now) for key in keys]
+        missing = [i for i, embedding in enumerate(out) if embedding is None]
+        if missing:
+            fresh = embed_fn([crops[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                out[i] = embedding
+                # Copy so a cached row does not keep the whole batch array alive
+                self.store(keys[i], np.array(embedding), now)
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(out)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            nbytes = sum(embedding.nbytes + len(key) for key, (embedding, _) in self._entries.items())
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "bytes": nbytes,
+            }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"embedding cache: {s['hit_rate']:.0%} hits ({s['hits']}/{s['hits'] + s['misses']}), "
+                f"{s['entries']} entries, {s['bytes'] / 1024:.0f} KiB, {s['evictions']} evicted, "
+                f"{s['expired']} expired")
@@ -0,0 +1,65 @@
+"""Face embedding models the entry system can run, and the threshold each one needs.
+
+Every stored embedding is tagged with the model that produced it
+(members.embedding_model), and each process builds its gallery from one
+model's rows only, so galleries for several models can live side by side
+while members are re-embedded (python admin.py reembed <model> <photos>).
+
+Thresholds are cosine similarities. For the deepface models they are
+1 - deepface's cosine distance threshold, except VGG-Face, which keeps the
+0.68 this system has always used. They are starting points: calibrate them
+for your false-accept target with benchmarks/bench_models.py.
+
+"opencv" models run through cv2.dnn from a local ONNX file and need neither
+deepface nor TensorFlow for embedding. SFace-OpenCV expects OpenCV Zoo's
+face_recognition_sface_2021dec.onnx in models/ (see
+https://github.com/opencv/opencv_zoo/tree/main/models/face_recognition_sface);
+register_model() adds your own.
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MODEL = "VGG-Face"  # the model admin.py, app.py and main.py enroll and recognize with
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+MODELS: Dict[str, dict] = {
+    # 4096-d (2622-d in deepface < 0.0.80); the heaviest of the lot, ~140M parameters
+    "VGG-Face": {"backend": "deepface", "threshold": 0.68},
+    "Facenet": {"backend": "deepface", "threshold": 0.60},
+    "Facenet512": {"backend": "deepface", "threshold": 0.70},
+    "ArcFace": {"backend": "deepface", "threshold": 0.32},
+    "GhostFaceNet": {"backend": "deepface", "threshold": 0.35},
+    # 128-d, under 1M parameters
+    "SFace": {"backend": "deepface", "threshold": 0.41},
+    "SFace-OpenCV": {"backend": "opencv", "threshold": 0.36,
+                     "path": os.path.join(MODELS_DIR, "face_recognition_sface_2021dec.onnx"),
+                     "input_size": (112, 112), "scale": 1.0, "mean": (0.0, 0.0, 0.0), "swap_rb": True,
+                     "max_batch": 1},  # the Zoo export has a fixed batch size of one
+}
+
+
+def register_model(name: str, path: str, threshold: float, input_size: Tuple[int, int] = (112, 112),
+                   scale: float = 1.0, mean: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+                   swap_rb: bool = True, max_batch: Optional[int] = None) -> None:
+    """Add a local ONNX (or any cv2.dnn-readable) embedding model under `name`.
+
+    Crops are resized to `input_size` (width, height) and fed as
+    (pixel - mean) * scale, RGB when `swap_rb`. `max_batch` caps the batch
+    size for models exported with a fixed batch dimension.
+    """
+    MODELS[name] = {"backend": "opencv", "threshold": threshold, "path": path, "input_size": tuple(input_size),
+                    "scale": scale, "mean": tuple(mean), "swap_rb": swap_rb, "max_batch": max_batch}
+
+
+def model_info(name: str) -> dict:
+    """The registry entry for `name`; ValueError naming the known models otherwise."""
+    if name not in MODELS:
+        raise ValueError(f"Unknown embedding model {name!r}; choose from {', '.join(MODELS)} "
+                         "or add it with embedding_models.register_model()")
+    return MODELS[name]
+
+
+def threshold_for(name: str) -> float:
+    """Cosine similarity at or above which a face matches a member, for embeddings from `name`."""
+    return model_info(name)["threshold"]
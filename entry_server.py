@@ -0,0 +1,346 @@
+"""Headless multi-door entry server.
+
+Runs several camera sources in one process with one shared recognition
+model. Each door gets its own capture + detection threads; face crops from
+all doors are gathered into a single batched forward pass and matched
+against the gallery together, so the per-door model cost shrinks as doors
+are added.
+
+    python entry_server.py front=0 side=rtsp://10.0.0.12/stream test=door.mp4
+"""
+import argparse
+import functools
+import sys
+import threading
+import time
+
+import database
+import embedding_models
+import recognition
+from access_log import AccessLogWriter
+from embed_cache import EmbeddingCache
+from events import decision_event, open_sink
+from frame_source import open_source
+from gallery_cache import GalleryCache
+from metrics import FACE_BUCKETS, Metrics, open_metrics
+from pipeline import Pipeline, StageStats
+from scheduler import AdaptiveScheduler
+from tracker import FaceTracker
+from utils import PhaseTimer
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully
+try:
+    import cv2
+    HAS_CV2 = True
+except Exception:
+    cv2 = None
+    HAS_CV2 = False
+
+THRESHOLD = None  # None: the model's own threshold (see embedding_models)
+CPU_BUDGET = 1.0  # fraction of one core recognition may use, shared between all doors
+BATCH_WINDOW = 0.01  # seconds to wait for other doors after the first crop arrives
+MAX_BATCH_FACES = 64
+STATS_INTERVAL = 30.0
+DETECTION_WIDTH = 640  # detector input width; faces are still cropped from the full-resolution frame
+
+
+class LatestPerDoor:
+    """Pending detection jobs, keeping only the newest one per door.
+
+    Jobs handed out by take_all() count as in flight until done() is called,
+    so idle() is only true once every job put here has been processed.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._taken = 0
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, door, job):
+        with self._cond:
+            if door in self._jobs:
+                self.dropped += 1
+            self._jobs[door] = job
+            self._cond.notify()
+
+    def take_all(self, timeout, window):
+        """Wait up to `timeout` for a job, then `window` more for other doors, and take everything."""
+        with self._cond:
+            if not self._jobs:
+                self._cond.wait(timeout)
+            if not self._jobs:
+                return {}
+        time.sleep(window)
+        with self._cond:
+            jobs, self._jobs = self._jobs, {}
+            self._taken = len(jobs)
+        return jobs
+
+    def done(self):
+        """The jobs from the last take_all() have been processed."""
+        with self._cond:
+            self._taken = 0
+
+    def idle(self):
+        with self._cond:
+            return not self._jobs and not self._taken
+
+
+class EntryServer:
+    def __init__(self, sources, threshold=THRESHOLD, model_name=recognition.MODEL_NAME,
+                 cpu_budget=CPU_BUDGET, on_decision=None, track_faces=True, paced=None, compact=None,
+                 roi=None, detection_width=DETECTION_WIDTH, metrics=None, snapshot=True):
+        self.sources = sources
+        self.threshold = threshold if threshold is not None else embedding_models.threshold_for(model_name)
+        self.model_name = model_name
+        self.cpu_budget = cpu_budget
+        self.on_decision = on_decision or self.print_decision
+        self.gallery = GalleryCache(verify_threshold=self.threshold, model_name=model_name, compact=compact,
+                                    snapshot=snapshot)
+        self.pending = LatestPerDoor()
+        self.doors = {}
+        self.trackers = {}
+        self.schedulers = {}
+        self.track_faces = track_faces
+        self.paced = paced
+        self.roi = roi
+        self.detection_width = detection_width
+        self.embedding_cache = EmbeddingCache(max_entries=256 * len(sources))
+        self.access_log = AccessLogWriter()
+        self.captures = []
+        # metrics.Metrics to export to (per-door stage histograms, errors, queues), or None
+        self.metrics = metrics
+        self.inference_stats = StageStats("inference", histogram=metrics is not None)
+        self.faces_embedded = 0
+        self.last_results = {}
+        self.startup = PhaseTimer()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def print_decision(door, result, job):
+        status = "GRANTED" if result["granted"] else "DENIED"
+        stamp = time.strftime("%H:%M:%S", time.localtime(job["captured_at"]))
+        print(f"[{stamp}] door={door} {status} {result['name']} ({result['similarity']:.2f})")
+
+    def start(self):
+        # Build and warm the shared model in the background while the gallery loads and cameras open
+        warm_up = recognition.start_warm_up(self.model_name)
+        with self.startup.phase("gallery"):
+            self.gallery.start()
+        self.access_log.start()
+        captures = {}
+        with self.startup.phase("sources"):
+            for door, spec in self.sources.items():
+                cap = open_source(spec, self.paced)
+                if not cap.isOpened():
+                    print(f"Error: door '{door}' could not open source {spec!r}.")
+                    continue
+                captures[door] = cap
+        # The model must be warm before any camera starts producing crops
+        with self.startup.phase("model wait"):
+            model_seconds = warm_up.result()
+        self.startup.add("model warm-up (background)", model_seconds)
+        self.embedder = recognition.get_embedder(self.model_name)
+        self.embedder.cache = self.embedding_cache
+        for door, cap in captures.items():
+            self.captures.append(cap)
+            # Busy doors get recognised often, empty corridors hardly at all
+            scheduler = self.schedulers[door] = AdaptiveScheduler(cpu_budget=self.cpu_budget / len(self.sources))
+            self.trackers[door] = FaceTracker(interval=scheduler.current_interval) if self.track_faces else None
+            pipeline = Pipeline(recognition.camera_source(cap), should_process=scheduler.should_process,
+                                on_result=lambda job, door=door: self.pending.put(door, job),
+                                histograms=self.metrics is not None, keep_frames=False)
+            pipeline.add_stage("detect", lambda job, door=door: self._detect(door, job))
+            self.doors[door] = pipeline.start()
+            if self.metrics:
+                self.metrics.add_pipeline(pipeline, door=door)
+        if self.metrics:
+            self.metrics.add_collector(self._collect_metrics)
+        self._thread = threading.Thread(target=self._inference_loop, name="inference", daemon=True)
+        self._thread.start()
+        return self
+
+    def _detect(self, door, job):
+        faces = recognition.detect_faces(job["frame"], roi=self.roi, detection_width=self.detection_width)
+        tracker = self.trackers.get(door)
+        if tracker is not None:
+            tracker.assign(faces, job["captured_at"])
+        return dict(job, faces=faces)
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            jobs = self.pending.take_all(timeout=0.5, window=BATCH_WINDOW)
+            if not jobs:
+                continue
+            start = time.perf_counter()
+            try:
+                self._infer(jobs)
+            except Exception as e:
+                # Lose this batch, not the server
+                if not self.inference_stats.errors:
+                    print(f"Error in inference: {type(e).__name__}: {e} (further ones are only counted)")
+                self.inference_stats.record_error(e)
+                continue
+            finally:
+                self.pending.done()
+            self.inference_stats.record(time.perf_counter() - start)
+
+    def _infer(self, jobs):
+        # One forward pass for the new/changed crops of every door, then one gallery search
+        fresh = {door: recognition.faces_to_embed(job["faces"]) for door, job in jobs.items()}
+        crops = [face["face"] for faces in fresh.values() for face in faces]
+        embeddings = self.embedder.embed(crops, max_batch=MAX_BATCH_FACES)
+        matcher = self.gallery.matcher
+        offset = 0
+        for door, job in jobs.items():
+            count = len(fresh[door])
+            results = recognition.decide_faces(job["faces"], embeddings[offset:offset + count],
+                                               matcher, self.threshold, tracker=self.trackers.get(door))
+            offset += count
+            self._report(door, results, job)
+        self.faces_embedded += len(crops)
+
+    def _report(self, door, results, job):
+        # Only report people who just appeared at this door, not every processed frame
+        previous = {r["name"] for r in self.last_results.get(door, [])}
+        for res in results:
+            if res["name"] not in previous:
+                self.on_decision(door, res, job)
+                self.access_log.emit(decision_event(res, job, door))
+        self.last_results[door] = results
+        self.schedulers[door].observe(dict(job, results=results))
+        if self.metrics:
+            self.metrics.observe("faces_per_frame", len(results), buckets=FACE_BUCKETS, door=door)
+            for res in results:
+                self.metrics.inc("decisions_total", door=door, outcome="granted" if res["granted"] else "denied")
+
+    def _collect_metrics(self):
+        stats = self.inference_stats
+        yield "stage_items_total", "counter", {"stage": "inference"}, stats.items
+        yield "stage_busy_seconds_total", "counter", {"stage": "inference"}, stats.total_seconds
+        yield "stage_seconds", "histogram", {"stage": "inference"}, stats.histogram
+        for error_type, count in list(stats.error_types.items()):
+            yield "stage_errors_total", "counter", {"stage": "inference", "type": error_type}, count
+        yield "faces_embedded_total", "counter", {}, self.faces_embedded
+        yield "inference_superseded_total", "counter", {}, self.pending.dropped
+        yield "gallery_members", "gauge", {}, len(self.gallery)
+
+    def finished(self):
+        # Every captured frame has been detected (drained) and its faces decided by the inference loop
+        return all(p.drained.is_set() for p in self.doors.values()) and self.pending.idle()
+
+    def format_stats(self):
+        s = self.inference_stats.snapshot()
+        faces_per_batch = self.faces_embedded / s["items"] if s["items"] else 0.0
+        ms_per_face = s["avg_ms"] / faces_per_batch if faces_per_batch else 0.0
+        lines = [f"inference: {s['items']} batches, {faces_per_batch:.1f} faces/batch, "
+                 f"{s['avg_ms']:.0f}ms/batch, {ms_per_face:.1f}ms/face, busy={s['busy']:.0%}, "
+                 f"superseded={self.pending.dropped}"]
+        skipped = [t.skip_ratio for t in self.trackers.values() if t is not None]
+        if skipped:
+            lines[0] += f", tracked-skip={sum(skipped) / len(skipped):.0%}"
+        lines.append(f"  {self.embedding_cache.format_stats()}")
+        lines.append(f"  {self.access_log.format_stats()}")
+        for door, pipeline in self.doors.items():
+            lines.append(f"  {door}: {pipeline.format_stats()}")
+            lines.append(f"  {door}: {self.schedulers[door].format_stats()}")
+        return "\n".join(lines)
+
+    def stop(self):
+        self._stop.set()
+        for pipeline in self.doors.values():
+            pipeline.stop()
+        # Let a batch in flight finish: it still writes to the access log and the decision sink
+        self._thread.join()
+        self.gallery.stop()
+        self.access_log.close()
+        for cap in self.captures:
+            cap.release()
+
+
+def parse_sources(specs):
+    sources = {}
+    for i, spec in enumerate(specs):
+        door, sep, source = spec.partition("=")
+        if not sep:
+            door, source = f"door{i + 1}", spec
+        sources[door] = source
+    return sources
+
+
+def parse_roi(spec):
+    roi = tuple(float(v) for v in spec.split(","))
+    if len(roi) != 4 or not all(0.0 <= v <= 1.0 for v in roi) or roi[2] <= 0 or roi[3] <= 0:
+        raise argparse.ArgumentTypeError(f"ROI must be x,y,w,h fractions of the frame, got {spec!r}")
+    return roi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-door entry server.")
+    parser.add_argument("sources", nargs="+",
+                        help="door=source pairs; source is a device index, RTSP URL, video file, "
+                             "image directory or synthetic[:N]")
+    parser.add_argument("--model", default=recognition.MODEL_NAME, choices=list(embedding_models.MODELS),
+                        help="embedding model; only members embedded with it are loaded")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="default: the model's threshold")
+    parser.add_argument("--cpu-budget", type=float, default=CPU_BUDGET,
+                        help="fraction of one core recognition may use across all doors")
+    parser.add_argument("--no-track", action="store_true",
+                        help="re-embed every detected face instead of reusing tracked decisions")
+    parser.add_argument("--fast", action="store_true",
+                        help="read recorded sources as fast as possible instead of in real time")
+    parser.add_argument("--compact", choices=["float16", "int8", "pca"], default=None,
+                        help="keep the gallery in RAM as float16, int8 or PCA codes (exact rescoring from disk)")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="load a private copy of the gallery instead of mapping the shared snapshot file")
+    parser.add_argument("--roi", type=parse_roi, default=None,
+                        help="only detect faces in this door area: x,y,w,h as fractions of the frame")
+    parser.add_argument("--detect-width", type=int, default=DETECTION_WIDTH,
+                        help="downscale frames to this width for detection (0: full resolution)")
+    parser.add_argument("--events", default=None,
+                        help="stream decisions as JSON lines to - (stdout), unix:/path.sock or a file")
+    parser.add_argument("--metrics", default=None,
+                        help="export Prometheus metrics on this local port, or dump them to this file")
+    args = parser.parse_args()
+
+    if not HAS_CV2 or not recognition.deepface_available():
+        print("Error: opencv-python and deepface are required. Install with: pip install opencv-python deepface")
+        return
+
+    database.init_db()
+    on_decision, sink, log = None, None, print
+    if args.events:
+        sink = open_sink(args.events)
+        on_decision = lambda door, result, job: sink.emit(decision_event(result, job, door))  # noqa: E731
+        if args.events in ("-", "stdout"):
+            # keep stdout for the event stream
+            log = functools.partial(print, file=sys.stderr)
+    registry = Metrics() if args.metrics else None
+    server = EntryServer(parse_sources(args.sources), threshold=args.threshold, model_name=args.model,
+                         cpu_budget=args.cpu_budget, on_decision=on_decision, track_faces=not args.no_track,
+                         paced=False if args.fast else None, compact=args.compact, roi=args.roi,
+                         detection_width=args.detect_width or None, metrics=registry,
+                         snapshot=not args.no_snapshot).start()
+    exporter = open_metrics(args.metrics, registry, interval=STATS_INTERVAL) if registry else None
+    log(server.startup.format())
+    log(f"Entry server running {len(server.doors)} door(s), {len(server.gallery)} members. Ctrl+C to stop.")
+    last_stats = time.time()
+    try:
+        while server.doors and not server.finished():
+            time.sleep(0.5)
+            if time.time() - last_stats >= STATS_INTERVAL:
+                log(server.format_stats())
+                last_stats = time.time()
+    except KeyboardInterrupt:
+        pass
+    server.stop()
+    if sink:
+        sink.close()
+    if exporter:
+        exporter.close()
+    log(server.format_stats())
+
+
+if __name__ == "__main__":
+    main()
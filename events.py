@@ -0,0 +1,177 @@
+"""Structured access-decision events for headless deployments.
+
+A door relay or logger consumes decisions as JSON objects, one per line:
+
+    {"type": "access", "time": 1718000000.123, "door": null, "frame_id": 42, "track_id": 3,
+     "name": "Alice", "granted": true, "similarity": 0.81, "region": {...}, "latency_ms": 95.2}
+
+Sinks: JSON lines on stdout or a file, a Unix socket that every connected
+client receives the stream on, or a Python callback.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+def decision_event(result: dict, job: dict, door: Optional[str] = None) -> dict:
+    """JSON-ready event for one access decision on a processed frame job."""
+    done = job.get("completed_at", time.time())
+    region = {k: int(v) for k, v in result["region"].items() if isinstance(v, (int, float))}
+    return {
+        "type": "access",
+        "time": done,
+        "door": door,
+        "frame_id": job.get("frame_id"),
+        "track_id": result.get("track_id"),
+        "name": result["name"],
+        "granted": bool(result["granted"]),
+        "similarity": round(float(result["similarity"]), 4),
+        "region": region,
+        "latency_ms": round(1000 * (done - job["captured_at"]), 1),
+    }
+
+
+class JsonLinesSink:
+    """Writes one JSON object per line to a text stream (stdout by default)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event: dict) -> None:
+        with self._lock:
+            self.stream.write(json.dumps(event) + "\n")
+            self.stream.flush()
+
+    def close(self) -> None:
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+
+class UnixSocketSink:
+    """Listens on a Unix socket and sends every event, as a JSON line, to all connected clients.
+
+    Clients that disconnect or stop reading are dropped; events emitted while
+    nobody is connected are discarded.
+    """
+
+    def __init__(self, path: str, send_timeout: float = 0.5):
+        self.path = path
+        self.send_timeout = send_timeout
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._clients = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._accept, name="events-accept", daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                break
+            client.settimeout(self.send_timeout)
+            with self._lock:
+                self._clients.append(client)
+
+    def emit(self, event: dict) -> None:
+        line = (json.dumps(event) + "\n").encode()
+        with self._lock:
+            for client in list(self._clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    self._clients.remove(client)
+                    client.close()
+
+    def close(self) -> None:
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class CallbackSink:
+    """Calls `func(event)` for every event (from the pipeline thread that produced it)."""
+
+    def __init__(self, func: Callable[[dict], None]):
+        self.func = func
+
+    def emit(self, event: dict) -> None:
+        self.func(event)
+
+    def close(self) -> None:
+        pass
+
+
+class FanOutSink:
+    """Sends every event to each of several sinks."""
+
+    def __init__(self, *sinks):
+        self.sinks = [sink for sink in sinks if sink is not None]
+
+    def emit(self, event: dict) -> None:
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sink(spec: str = "-"):
+    """Sink for "-" (stdout), "unix:/path/to.sock" or a file path (appended to)."""
+    if spec in ("-", "stdout"):
+        return JsonLinesSink()
+    if spec.startswith("unix:"):
+        return UnixSocketSink(spec[len("unix:"):])
+    return JsonLinesSink(open(spec, "a", encoding="utf-8"))
+
+
+class DecisionEmitter:
+    """Turns processed frame jobs into events, emitting only when a decision is new or changes.
+
+    A tracked face (with a track id) is reported when it first gets a
+    decision and whenever its name or granted state changes; untracked faces
+    are reported when their name was not among the previous frame's results.
+    """
+
+    def __init__(self, sink, door: Optional[str] = None, forget_after: float = 10.0):
+        self.sink = sink
+        self.door = door
+        self.forget_after = forget_after
+        self.emitted = 0
+        self._tracks: Dict[int, tuple] = {}
+        self._previous_names = set()
+
+    def handle(self, job: dict) -> None:
+        results = job.get("results", [])
+        now = job["captured_at"]
+        names = set()
+        for result in results:
+            track_id = result.get("track_id")
+            state = (result["name"], bool(result["granted"]))
+            if track_id is not None:
+                is_new = self._tracks.get(track_id, (None,))[0] != state
+                self._tracks[track_id] = (state, now)
+            else:
+                is_new = result["name"] not in self._previous_names
+            names.add(result["name"])
+            if is_new:
+                self.sink.emit(decision_event(result, job, self.door))
+                self.emitted += 1
+        self._previous_names = names
+        # Forget tracks that have been out of view for a while
+        for track_id in [t for t, (_, seen) in self._tracks.items() if now - seen > self.forget_after]:
+            del self._tracks[track_id]
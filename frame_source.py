@@ -0,0 +1,218 @@
+"""Pluggable frame sources: webcam, video file/stream, image directory and synthetic replay.
+
+Every source has the cv2.VideoCapture surface the rest of the code uses
+(read() -> (ok, frame), isOpened(), release()), so it can be passed
+anywhere a capture was. `paced=True` delivers frames at the source's frame
+rate, as a live camera would; `paced=False` delivers them as fast as the
+consumer reads, for throughput measurements and offline replay.
+
+    open_source("0")              # webcam 0
+    open_source("door.mp4")       # replay footage in real time
+    open_source("faces/", paced=False)
+    open_source("synthetic:600")  # 600 deterministic frames, no camera needed
+"""
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource:
+    """Base class: subclasses implement _read() and may set `fps`."""
+
+    fps = 30.0
+
+    def __init__(self, paced: bool = False, loop: bool = False):
+        self.paced = paced
+        self.loop = loop
+        self.frames_read = 0
+        self._started_at = None
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _rewind(self) -> bool:
+        return False
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self):
+        ok, frame = self._read()
+        if not ok and self.loop and self._rewind():
+            ok, frame = self._read()
+        if not ok:
+            return False, None
+        if self.paced:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+            delay = self._started_at + self.frames_read / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.frames_read += 1
+        return True, frame
+
+    def release(self) -> None:
+        pass
+
+
+class CaptureSource(FrameSource):
+    """cv2.VideoCapture on a device index, video file or RTSP/HTTP URL."""
+
+    def __init__(self, spec, paced: bool = False, loop: bool = False):
+        super().__init__(paced, loop)
+        self.spec = spec
+        self.cap = cv2.VideoCapture(spec)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or self.fps
+
+    def _read(self):
+        return self.cap.read()
+
+    def _rewind(self) -> bool:
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """Images from a directory in file-name order, one per frame."""
+
+    def __init__(self, path: str, fps: float = 10.0, paced: bool = False, loop: bool = False):
+        super().__init__(paced, loop)
+        self.fps = fps
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self._next = 0
+
+    def isOpened(self) -> bool:
+        return bool(self.paths)
+
+    def _read(self):
+        while self._next < len(self.paths):
+            frame = cv2.imread(self.paths[self._next])
+            self._next += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def _rewind(self) -> bool:
+        self._next = 0
+        return bool(self.paths)
+
+
+class ReplaySource(FrameSource):
+    """Replays frames held in memory, so decoding cost is excluded from measurements."""
+
+    def __init__(self, frames: List[np.ndarray], fps: float = 30.0, paced: bool = False, loop: bool = False):
+        super().__init__(paced, loop)
+        self.frames = frames
+        self.fps = fps
+        self._next = 0
+
+    @classmethod
+    def record(cls, source, max_frames: Optional[int] = None, **kwargs) -> "ReplaySource":
+        """Read `source` (up to max_frames) into memory."""
+        frames = []
+        while max_frames is None or len(frames) < max_frames:
+            ok, frame = source.read()
+            if not ok:
+                break
+            frames.append(frame)
+        source.release()
+        kwargs.setdefault("fps", getattr(source, "fps", 30.0))
+        return cls(frames, **kwargs)
+
+    def isOpened(self) -> bool:
+        return bool(self.frames)
+
+    def _read(self):
+        if self._next >= len(self.frames):
+            return False, None
+        frame = self.frames[self._next]
+        self._next += 1
+        # Consumers may draw on frames; hand out copies so a replay stays identical
+        return True, frame.copy()
+
+    def _rewind(self) -> bool:
+        self._next = 0
+        return bool(self.frames)
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated frames: a noisy backdrop with `n_faces` face-sized patches walking across.
+
+    Frame i is the same on every run for a given seed, so runs are comparable.
+    The patches give detectors, motion checks and crop hashes something to
+    work on; they are not recognisable faces.
+    """
+
+    def __init__(self, n_frames: Optional[int] = 300, width: int = 640, height: int = 480, n_faces: int = 1,
+                 face_size: int = 120, fps: float = 30.0, seed: int = 0, paced: bool = False, loop: bool = False):
+        super().__init__(paced, loop)
+        self.n_frames = n_frames
+        self.width = width
+        self.height = height
+        self.n_faces = n_faces
+        self.face_size = face_size
+        self.fps = fps
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._background = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+        self._patches = [rng.integers(0, 256, (face_size, face_size, 3), dtype=np.uint8)
+                         for _ in range(n_faces)]
+        self._next = 0
+
+    def frame(self, index: int) -> np.ndarray:
+        frame = self._background.copy()
+        span_x = max(1, self.width - self.face_size)
+        rows = max(1, self.height // self.face_size)
+        for i, patch in enumerate(self._patches):
+            # Each patch walks left to right at its own speed, bouncing at the edges
+            x = (index * (2 + i)) % (2 * span_x)
+            x = x if x < span_x else 2 * span_x - x
+            y = (i % rows) * self.face_size
+            frame[y:y + self.face_size, x:x + self.face_size] = patch
+        return frame
+
+    def _read(self):
+        if self.n_frames is not None and self._next >= self.n_frames:
+            return False, None
+        frame = self.frame(self._next)
+        self._next += 1
+        return True, frame
+
+    def _rewind(self) -> bool:
+        self._next = 0
+        return True
+
+
+def open_source(spec="0", paced: Optional[bool] = None, loop: bool = False) -> FrameSource:
+    """FrameSource for a spec string: device index, "synthetic[:N]", image directory, video file or URL.
+
+    `paced` defaults to real time for recorded footage and to as-fast-as-possible
+    for synthetic frames; cameras and streams are paced by the device itself.
+    """
+    spec = str(spec)
+    if spec.isdigit():
+        return CaptureSource(int(spec))
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        count = spec.partition(":")[2]
+        return SyntheticSource(int(count) if count else 300, paced=bool(paced), loop=loop)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, paced=bool(paced), loop=loop)
+    if "://" in spec:
+        return CaptureSource(spec, paced=bool(paced))
+    return CaptureSource(spec, paced=True if paced is None else paced, loop=loop)
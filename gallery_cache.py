@@ -0,0 +1,173 @@
+import threading
+from typing import Callable, Optional
+
+import ann_index
+import database
+import gallery_snapshot
+from compact_gallery import CompactMatcher
+from matcher import GalleryMatcher, l2_normalize
+
+
+class GalleryCache:
+    """In-memory member gallery kept in sync with members.db incrementally.
+
+    The first load reads the whole table. After that, sync() reads only the
+    rows recorded in the member_changes log since the last seen sequence
+    number, patches a copy of the matcher and swaps the `matcher` reference.
+    Readers never block: they keep scoring against the previous matcher
+    until the swap. start() runs sync() on a background thread every
+    `poll_interval` seconds, so members added or deleted with admin.py show
+    up in a running main.py without a restart. Samples of multi-sample
+    members are loaded alongside their centroid rows.
+
+    With `compact` ("float16", "int8" or "pca", see compact_gallery) the
+    gallery is read in chunks straight into a CompactMatcher and never held
+    in float32; top candidates are re-scored from members.db.
+
+    With `snapshot` the gallery is served from a memory-mapped
+    gallery_snapshot file shared with every other process on the box; a
+    change to the members table is picked up by mapping the next snapshot
+    (exported by whichever process notices first) instead of patching a
+    private copy. Each export rewrites the whole gallery, so they are
+    coalesced: a snapshot younger than `snapshot_interval` seconds is kept,
+    and members added or updated meanwhile show up with the next one.
+    Deletes are never held back; they export a new snapshot on the next
+    sync. Snapshots suit galleries that change rarely.
+    """
+
+    def __init__(self, poll_interval: float = 2.0, verify_threshold: Optional[float] = None,
+                 model_name: Optional[str] = None,
+                 on_change: Optional[Callable[["GalleryCache", int, int], None]] = None,
+                 compact: Optional[str] = None, pca_dim: int = 256, snapshot: bool = False,
+                 snapshot_interval: float = 30.0):
+        self.poll_interval = poll_interval
+        self.compact = compact
+        # a compact gallery is already small and private; snapshots hold float32
+        self.snapshot = snapshot and not compact
+        self.snapshot_interval = snapshot_interval
+        self.pca_dim = pca_dim
+        self.verify_threshold = verify_threshold
+        self.model_name = model_name
+        self.on_change = on_change
+        self.matcher = GalleryMatcher()
+        self.seq = 0
+        self._exact = GalleryMatcher()
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _index(self, exact: GalleryMatcher, reassign_ids=()):
+        if self.compact:
+            # The IVF index scores the float32 matrix, which a compact gallery does not keep
+            return exact
+        # Large galleries search through the IVF index; patch it rather than retraining
+        path = ann_index.index_path_for(database.DB_NAME, self.model_name)
+        if isinstance(self.matcher, ann_index.IVFIndex) and len(exact) >= ann_index.MIN_INDEXED_MEMBERS:
+            index = self.matcher.rebind(exact, reassign_ids)
+            index.save(path)
+            return index
+        return ann_index.load_or_build(exact, path, verify_threshold=self.verify_threshold)
+
+    def load(self) -> int:
+        """Full reload of the members table. Returns the gallery size."""
+        with self._lock:
+            self._load()
+        return len(self._exact)
+
+    def _load(self):
+        # Read the sequence first: changes racing with the load are replayed by the next sync
+        seq = database.get_change_seq()
+        if self.snapshot:
+            snapshot = gallery_snapshot.open_current(self.model_name, min_interval=self.snapshot_interval)
+            exact, seq = snapshot.matcher(), snapshot.seq
+        elif self.compact:
+            exact = CompactMatcher.build(database.iter_embedding_matrix(self.model_name), self.compact,
+                                         pca_dim=self.pca_dim, fetch=self._fetch_exact)
+            exact.samples = {k: l2_normalize(v) for k, v in database.load_samples(exact.ids).items()}
+        else:
+            ids, names, matrix = database.load_embedding_matrix(self.model_name)
+            exact = GalleryMatcher(matrix, names, ids, database.load_samples(ids))
+        self.matcher = self._index(exact)
+        self._exact = exact
+        self.seq = seq
+        self._loaded = True
+
+    def _fetch_exact(self, member_ids):
+        ids, _, matrix = database.load_members_by_ids(member_ids, self.model_name)
+        return ids, matrix
+
+    def sync(self) -> bool:
+        """Apply inserts/updates/deletes made since the last sync. Returns True if anything changed."""
+        with self._lock:
+            changes = database.get_changes_since(self.seq)
+            if not changes:
+                # The log restarting below our position means the database file was replaced
+                if database.get_change_seq() < self.seq:
+                    self._load()
+                    return True
+                return False
+
+            snapshot = None
+            if self.snapshot:
+                # A revoked member must not keep matching until the interval is up: deletes export at once
+                revoked = any(op == "delete" for _, _, op in changes)
+                snapshot = gallery_snapshot.open_current(self.model_name,
+                                                         min_interval=0.0 if revoked else self.snapshot_interval)
+                if snapshot.seq <= self.seq:
+                    return False  # a recent export is still current; the changes go into the next one
+                changes = [change for change in changes if change[0] <= snapshot.seq]
+
+            # Collapse the log to the final operation per member
+            latest = {}
+            for _, member_id, op in changes:
+                latest[member_id] = op
+            removed = [member_id for member_id, op in latest.items() if op == "delete"]
+            upserted = [member_id for member_id, op in latest.items() if op != "delete"]
+
+            if snapshot is None and self.compact == "pca" and self._exact.needs_refit:
+                # The PCA basis was fitted on too few members (none, if the gallery started empty):
+                # reload to fit it on the whole table rather than encode newcomers with it
+                self._load()
+                ids = upserted
+            else:
+                if snapshot is not None:
+                    exact, seq = snapshot.matcher(), snapshot.seq
+                    ids = upserted
+                else:
+                    ids, names, matrix = database.load_members_by_ids(upserted, self.model_name)
+                    exact = self._exact.with_changes(removed, matrix, names, ids, database.load_samples(ids))
+                    seq = changes[-1][0]
+                self.matcher = self._index(exact, reassign_ids=ids)
+                self._exact = exact
+                self.seq = seq
+
+        if self.on_change:
+            self.on_change(self, len(ids), len(removed))
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Gallery sync failed: {e}")
+
+    def start(self) -> "GalleryCache":
+        """Start background syncing (loads the gallery first if it has not been loaded)."""
+        if not self._loaded:
+            self.load()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="gallery-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,244 @@
+"""Memory-mapped gallery snapshots shared by every recognizing process on the box.
+
+members.db is exported to `members.<seq>.gallery`, where seq is the
+member_changes sequence number it reflects. The file holds a header, the
+normalized float32 template matrix, member ids, fixed-width names and the
+multi-sample table. Processes open it with numpy.memmap, so main.py,
+app.py, entry_server.py and recognition_service.py all score against the
+same page-cache pages instead of a private copy each, and opening it
+parses nothing.
+
+A changed gallery is written to a new file (under a temporary name,
+renamed when complete), so a process still mapping the old snapshot is
+never disturbed. Older snapshots are deleted once a newer one exists
+(best effort: Windows refuses while another process maps them, and they
+go on a later export).
+
+Every export rewrites the whole file, so snapshots suit galleries that
+change rarely. Exports are coalesced: with `min_interval`, open_current
+reuses a snapshot written less than that long ago, even when the table
+has changed since, so a burst of enrollments costs one export per
+interval on the whole box rather than one per change. The changes it
+misses are picked up by the next export.
+
+    python gallery_snapshot.py export [model]   # ahead of time; GalleryCache(snapshot=True) also does it
+"""
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+import database
+import embedding_models
+from matcher import GalleryMatcher, l2_normalize
+
+MAGIC = b"GALSNAP\x00"
+FORMAT_VERSION = 1
+HEADER_BYTES = 4096  # page-aligned matrix start
+ALIGN = 64
+LOCK_STALE_SECONDS = 300.0
+
+
+def _base(db_name: str, model_name: Optional[str]) -> str:
+    base = os.path.splitext(db_name)[0]
+    return base if model_name is None else f"{base}.{model_name.replace(os.sep, '_')}"
+
+
+def snapshot_path(db_name: str, seq: int, model_name: Optional[str] = None) -> str:
+    """members.db at change 42 -> members.42.gallery (members.<model>.42.gallery for one model)."""
+    return f"{_base(db_name, model_name)}.{seq}.gallery"
+
+
+def _snapshots(db_name: str, model_name: Optional[str]) -> Dict[int, str]:
+    base = _base(db_name, model_name)
+    found = {}
+    for path in glob.glob(glob.escape(base) + ".*.gallery"):
+        seq = path[len(base) + 1:-len(".gallery")]
+        if seq.isdigit():
+            found[int(seq)] = path
+    return found
+
+
+def latest_snapshot(db_name: Optional[str] = None, model_name: Optional[str] = None) -> Optional[str]:
+    found = _snapshots(db_name or database.DB_NAME, model_name)
+    return found[max(found)] if found else None
+
+
+def _write_section(f, array: np.ndarray, sections: dict, name: str) -> None:
+    f.write(b"\0" * (-f.tell() % ALIGN))
+    sections[name] = {"offset": f.tell(), "dtype": array.dtype.str, "shape": list(array.shape)}
+    f.write(np.ascontiguousarray(array).tobytes())
+
+
+def export_snapshot(model_name: Optional[str] = None, chunk_size: int = 10000) -> str:
+    """Write the current gallery to a new snapshot file and return its path.
+
+    The table is streamed in chunks, so the gallery is never held twice in memory.
+    """
+    db_name = database.DB_NAME
+    # Read the sequence first: a change racing with the export makes the snapshot look older, never newer
+    seq = database.get_change_seq()
+    path = snapshot_path(db_name, seq, model_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    sections = {}
+    ids, names, dim = [], [], 0
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER_BYTES)
+        sections["matrix"] = {"offset": HEADER_BYTES, "dtype": "<f4"}
+        for chunk_ids, chunk_names, matrix in database.iter_embedding_matrix(model_name, chunk_size):
+            if dim and matrix.shape[1] != dim:
+                raise ValueError(f"Members have mixed embedding dimensions ({dim} and {matrix.shape[1]}); "
+                                 "export one model's gallery")
+            dim = matrix.shape[1]
+            f.write(l2_normalize(matrix).astype("<f4").tobytes())
+            ids.extend(chunk_ids.tolist())
+            names.extend(chunk_names)
+        sections["matrix"]["shape"] = [len(ids), dim]
+        _write_section(f, np.array(ids, dtype="<i8"), sections, "ids")
+        width = max((len(name) for name in names), default=1) or 1
+        _write_section(f, np.array(names, dtype=f"<U{width}"), sections, "names")
+
+        sample_ids, counts, parts = [], [], []
+        for start in range(0, len(ids), chunk_size):
+            for member_id, samples in database.load_samples(ids[start:start + chunk_size]).items():
+                sample_ids.append(member_id)
+                counts.append(len(samples))
+                parts.append(l2_normalize(samples).astype("<f4"))
+        offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype("<i8")
+        _write_section(f, np.array(sample_ids, dtype="<i8"), sections, "sample_ids")
+        _write_section(f, offsets, sections, "sample_offsets")
+        _write_section(f, np.concatenate(parts) if parts else np.zeros((0, dim), dtype="<f4"),
+                       sections, "samples")
+
+        header = json.dumps({"version": FORMAT_VERSION, "seq": seq, "model": model_name,
+                             "created": time.time(), "sections": sections}).encode("utf-8")
+        if len(header) + 12 > HEADER_BYTES:
+            raise ValueError("Snapshot header does not fit")
+        f.seek(0)
+        f.write(MAGIC + len(header).to_bytes(4, "little") + header)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    remove_old_snapshots(path, model_name)
+    return path
+
+
+def remove_old_snapshots(keep: str, model_name: Optional[str] = None) -> None:
+    """Delete the snapshots older than `keep`."""
+    keep_seq = int(keep[:-len(".gallery")].rpartition(".")[2])
+    for seq, path in _snapshots(database.DB_NAME, model_name).items():
+        if seq < keep_seq:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped by a process on Windows; removed by a later export
+
+
+class GallerySnapshot:
+    """A snapshot file opened read-only with numpy.memmap; nothing is parsed or copied."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a gallery snapshot")
+        length = int.from_bytes(bytes(self._map[8:12]), "little")
+        self.header = json.loads(bytes(self._map[12:12 + length]))
+        if self.header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has snapshot format {self.header['version']}, expected {FORMAT_VERSION}")
+        self.seq = self.header["seq"]
+        self.model_name = self.header["model"]
+
+    def _section(self, name: str) -> np.ndarray:
+        spec = self.header["sections"][name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        start = spec["offset"]
+        return self._map[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+
+    def __len__(self) -> int:
+        return self.header["sections"]["ids"]["shape"][0]
+
+    def matcher(self) -> GalleryMatcher:
+        """GalleryMatcher whose matrix, ids, names and samples are views into the mapped file."""
+        ids = self._section("ids")
+        if len(ids) == 0:
+            return GalleryMatcher()
+        offsets = self._section("sample_offsets").tolist()
+        all_samples = self._section("samples")
+        samples = {int(member_id): all_samples[offsets[i]:offsets[i + 1]]
+                   for i, member_id in enumerate(self._section("sample_ids").tolist())}
+        return GalleryMatcher._from_normalized(self._section("matrix"), self._section("names"), ids, samples)
+
+
+def _acquire_lock(path: str) -> bool:
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        try:
+            # An exporter that died leaves its lock behind
+            if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+        return False
+
+
+def _current_path(model_name: Optional[str], min_interval: float) -> Optional[str]:
+    """The snapshot of the current table, or the latest one if written under `min_interval` seconds ago."""
+    found = _snapshots(database.DB_NAME, model_name)
+    path = found.get(database.get_change_seq())
+    if path is None and min_interval > 0 and found:
+        try:
+            if time.time() - os.path.getmtime(found[max(found)]) < min_interval:
+                path = found[max(found)]
+        except OSError:
+            pass  # removed by a newer export in the meantime
+    return path
+
+
+def open_current(model_name: Optional[str] = None, timeout: float = 600.0,
+                 min_interval: float = 0.0) -> GallerySnapshot:
+    """The snapshot for the current members table, exporting it first if no process has yet.
+
+    One process exports at a time; the others wait for its file. With
+    `min_interval`, a snapshot written less than that many seconds ago is
+    returned even if the table has changed since (its `seq` tells how far
+    it goes).
+    """
+    lock_path = f"{_base(database.DB_NAME, model_name)}.gallery.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        path = _current_path(model_name, min_interval)
+        if path is not None:
+            return GallerySnapshot(path)
+        if _acquire_lock(lock_path):
+            try:
+                path = _current_path(model_name, min_interval)
+                return GallerySnapshot(path or export_snapshot(model_name))
+            finally:
+                os.remove(lock_path)
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Waited {timeout:.0f}s for another process to export the gallery snapshot "
+                               f"(remove {lock_path} if no export is running)")
+        time.sleep(0.05)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        print("Usage: python gallery_snapshot.py export [model_name]")
+        return
+    database.init_db()
+    model_name = sys.argv[2] if len(sys.argv) > 2 else embedding_models.DEFAULT_MODEL
+    start = time.perf_counter()
+    snapshot = GallerySnapshot(export_snapshot(model_name))
+    print(f"Exported {len(snapshot)} members in {time.perf_counter() - start:.2f}s -> {snapshot.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Process pool that runs face detection + embedding on every CPU core.
+
+Each worker process loads its own warm copy of the model once. Frames are
+handed over through preallocated shared-memory slots rather than pickled
+ndarrays; only (sequence, slot, shape) travels through the task queue.
+Results are delivered in submission order, tagged with their frame id.
+
+Each worker has its own task queue and its own result pipe, so the pool
+knows which frames a worker holds, and a worker killed mid-write cannot
+leave a lock held that the other workers' results wait on. A worker that dies (OOM kill, a crash in native detector
+code) fails those frames instead of stalling every later result, and is
+replaced by a fresh one. The replacement gets no frames until it reports
+its model loaded, and one that keeps dying before that is restarted less
+and less often.
+"""
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+import recognition
+
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3  # one 1080p BGR frame per slot
+INFER_TIMEOUT = 30.0  # seconds infer() waits for a frame before giving up on it
+LIVENESS_INTERVAL = 0.5  # seconds between checks that every worker is still alive
+RESPAWN_BACKOFF = 1.0  # seconds before restarting a worker that died while loading its model; doubles each time
+RESPAWN_BACKOFF_MAX = 60.0
+
+
+def _worker_main(slot_names, tasks, results, analyze, warmup):
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    try:
+        if warmup is not None:
+            warmup()
+        results.send(("ready", None, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, shape = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+            try:
+                out = ("ok", analyze(frame))
+            except Exception as e:
+                out = ("error", f"{type(e).__name__}: {e}")
+            # Drop the view before the slot can be reused or closed
+            del frame
+            results.send((seq, slot, out))
+    finally:
+        results.close()
+        for shm in slots:
+            shm.close()
+
+
+class InferencePool:
+    """Pool of `workers` processes running `analyze(frame)` with a warm model each.
+
+    `analyze` and `warmup` must be picklable: module-level functions or
+    functools.partial objects wrapping them. The defaults run
+    recognition.analyze_frame with recognition.warm_up.
+
+    submit() returns a Future; futures complete strictly in submission
+    order, and `on_result(frame_id, faces)` is called in that same order.
+    """
+
+    def __init__(self, workers=None, analyze=None, warmup=None, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES,
+                 slots=None, on_result=None):
+        if analyze is None:
+            analyze, warmup = recognition.analyze_frame, recognition.warm_up
+        self.workers = workers or os.cpu_count() or 1
+        self.analyze = analyze
+        self.warmup = warmup
+        self.max_frame_bytes = max_frame_bytes
+        self.num_slots = slots or 2 * self.workers
+        self.on_result = on_result
+        self.dropped = 0
+        self.errors = 0
+        self.restarts = 0
+        self._seq = itertools.count()
+        self._next_seq = 0
+        self._done = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._processes = []
+        self._tasks = []
+        self._assigned = []  # per worker: {seq: slot} of the frames it holds
+        self._ready = []  # per worker: model loaded, so it may be given frames
+        self._failures = []  # per worker: deaths in a row before its model loaded
+        self._respawn_at = []  # per worker: monotonic time to restart it at while it is dead
+        self._owner = {}  # seq -> worker index
+        self._results = []  # per worker: read end of its result pipe (None once the worker is gone)
+        self._slots = []
+        self._collector = None
+        self._closing = False
+        self._stop_collector = threading.Event()
+
+    def _spawn(self, i):
+        """Start worker `i` with a fresh task queue and result pipe (replacing a dead one)."""
+        tasks = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        p = self._ctx.Process(target=_worker_main, args=([shm.name for shm in self._slots], tasks, writer,
+                                                         self.analyze, self.warmup), daemon=True)
+        p.start()
+        writer.close()  # the worker holds the only write end, so its exit reads as EOF
+        if i < len(self._processes):
+            if self._results[i] is not None:
+                self._results[i].close()
+            self._processes[i], self._tasks[i], self._results[i], self._ready[i] = p, tasks, reader, False
+        else:
+            self._processes.append(p)
+            self._tasks.append(tasks)
+            self._results.append(reader)
+            self._assigned.append({})
+            self._ready.append(False)
+            self._failures.append(0)
+            self._respawn_at.append(None)
+
+    def start(self, timeout=300.0):
+        """Spawn the workers and wait until every one has its model loaded."""
+        self._ctx = mp.get_context("spawn")
+        self._slots = [shared_memory.SharedMemory(create=True, size=self.max_frame_bytes)
+                       for _ in range(self.num_slots)]
+        self._free = queue.Queue()
+        for i in range(self.num_slots):
+            self._free.put(i)
+        for i in range(self.workers):
+            self._spawn(i)
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.workers:
+            # Poll so a worker that crashes while loading its model fails fast instead of hanging
+            ready += sum(message[0] == "ready" for _, message in self._receive(0.5))
+            dead = [p for p in self._processes if p.exitcode is not None]
+            if dead or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError(f"Inference workers failed to start ({len(dead)} exited)")
+        self._ready = [True] * self.workers
+        self._collector = threading.Thread(target=self._collect, name="inference-pool", daemon=True)
+        self._collector.start()
+        return self
+
+    def submit(self, frame, frame_id=None, block=True, timeout=None):
+        """Queue a BGR uint8 frame. Returns a Future, or None if no slot was free (frame dropped)."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds max_frame_bytes={self.max_frame_bytes}")
+        try:
+            slot = self._free.get(block=block, timeout=timeout)
+        except queue.Empty:
+            self.dropped += 1
+            return None
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[slot].buf)[...] = frame
+        future = Future()
+        with self._lock:
+            seq = next(self._seq)
+            self._futures[seq] = (frame_id, future)
+            # The least busy worker with its model loaded: results are released in order, so a frame sent
+            # to a replacement still loading would hold back everyone's. Under the lock so a worker
+            # being replaced is never picked half-way
+            workers = [i for i, ready in enumerate(self._ready) if ready] or range(len(self._assigned))
+            worker = min(workers, key=lambda i: len(self._assigned[i]))
+            self._assigned[worker][seq] = slot
+            self._owner[seq] = worker
+            self._tasks[worker].put((seq, slot, frame.shape))
+        return future
+
+    def infer(self, frame, frame_id=None, timeout=INFER_TIMEOUT):
+        """Blocking convenience wrapper: analyze one frame on the pool.
+
+        Raises concurrent.futures.TimeoutError if the result takes longer than `timeout` seconds.
+        """
+        return self.submit(frame, frame_id).result(timeout)
+
+    def _receive(self, timeout):
+        """(worker, message) for every result pipe with data within `timeout` seconds."""
+        messages = []
+        for conn in wait([conn for conn in self._results if conn is not None], timeout):
+            i = self._results.index(conn)
+            try:
+                messages.append((i, conn.recv()))
+            except (EOFError, OSError):
+                # The worker exited; the liveness check fails its frames and replaces it
+                conn.close()
+                self._results[i] = None
+        return messages
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while not self._stop_collector.is_set():
+            for i, message in self._receive(LIVENESS_INTERVAL):
+                if message[0] == "ready":
+                    self._mark_ready(i)
+                    continue
+                seq, slot, (status, payload) = message
+                with self._lock:
+                    worker = self._owner.pop(seq, None)
+                    if worker is not None:
+                        # Otherwise the frame was already failed when its worker was found dead
+                        del self._assigned[worker][seq]
+                        self._done[seq] = (status, payload)
+                if worker is not None:
+                    self._free.put(slot)
+            if time.monotonic() - last_check >= LIVENESS_INTERVAL:
+                last_check = time.monotonic()
+                self._replace_dead_workers()
+            self._release()
+
+    def _mark_ready(self, i):
+        """A replacement worker has its model loaded: start giving it frames."""
+        with self._lock:
+            self._ready[i], self._failures[i] = True, 0
+
+    def _replace_dead_workers(self):
+        now = time.monotonic()
+        for i, p in enumerate(list(self._processes)):
+            if p.exitcode is None or self._closing:
+                continue
+            with self._lock:
+                lost, self._assigned[i] = self._assigned[i], {}
+                for seq in lost:
+                    del self._owner[seq]
+                    self._done[seq] = ("error", f"Inference worker exited with code {p.exitcode}")
+                if self._respawn_at[i] is None:
+                    # A working worker that crashed is replaced at once; one that keeps dying while
+                    # loading its model waits twice as long each time
+                    delay = 0.0
+                    if not self._ready[i]:
+                        delay = min(RESPAWN_BACKOFF * 2 ** self._failures[i], RESPAWN_BACKOFF_MAX)
+                        self._failures[i] += 1
+                    self._ready[i] = False
+                    self._respawn_at[i] = now + delay
+                if now >= self._respawn_at[i]:
+                    self._spawn(i)
+                    self._respawn_at[i] = None
+                    self.restarts += 1
+            for slot in lost.values():
+                self._free.put(slot)
+
+    def _release(self):
+        with self._lock:
+            ready = []
+            # Release results strictly in submission order
+            while self._next_seq in self._done:
+                status, payload = self._done.pop(self._next_seq)
+                frame_id, future = self._futures.pop(self._next_seq)
+                ready.append((frame_id, future, status, payload))
+                self._next_seq += 1
+        for frame_id, future, status, payload in ready:
+            if status == "ok":
+                future.set_result(payload)
+                if self.on_result is not None:
+                    self.on_result(frame_id, payload)
+            else:
+                self.errors += 1
+                future.set_exception(RuntimeError(payload))
+
+    def close(self):
+        self._closing = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        for p in self._processes:
+            p.join(5.0)
+            if p.is_alive():
+                p.terminate()
+        self._stop_collector.set()
+        if self._collector is not None:
+            self._collector.join(2.0)
+        for conn in self._results:
+            if conn is not None:
+                conn.close()
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._processes = []
+        self._tasks = []
+        self._results = []
+        self._slots = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,151 +1,251 @@
-import time
-import database
-import utils
-
-# Optional heavy dependencies: import if available, otherwise handle gracefully
-try:
-    import cv2
-    HAS_CV2 = True
-except Exception:
-    cv2 = None
-    HAS_CV2 = False
-
-try:
-    import numpy as np  # type: ignore
-except Exception:
-    np = None
-
-try:
-    from deepface import DeepFace  # type: ignore
-    HAS_DEEPFACE = True
-except Exception:
-    DeepFace = None
-    HAS_DEEPFACE = False
-
-# Configuration
-THRESHOLD = 0.68 # Adjust based on experiments
-PROCESS_EVERY_N_FRAMES = 5  # To improve performance
-MODEL_NAME = "VGG-Face"
-
-def start_recognition():
-    print("Initializing Face Recognition Entry System...")
-    
-    # Ensure the database is initialized (creates table if missing)
-    database.init_db()
-
-    # Load members from database
-    members = database.get_all_members()
-    if not members:
-        print("Warning: No members in database. Use admin.py add <name> first.")
-    
-    print(f"Loaded {len(members)} premium members.")
-    # Check required heavy dependencies
-    if not HAS_CV2:
-        print("Error: OpenCV (cv2) is not installed. Install with: pip install opencv-python")
-        return
-
-    if not HAS_DEEPFACE:
-        print("Error: deepface is not installed. Install with: pip install deepface")
-        return
-
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open camera.")
-        return
-    
-    frame_count = 0
-    results = [] # Store latest detection results (bounding box and name)
-    
-    print("System active. Press 'q' to exit.")
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Display frame
-        display_frame = frame.copy()
-        
-        # Performance optimization: only process every N frames
-        if frame_count % PROCESS_EVERY_N_FRAMES == 0:
-            results = []
-            try:
-                # Detect faces and extract embeddings
-                # DeepFace.represent can detect multiple faces and return their embeddings and bounding boxes
-                # It uses 'enforce_detection=False' to avoid crashing when no face is present
-                extractions = DeepFace.represent(img_path=frame, 
-                                                model_name=MODEL_NAME, 
-                                                enforce_detection=False,
-                                                detector_backend='opencv') # Or 'retinaface' for better but slower
-
-                # DeepFace.represent may return a dict for single face, normalize to list
-                if isinstance(extractions, dict):
-                    extractions = [extractions]
-
-                for face in extractions:
-                    # Skip if face wasn't detected (face_confidence = 0)
-                    if face.get('face_confidence', 0) < 0.5:
-                        continue
-                        
-                    embedding = face["embedding"]
-                    region = face["facial_area"] # x, y, w, h
-                    
-                    best_match = None
-                    max_similarity = -1
-                    
-                    # Compare with database
-                    for member in members:
-                        similarity = utils.cosine_similarity(embedding, member["embedding"])
-                        if similarity > max_similarity:
-                            max_similarity = similarity
-                            best_match = member["name"]
-                    
-                    # Decision logic
-                    if max_similarity >= THRESHOLD:
-                        results.append({
-                            "name": best_match,
-                            "similarity": max_similarity,
-                            "region": region,
-                            "granted": True
-                        })
-                    else:
-                        results.append({
-                            "name": "Guest / Unknown",
-                            "similarity": max_similarity,
-                            "region": region,
-                            "granted": False
-                        })
-            except Exception as e:
-                # Log error or ignore frame
-                # print(f"Error: {e}")
-                pass
-        
-        # Draw results on frame
-        for res in results:
-            r = res["region"]
-            color = (0, 255, 0) if res["granted"] else (0, 0, 255)
-            label = f"{res['name']} ({res['similarity']:.2f})" if res["granted"] else "Access Denied"
-            
-            # Draw rectangle
-            cv2.rectangle(display_frame, (r['x'], r['y']), (r['x'] + r['w'], r['y'] + r['h']), color, 2)
-            
-            # Draw label
-            cv2.putText(display_frame, label, (r['x'], r['y'] - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                        
-            # Grant access visual message
-            if res["granted"]:
-                cv2.putText(display_frame, "ACCESS GRANTED", (10, 50), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
-        
-        cv2.imshow("Premium Lounge Entry", display_frame)
-        
-        frame_count += 1
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-            
-    cap.release()
-    cv2.destroyAllWindows()
-
-if __name__ == "__main__":
-    start_recognition()
+import argparse
+import functools
+import sys
+import time
+import database
+import embedding_models
+import recognition
+from access_log import AccessLogWriter
+from embed_cache import EmbeddingCache
+from events import DecisionEmitter, FanOutSink, open_sink
+from frame_source import open_source
+from gallery_cache import GalleryCache
+from inference_pool import InferencePool
+from metrics import FACE_BUCKETS, Metrics, open_metrics
+from pipeline import Pipeline
+from scheduler import AdaptiveScheduler
+from tracker import FaceTracker
+
+from utils import PhaseTimer
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully.
+# deepface/TensorFlow are only checked for here; the warm-up phase imports them
+try:
+    import cv2
+    HAS_CV2 = True
+except Exception:
+    cv2 = None
+    HAS_CV2 = False
+
+HAS_DEEPFACE = recognition.deepface_available()
+
+# Configuration
+MODEL_NAME = recognition.MODEL_NAME  # Embedding model (see embedding_models.py); only its members' embeddings are loaded
+THRESHOLD = embedding_models.threshold_for(MODEL_NAME)  # Per model; calibrate with benchmarks/bench_models.py
+CPU_BUDGET = 0.5  # Fraction of one core recognition may use; frames are skipped to stay within it
+IDLE_INTERVAL = 2.0  # Seconds between recognition runs while the scene is empty and still
+INFERENCE_WORKERS = 0  # >0 runs detection + embedding in that many processes (one warm model each)
+TRACK_FACES = True  # Reuse a tracked face's decision instead of re-embedding it every processed frame
+REFRESH_INTERVAL = 2.0  # Seconds before a tracked face is re-embedded to refresh its decision
+EMBEDDING_CACHE_TTL = 5.0  # Seconds a near-identical face crop reuses its embedding (0 to disable)
+DETECTION_ROI = None  # (x, y, w, h) fractions of the frame covering the door; None scans the whole frame
+DETECTION_WIDTH = 640  # Detector input width in pixels (faces are still cropped at full resolution; None: no downscale)
+GALLERY_COMPACT = None  # "float16", "int8" or "pca" keeps a compact gallery in RAM (see compact_gallery.py)
+GALLERY_SNAPSHOT = True  # Map the gallery from a members.<seq>.gallery file shared by all processes (see gallery_snapshot.py)
+ACCESS_LOG = True  # Persist decisions to the access_events table (see admin.py log)
+STATS_INTERVAL = 10.0  # Seconds between per-stage throughput/latency reports (0 to disable)
+METRICS = None  # "9108": Prometheus text at http://127.0.0.1:9108/metrics; a file path: dumped there instead
+
+def start_recognition(source="0", paced=None, headless=False, events=None, metrics=METRICS):
+    """Run the entry system on a frame source spec (see frame_source.open_source).
+
+    `headless` skips the window and all drawing. Access decisions go to
+    `events` (an events sink), defaulting to JSON lines on stdout when headless.
+    `metrics` is a port or file path to export stage latency histograms,
+    errors and queue depths to (see metrics.open_metrics); None records none.
+    """
+    # Headless runs keep stdout for the event stream; human-readable output goes to stderr
+    log = functools.partial(print, file=sys.stderr) if headless else print
+    if headless and events is None:
+        events = open_sink("-")
+    log("Initializing Face Recognition Entry System...")
+    timer = PhaseTimer()
+    gallery = pool = access_log = pipeline = exporter = cap = None
+    try:
+        # Check required heavy dependencies
+        if not HAS_CV2:
+            log("Error: OpenCV (cv2) is not installed. Install with: pip install opencv-python")
+            return
+
+        if not HAS_DEEPFACE:
+            log("Error: deepface is not installed. Install with: pip install deepface")
+            return
+
+        # Importing TensorFlow and building the model take most of startup: do it in the
+        # background while the gallery loads and the camera opens (pool workers warm their own)
+        warm_up = recognition.start_warm_up(MODEL_NAME) if not INFERENCE_WORKERS else None
+
+        # Ensure the database is initialized (creates table if missing)
+        with timer.phase("database"):
+            database.init_db()
+
+        # Load members from database straight into a float32 matrix. Large galleries are
+        # searched through the IVF index; misses below THRESHOLD are re-checked exactly
+        gallery = GalleryCache(verify_threshold=THRESHOLD, model_name=MODEL_NAME, compact=GALLERY_COMPACT,
+                               snapshot=GALLERY_SNAPSHOT, on_change=lambda cache, added, removed: log(
+                                   f"Gallery updated: +{added} / -{removed} members ({len(cache)} total)."))
+        with timer.phase("gallery"):
+            gallery.load()
+        if len(gallery) == 0:
+            log("Warning: No members in database. Use admin.py add <name> first.")
+        unmigrated = database.count_members_without_model(MODEL_NAME)
+        if unmigrated:
+            log(f"Note: {unmigrated} members were enrolled with another model and are only recognized once "
+                f"re-embedded: python admin.py reembed {MODEL_NAME} <photos>")
+
+        log(f"Loaded {len(gallery)} premium members ({MODEL_NAME}, threshold {THRESHOLD:.2f}).")
+
+        with timer.phase("source"):
+            cap = open_source(source, paced)
+        if not cap.isOpened():
+            log(f"Error: Could not open frame source {source!r}.")
+            return
+
+        # Capture, detection, embedding and matching run on their own threads joined by
+        # drop-oldest queues; this loop only draws the newest frame with the latest results
+        # Performance optimization: recognise often while someone moves or is unresolved,
+        # rarely on an empty corridor, never beyond the CPU budget
+        scheduler = AdaptiveScheduler(cpu_budget=CPU_BUDGET, idle_interval=IDLE_INTERVAL)
+        # Decisions are written to members.db in batches on a background thread
+        access_log = AccessLogWriter().start() if ACCESS_LOG else None
+        sinks = FanOutSink(events, access_log)
+        emitter = DecisionEmitter(sinks) if sinks.sinks else None
+
+        registry = Metrics() if metrics else None
+
+        def on_result(job):
+            scheduler.observe(job)
+            if emitter:
+                emitter.handle(job)
+            if registry:
+                registry.observe("faces_per_frame", len(job["faces"]), buckets=FACE_BUCKETS)
+                for result in job["results"]:
+                    registry.inc("decisions_total", outcome="granted" if result["granted"] else "denied")
+
+        reported_errors = set()
+
+        def on_error(stage, error):
+            # A failing stage drops that frame and carries on; say so once per kind of failure
+            if (stage, type(error)) not in reported_errors:
+                reported_errors.add((stage, type(error)))
+                log(f"Error in {stage} stage: {type(error).__name__}: {error} (further ones are only counted)")
+
+        pipeline = Pipeline(recognition.camera_source(cap), should_process=scheduler.should_process,
+                            on_result=on_result, on_error=on_error, histograms=registry is not None,
+                            keep_frames=not headless)
+        if INFERENCE_WORKERS:
+            log(f"Starting {INFERENCE_WORKERS} inference workers...")
+            with timer.phase("inference workers"):
+                pool = InferencePool(INFERENCE_WORKERS,
+                                     analyze=functools.partial(recognition.analyze_frame, model_name=MODEL_NAME,
+                                                               roi=DETECTION_ROI, detection_width=DETECTION_WIDTH),
+                                     warmup=functools.partial(recognition.warm_up, MODEL_NAME)).start()
+        tracker = FaceTracker(refresh_interval=REFRESH_INTERVAL, interval=scheduler.current_interval) if TRACK_FACES else None
+        embedding_cache = None
+        if EMBEDDING_CACHE_TTL and not pool:
+            # Same face crop in consecutive frames -> reuse its embedding instead of a forward pass
+            embedding_cache = EmbeddingCache(ttl=EMBEDDING_CACHE_TTL)
+        recognition.add_recognition_stages(pipeline, lambda: gallery.matcher, THRESHOLD,
+                                           model_name=MODEL_NAME, min_confidence=0.5, pool=pool, tracker=tracker,
+                                           roi=DETECTION_ROI, detection_width=DETECTION_WIDTH)
+
+        if warm_up is not None:
+            # Never report "active" with a cold model: the first face would pay for it
+            log("Warming up the recognition model...")
+            try:
+                with timer.phase("model wait"):
+                    model_seconds = warm_up.result()
+            except Exception as e:
+                log(f"Error: could not load the recognition model: {e}")
+                return
+            timer.add("model warm-up (background)", model_seconds)
+        if embedding_cache is not None:
+            # Only once warm: get_embedder builds the model, which must happen inside "model wait"
+            recognition.get_embedder(MODEL_NAME).cache = embedding_cache
+
+        # Pick up members added/deleted with admin.py while running
+        gallery.start()
+        pipeline.start()
+        exporter = None
+        if registry:
+            registry.add_pipeline(pipeline)
+            registry.add_collector(lambda: [("gallery_members", "gauge", {}, len(gallery))])
+            exporter = open_metrics(metrics, registry, interval=STATS_INTERVAL or 10.0)
+            log(f"Exporting metrics to {metrics}.")
+        log(timer.format())
+        log("System active. Press Ctrl+C to exit." if headless else "System active. Press 'q' to exit.")
+        last_stats = time.time()
+
+        def report_stats():
+            log(pipeline.format_stats())
+            log(scheduler.format_stats())
+            if tracker:
+                log(f"tracker: {len(tracker.tracks)} tracks, {tracker.skip_ratio:.0%} of faces reused a decision")
+            if embedding_cache:
+                log(embedding_cache.format_stats())
+            if access_log:
+                log(access_log.format_stats())
+
+        if headless:
+            # No window, no drawing: wait until the source has ended and its last frames are decided
+            try:
+                while not pipeline.drained.wait(1.0):
+                    if STATS_INTERVAL and time.time() - last_stats >= STATS_INTERVAL:
+                        report_stats()
+                        last_stats = time.time()
+            except KeyboardInterrupt:
+                pass
+
+        while not headless:
+            job = pipeline.frames.get(timeout=1.0)
+            if job is None:
+                if pipeline.finished.is_set():
+                    break
+                continue
+
+            start = time.perf_counter()
+            display_frame = job["frame"].copy()
+            latest = pipeline.latest
+            # Draw the most recent results on the newest frame
+            recognition.draw_results(display_frame, latest["results"] if latest else [])
+            cv2.imshow("Premium Lounge Entry", display_frame)
+            pipeline.record("render", time.perf_counter() - start)
+
+            if STATS_INTERVAL and time.time() - last_stats >= STATS_INTERVAL:
+                report_stats()
+                last_stats = time.time()
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        # Every exit path (no model, an error, Ctrl+C) stops what was started and closes the sinks
+        if pipeline is not None:
+            pipeline.stop()
+        if pool:
+            pool.close()
+        if gallery is not None:
+            gallery.stop()
+        FanOutSink(events, access_log).close()
+        if exporter:
+            exporter.close()
+        if cap is not None:
+            cap.release()
+    log(pipeline.format_stats())
+    if not headless:
+        cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face-recognition entry system.")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file, image directory or synthetic[:N] (default: camera 0)")
+    parser.add_argument("--fast", action="store_true",
+                        help="read recorded sources as fast as possible instead of in real time")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window or drawing; stream access decisions as JSON lines")
+    parser.add_argument("--events", default=None,
+                        help="where decisions go: - (stdout, default when headless), unix:/path.sock or a file")
+    parser.add_argument("--metrics", default=METRICS,
+                        help="export Prometheus metrics on this local port, or dump them to this file")
+    args = parser.parse_args()
+    start_recognition(args.source, paced=False if args.fast else None, headless=args.headless,
+                      events=open_sink(args.events) if args.events else None, metrics=args.metrics)
@@ -0,0 +1,187 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def l2_normalize(vectors) -> np.ndarray:
+    """Return a float32 copy of `vectors` with every row scaled to unit length.
+
+    Accepts a single vector or a 2-D array of row vectors. Zero rows stay zero,
+    so they score 0.0 against everything (same as utils.cosine_similarity).
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def template_centroid(samples) -> np.ndarray:
+    """Unit-length mean of the unit-length sample embeddings of one member."""
+    return l2_normalize(l2_normalize(samples).mean(axis=0))[0]
+
+
+class GalleryMatcher:
+    """Scores face embeddings against the whole member gallery at once.
+
+    Member embeddings are stored as one pre-normalized float32 matrix with the
+    member names (and optional database ids) in parallel arrays, so matching
+    every detected face is a single matrix multiply instead of a Python loop
+    over members. Instances are treated as immutable: build a new matcher
+    when the gallery changes and swap the reference.
+
+    Members enrolled from several frames have their template centroid in
+    the matrix and the individual samples in `samples` ({id: (k, dim)}).
+    The centroid scan picks the `rerank_candidates` best members, which are
+    then re-scored by their best sample, so the cost of a query grows with
+    the number of members, not the number of samples.
+    """
+
+    rerank_candidates = 8
+
+    def __init__(self, embeddings=None, names: Sequence[str] = (), ids: Optional[Sequence[int]] = None,
+                 samples: Optional[Dict[int, np.ndarray]] = None):
+        names = list(names)
+        if embeddings is None or len(names) == 0:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.matrix = l2_normalize(embeddings)
+        if self.matrix.shape[0] != len(names):
+            raise ValueError("Number of embeddings and names must match")
+        self.names = np.array(names, dtype=object)
+        if ids is None:
+            ids = range(len(names))
+        self.ids = np.asarray(list(ids), dtype=np.int64)
+        self.samples = {int(k): l2_normalize(v) for k, v in (samples or {}).items()}
+
+    @classmethod
+    def from_members(cls, members: Iterable[dict]) -> "GalleryMatcher":
+        """Build a matcher from database.get_all_members() style rows."""
+        members = list(members)
+        if not members:
+            return cls()
+        dims = {len(m["embedding"]) for m in members}
+        if len(dims) > 1:
+            raise ValueError(f"Member embeddings have mixed dimensions: {sorted(dims)}")
+        embeddings = np.array([m["embedding"] for m in members], dtype=np.float32)
+        names = [m["name"] for m in members]
+        ids = [m["id"] for m in members] if all("id" in m for m in members) else None
+        return cls(embeddings, names, ids)
+
+    @classmethod
+    def _from_normalized(cls, matrix: np.ndarray, names: np.ndarray, ids: np.ndarray,
+                         samples: Optional[Dict[int, np.ndarray]] = None) -> "GalleryMatcher":
+        matcher = cls.__new__(cls)
+        matcher.matrix = matrix
+        matcher.names = names
+        matcher.ids = ids
+        matcher.samples = samples or {}
+        return matcher
+
+    def with_changes(self, remove_ids: Iterable[int] = (), embeddings=None, names: Sequence[str] = (),
+                     ids: Sequence[int] = (), samples: Optional[Dict[int, np.ndarray]] = None) -> "GalleryMatcher":
+        """Return a new matcher with `remove_ids` dropped and the given members appended.
+
+        Only the new embeddings are normalized; the existing rows are copied as is,
+        so patching a large gallery costs one memcpy rather than a reload.
+        Appended ids replace any existing rows (and samples) with the same id.
+        """
+        names = list(names)
+        drop = set(int(i) for i in remove_ids) | set(int(i) for i in ids)
+        kept_samples = {k: v for k, v in self.samples.items() if k not in drop}
+        kept_samples.update((int(k), l2_normalize(v)) for k, v in (samples or {}).items())
+        keep = ~np.isin(self.ids, list(drop)) if drop else np.ones(len(self), dtype=bool)
+        matrix, kept_names, kept_ids = self.matrix[keep], self.names[keep], self.ids[keep]
+        if names:
+            added = l2_normalize(embeddings)
+            if len(self) and len(kept_ids) and added.shape[1] != self.dim:
+                raise ValueError(f"New embeddings have dimension {added.shape[1]}, gallery has {self.dim}")
+            matrix = added if len(kept_ids) == 0 else np.vstack([matrix, added])
+            kept_names = np.concatenate([kept_names, np.array(names, dtype=object)])
+            kept_ids = np.concatenate([kept_ids, np.asarray(ids, dtype=np.int64)])
+        if len(kept_ids) == 0:
+            return GalleryMatcher()
+        return GalleryMatcher._from_normalized(matrix, kept_names, kept_ids, kept_samples)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def scores(self, queries) -> np.ndarray:
+        """Cosine similarity of every query (rows) against every member (columns)."""
+        queries = l2_normalize(queries)
+        if len(self) == 0:
+            return np.zeros((queries.shape[0], 0), dtype=np.float32)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match gallery dimension {self.dim}")
+        return queries @ self.matrix.T
+
+    def candidates(self, k: int) -> int:
+        """How many centroid hits a top-k search keeps before the sample rerank."""
+        return max(k, self.rerank_candidates) if self.samples else k
+
+    def rerank(self, queries, indices: np.ndarray, sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score candidate rows of multi-sample members by their best sample (or centroid); keep the top k.
+
+        `queries` must already be normalized. Members without samples keep
+        their centroid (single embedding) score.
+        """
+        if self.samples:
+            sims = sims.copy()
+            for qi, query in enumerate(queries):
+                for ci, row in enumerate(indices[qi]):
+                    if sims[qi, ci] <= -1.0:
+                        continue  # padding of a short candidate list (see IVFIndex.search)
+                    member_samples = self.samples.get(int(self.ids[row]))
+                    if member_samples is not None:
+                        # The centroid counts as one more sample: it is the most robust to plain noise
+                        sims[qi, ci] = max(sims[qi, ci], np.max(member_samples @ query))
+            order = np.argsort(-sims, axis=1, kind="stable")
+            indices = np.take_along_axis(indices, order, axis=1)
+            sims = np.take_along_axis(sims, order, axis=1)
+        return indices[:, :k], sims[:, :k]
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, similarities) of the top-k members per query, best first.
+
+        Both arrays have shape (num_queries, min(k, len(gallery))).
+        """
+        queries = l2_normalize(queries)
+        sims = self.scores(queries)
+        wanted = min(k, sims.shape[1])
+        k = min(self.candidates(k), sims.shape[1])
+        if k == 0:
+            empty = np.zeros((sims.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if k < sims.shape[1]:
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(sims.shape[1]), (sims.shape[0], 1))
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return self.rerank(queries, top, np.take_along_axis(top_sims, order, axis=1), wanted)
+
+    def top_k(self, queries, k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Top-k (name, similarity) pairs for each query."""
+        indices, sims = self.search(queries, k)
+        return [[(self.names[i], float(s)) for i, s in zip(row_i, row_s)]
+                for row_i, row_s in zip(indices, sims)]
+
+    def best_matches(self, queries) -> List[Tuple[Optional[str], float]]:
+        """Best (name, similarity) for each query.
+
+        With an empty gallery every query gets (None, -1.0), mirroring the
+        initial values of the old per-member loop.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        if len(self) == 0:
+            return [(None, -1.0)] * queries.shape[0]
+        indices, sims = self.search(queries, 1)
+        return [(self.names[i], float(s)) for i, s in zip(indices[:, 0], sims[:, 0])]
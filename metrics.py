@@ -0,0 +1,255 @@
+"""Prometheus-style metrics for the recognition loops.
+
+Counters that already exist (pipeline.StageStats, queue depths, dropped
+frames) are read only when the metrics are scraped, so they cost the frame
+loop nothing. Per-item latency histograms are kept by pipelines built with
+`histograms=True` (one bisect per stage per frame). With metrics disabled
+nothing here is created at all.
+
+    python main.py --metrics 9108          # served at http://127.0.0.1:9108/metrics
+    python main.py --metrics entry.prom    # rewritten every few seconds (node_exporter textfile collector)
+"""
+import bisect
+import http.server
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds; covers a 1 ms matcher call up to a multi-second cold model
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FACE_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20)
+
+HELP = {
+    "stage_seconds": "Time spent on one item in each pipeline stage.",
+    "stage_items_total": "Items completed by each pipeline stage.",
+    "stage_busy_seconds_total": "Total time each pipeline stage spent working.",
+    "stage_errors_total": "Exceptions raised in each pipeline stage, by exception type.",
+    "stage_dropped_total": "Items dropped from a full stage queue in favour of a newer one.",
+    "queue_depth": "Items waiting in each stage queue.",
+    "frames_skipped_total": "Captured frames the scheduler did not send for recognition.",
+    "faces_per_frame": "Faces detected per processed frame.",
+    "decisions_total": "Access decisions, by outcome.",
+    "gallery_members": "Members in the in-memory gallery.",
+    "faces_embedded_total": "Face crops run through the embedding model.",
+    "inference_superseded_total": "Detected frames replaced by a newer one from the same door before inference.",
+    "requests_total": "Recognition service requests, by HTTP status.",
+    "request_seconds": "Recognition service time from connection to response.",
+    "batch_faces": "Faces embedded per micro-batched forward pass.",
+    "batch_seconds": "Time to embed and match one micro-batch.",
+}
+
+# (name, type, labels, value); value is a number, or a Histogram for type "histogram"
+Sample = Tuple[str, str, Dict[str, str], object]
+
+
+class Histogram:
+    """Bucketed value distribution with Prometheus `le` (less-or-equal) buckets.
+
+    Not locked: record from one thread, or under the caller's lock.
+    """
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf when it is past the last bound)."""
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return bound
+        return float("inf")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Counters and histograms recorded by the loops, plus collectors read at scrape time.
+
+    Metric names get `prefix` + "_" when rendered. Counters should end in
+    "_total", as Prometheus expects.
+    """
+
+    def __init__(self, prefix: str = "entry"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS, **labels) -> None:
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collect: Callable[[], Iterable[Sample]]) -> Callable[[], Iterable[Sample]]:
+        """Add `collect()`, called at every scrape and returning (name, type, labels, value) samples."""
+        self._collectors.append(collect)
+        return collect
+
+    def remove_collector(self, collect: Callable[[], Iterable[Sample]]) -> None:
+        if collect in self._collectors:
+            self._collectors.remove(collect)
+
+    def add_pipeline(self, pipeline, **labels) -> Callable[[], Iterable[Sample]]:
+        """Export a pipeline.Pipeline's per-stage counters, histograms and queues (e.g. labels door="front").
+
+        Returns the collector, for remove_collector() once the pipeline is stopped.
+        """
+        def collect():
+            yield "frames_skipped_total", "counter", dict(labels), pipeline.skipped
+            for stats, queue in pipeline.stage_stats():
+                stage = dict(labels, stage=stats.name)
+                yield "stage_items_total", "counter", stage, stats.items
+                yield "stage_busy_seconds_total", "counter", stage, stats.total_seconds
+                if stats.histogram is not None:
+                    yield "stage_seconds", "histogram", stage, stats.histogram
+                for error_type, count in list(stats.error_types.items()):
+                    yield "stage_errors_total", "counter", dict(stage, type=error_type), count
+                if queue is not None:
+                    yield "queue_depth", "gauge", stage, len(queue)
+                    yield "stage_dropped_total", "counter", stage, queue.dropped
+
+        return self.add_collector(collect)
+
+    def collect(self) -> List[Sample]:
+        with self._lock:
+            samples = [(name, "counter", dict(labels), value) for (name, labels), value in self._counters.items()]
+            # Copy so rendering never sees a histogram half-updated
+            for (name, labels), histogram in self._histograms.items():
+                copy = Histogram(histogram.bounds)
+                copy.counts, copy.count, copy.sum = list(histogram.counts), histogram.count, histogram.sum
+                samples.append((name, "histogram", dict(labels), copy))
+        for collect in list(self._collectors):
+            samples.extend(collect())
+        return samples
+
+    def render(self) -> str:
+        """All samples in the Prometheus text exposition format (version 0.0.4)."""
+        families: Dict[str, Tuple[str, List[Sample]]] = {}
+        for sample in self.collect():
+            families.setdefault(sample[0], (sample[1], []))[1].append(sample)
+        lines = []
+        for name, (kind, samples) in families.items():
+            full_name = f"{self.prefix}_{name}" if self.prefix else name
+            if name in HELP:
+                lines.append(f"# HELP {full_name} {HELP[name]}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for _, _, labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(value.bounds + (float("inf"),), value.counts):
+                    cumulative += n
+                    lines.append(f"{full_name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} "
+                                 f"{cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves metrics.render() at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # one line per scrape would drown the console
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = None
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsFile:
+    """Rewrites `path` with metrics.render() every `interval` seconds, and once more on close.
+
+    The file is replaced atomically, as node_exporter's textfile collector expects.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "MetricsFile":
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        self.write()
+
+
+def open_metrics(spec: str, metrics: Metrics, interval: float = 10.0):
+    """Exporter for "PORT" or "HOST:PORT" (HTTP endpoint) or a file path (periodic dump), started."""
+    host, _, port = spec.rpartition(":")
+    if port.isdigit():
+        return MetricsServer(metrics, int(port), host or "127.0.0.1").start()
+    return MetricsFile(metrics, spec, interval).start()
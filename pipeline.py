@@ -0,0 +1,325 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import Histogram
+
+
+class DropOldestQueue:
+    """Bounded queue whose put() never blocks: when full, the oldest item is dropped.
+
+    Stages downstream of a slow stage therefore always work on the newest
+    frame instead of a growing backlog.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item) -> None:
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """Oldest queued item, or None on timeout or once the queue is closed and empty."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class StageStats:
+    """Throughput/latency counters for one stage, with an optional per-item latency histogram."""
+
+    def __init__(self, name: str, histogram: bool = False):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.error_types = collections.Counter()
+        self.histogram = Histogram() if histogram else None
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.last_error = None
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._record(seconds)
+
+    def _record(self, seconds: float) -> None:
+        self.items += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def record_error(self, error: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+            self.error_types[type(error).__name__] += 1
+            self.last_error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        return {
+            "items": self.items,
+            "per_sec": self.items / elapsed,
+            "avg_ms": 1000 * self.total_seconds / self.items if self.items else 0.0,
+            "last_ms": 1000 * self.last_seconds,
+            "max_ms": 1000 * self.max_seconds,
+            # fraction of wall time the stage was busy; the stage near 1.0 is the bottleneck
+            "busy": self.total_seconds / elapsed,
+            "errors": self.errors,
+            "p95_ms": 1000 * self.histogram.quantile(0.95) if self.histogram is not None else None,
+        }
+
+
+class Stage:
+    """A worker thread applying `func` to items from `inbox` and passing results to `outbox`.
+
+    `func` returning None drops the item. Exceptions are counted per stage and
+    the item is dropped, so one bad frame cannot stall the pipeline. Once the
+    inbox is closed and drained, the last worker to exit closes `outbox` and
+    calls `on_done()`.
+    """
+
+    def __init__(self, name: str, func: Callable, inbox: DropOldestQueue,
+                 outbox: Optional[DropOldestQueue] = None, sink: Optional[Callable] = None,
+                 on_error: Optional[Callable[[str, Exception], None]] = None, workers: int = 1,
+                 histogram: bool = False, on_done: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.sink = sink
+        self.on_error = on_error
+        self.on_done = on_done
+        self.stats = StageStats(name, histogram)
+        self._stop = threading.Event()
+        self._alive = workers
+        self._alive_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"stage-{name}-{i}", daemon=True)
+                         for i in range(workers)]
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self.inbox.get(timeout=0.1)
+            if item is None:
+                if self.inbox.closed:
+                    break
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.stats.record_error(e)
+                if self.on_error is not None:
+                    self.on_error(self.name, e)
+                continue
+            self.stats.record(time.perf_counter() - start)
+            if result is None:
+                continue
+            if self.outbox is not None:
+                self.outbox.put(result)
+            if self.sink is not None:
+                self.sink(result)
+        with self._alive_lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.outbox is not None:
+            self.outbox.close()
+        if last and self.on_done is not None:
+            self.on_done()
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self.inbox.close()
+        for thread in self._threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout)
+
+
+class Pipeline:
+    """Capture -> processing stages -> latest result, each stage on its own thread.
+
+    `source` is called repeatedly on the capture thread and returns the next
+    item (None ends the stream). Every captured item goes to `frames`, a
+    one-slot drop-oldest queue the UI reads so it always shows the newest
+    frame. Items accepted by `should_process` also enter the first
+    processing stage. The last stage's output is kept in `latest` and passed
+    to `on_result`; stage exceptions go to `on_error(stage_name, exc)`. Work done outside the pipeline threads (e.g. rendering
+    on the UI thread) can be timed into the same stats with record().
+    `histograms` also keeps a per-item latency histogram for every stage
+    (see metrics.Metrics.add_pipeline). `on_frame(item)` is called on the
+    capture thread after every captured item is queued, so a UI can render on
+    frame arrival instead of polling `frames`. Headless users pass
+    `keep_frames=False`, and nothing is queued to `frames`.
+
+    When the source ends, `finished` is set and the end is passed down the
+    stages: each one finishes the items already queued to it, and `drained`
+    is set once the last stage has exited. Wait on `drained` to get every
+    result of a finite source before stopping.
+    """
+
+    def __init__(self, source: Optional[Callable[[], Any]] = None,
+                 should_process: Optional[Callable[[Any], bool]] = None,
+                 on_result: Optional[Callable[[Any], None]] = None,
+                 on_error: Optional[Callable[[str, Exception], None]] = None, source_name: str = "capture",
+                 histograms: bool = False, on_frame: Optional[Callable[[Any], None]] = None,
+                 keep_frames: bool = True):
+        self.source = source
+        self.source_name = source_name
+        self.should_process = should_process
+        self.on_result = on_result
+        self.on_error = on_error
+        self.histograms = histograms
+        self.on_frame = on_frame
+        self.keep_frames = keep_frames
+        self.frames = DropOldestQueue(1)
+        self.latest = None
+        self.finished = threading.Event()
+        self.drained = threading.Event()
+        self.stages: List[Stage] = []
+        self._specs = []
+        self._extra_stats: Dict[str, StageStats] = {}
+        self._source_stats = StageStats(source_name, histograms)
+        self.skipped = 0  # captured items should_process turned away
+        self._stop = threading.Event()
+        self._source_thread = None
+
+    def add_stage(self, name: str, func: Callable, queue_size: int = 1, workers: int = 1) -> "Pipeline":
+        """Append a stage; `workers` > 1 runs that many threads on the same inbox."""
+        self._specs.append((name, func, queue_size, workers))
+        return self
+
+    def _set_latest(self, result):
+        self.latest = result
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def start(self) -> "Pipeline":
+        inboxes = [DropOldestQueue(size) for _, _, size, _ in self._specs]
+        for i, (name, func, _, workers) in enumerate(self._specs):
+            last = i == len(self._specs) - 1
+            self.stages.append(Stage(name, func, inboxes[i],
+                                     outbox=None if last else inboxes[i + 1],
+                                     sink=self._set_latest if last else None, on_error=self.on_error,
+                                     workers=workers, histogram=self.histograms,
+                                     on_done=self.drained.set if last else None))
+        for stage in self.stages:
+            stage.start()
+        if self.source is not None:
+            self._source_thread = threading.Thread(target=self._capture, name="stage-capture", daemon=True)
+            self._source_thread.start()
+        return self
+
+    def submit(self, item) -> None:
+        """Feed an item to the first stage directly (for pipelines without a source)."""
+        if self.stages:
+            self.stages[0].inbox.put(item)
+
+    def _capture(self):
+        stats = self._source_stats
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = self.source()
+            except Exception as e:
+                stats.record_error(e)
+                if self.on_error is not None:
+                    self.on_error(self.source_name, e)
+                item = None
+            if item is None:
+                break
+            stats.record(time.perf_counter() - start)
+            if self.keep_frames:
+                self.frames.put(item)
+            if self.on_frame is not None:
+                self.on_frame(item)
+            if self.stages and (self.should_process is None or self.should_process(item)):
+                self.stages[0].inbox.put(item)
+            else:
+                self.skipped += 1
+        self.frames.close()
+        self.finished.set()
+        # Stages finish what is queued and close down in turn; the last one sets `drained`
+        if self.stages:
+            self.stages[0].inbox.close()
+        else:
+            self.drained.set()
+
+    def record(self, name: str, seconds: float) -> None:
+        """Time work done outside the pipeline threads under stage `name`."""
+        stats = self._extra_stats.get(name)
+        if stats is None:
+            stats = self._extra_stats[name] = StageStats(name, self.histograms)
+        stats.record(seconds)
+
+    def stage_stats(self) -> List[Tuple[StageStats, Optional[DropOldestQueue]]]:
+        """(stats, inbox queue or None) of every stage, in pipeline order; the capture stage's queue is `frames`."""
+        result = []
+        if self.source is not None:
+            result.append((self._source_stats, self.frames))
+        result.extend((stage.stats, stage.inbox) for stage in self.stages)
+        result.extend((stats, None) for stats in list(self._extra_stats.values()))
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage snapshot, in pipeline order, including queue depth and dropped items."""
+        result = {}
+        for stats, queue in self.stage_stats():
+            result[stats.name] = stats.snapshot()
+            if queue is not None:
+                result[stats.name].update(queue=len(queue), dropped=queue.dropped)
+        return result
+
+    def format_stats(self) -> str:
+        parts = []
+        for name, s in self.stats().items():
+            part = f"{name}: {s['per_sec']:.1f}/s {s['avg_ms']:.0f}ms busy={s['busy']:.0%}"
+            if s["p95_ms"] is not None:
+                part += f" p95<={s['p95_ms']:.0f}ms"
+            if s.get("dropped"):
+                part += f" dropped={s['dropped']}"
+            if s["errors"]:
+                part += f" errors={s['errors']}"
+            parts.append(part)
+        return " | ".join(parts)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._source_thread is not None and self._source_thread is not threading.current_thread():
+            self._source_thread.join(timeout)
+        for stage in self.stages:
+            stage.stop(timeout)
+        self.frames.close()
@@ -0,0 +1,452 @@
+"""Detection, embedding and matching steps shared by the entry points."""
+import importlib.util
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+import embedding_models
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# deepface imports TensorFlow, which takes seconds: it is loaded on first use (see load_deepface)
+DeepFace = None
+
+MODEL_NAME = embedding_models.DEFAULT_MODEL
+DETECTOR_BACKEND = "opencv"  # Or 'retinaface' for better but slower
+ENROLL_SAMPLES = 5  # frames per enrollment template
+
+
+def deepface_available():
+    """True if deepface is installed, checked without importing it."""
+    return DeepFace is not None or importlib.util.find_spec("deepface") is not None
+
+
+def load_deepface():
+    """The DeepFace class, importing deepface (and TensorFlow) the first time it is needed."""
+    global DeepFace
+    if DeepFace is None:
+        from deepface import DeepFace as deepface_class  # type: ignore
+        DeepFace = deepface_class
+    return DeepFace
+
+
+def detection_view(frame, roi=None, detection_width=None):
+    """The part of `frame` the detector should scan: (image, scale, (x0, y0)).
+
+    `roi` is the door area as (x, y, w, h) fractions of the frame, e.g. the
+    turnstile; `detection_width` shrinks that area to at most this many
+    pixels wide. A box found at (x, y) in the image is at
+    (x / scale + x0, y / scale + y0) in the frame.
+    """
+    h, w = frame.shape[:2]
+    x0, y0, x1, y1 = 0, 0, w, h
+    if roi is not None:
+        rx, ry, rw, rh = roi
+        x0, y0 = int(rx * w), int(ry * h)
+        x1, y1 = min(w, int(round((rx + rw) * w))), min(h, int(round((ry + rh) * h)))
+    image = frame[y0:y1, x0:x1]
+    scale = 1.0
+    if detection_width and image.shape[1] > detection_width:
+        scale = detection_width / image.shape[1]
+        image = cv2.resize(image, (detection_width, max(1, int(round(image.shape[0] * scale)))),
+                           interpolation=cv2.INTER_AREA)
+    return image, scale, (x0, y0)
+
+
+def to_frame_area(area, scale, offset):
+    """Map a facial_area (box and eye points) from detection_view() coordinates back to the frame."""
+    x0, y0 = offset
+    mapped = dict(area, x=int(round(area["x"] / scale)) + x0, y=int(round(area["y"] / scale)) + y0,
+                  w=int(round(area["w"] / scale)), h=int(round(area["h"] / scale)))
+    for key in ("left_eye", "right_eye"):
+        if area.get(key) is not None:
+            mapped[key] = (int(round(area[key][0] / scale)) + x0, int(round(area[key][1] / scale)) + y0)
+    return mapped
+
+
+def _aligned_crop(frame, area):
+    # Full-resolution crop for a box found on a downscaled copy, levelled on the eyes the way
+    # deepface's align=True does (rotate by the eye angle, then cut the box)
+    x, y, w, h = (max(0, area[k]) for k in ("x", "y", "w", "h"))
+    left, right = area.get("left_eye"), area.get("right_eye")
+    if not left or not right:
+        return frame[y:y + h, x:x + w].copy()
+    angle = float(np.degrees(np.arctan2(left[1] - right[1], left[0] - right[0])))
+    # Rotate a window twice the box size around the box centre, so no pixels are cut off
+    cx, cy = x + w / 2, y + h / 2
+    wx0, wy0 = max(0, int(cx - w)), max(0, int(cy - h))
+    window = frame[wy0:int(cy + h), wx0:int(cx + w)]
+    rotation = cv2.getRotationMatrix2D((cx - wx0, cy - wy0), angle, 1.0)
+    window = cv2.warpAffine(window, rotation, (window.shape[1], window.shape[0]))
+    return window[y - wy0:y - wy0 + h, x - wx0:x - wx0 + w].copy()
+
+
+def detect_faces(frame, detector_backend=DETECTOR_BACKEND, min_confidence=0.5, roi=None, detection_width=None):
+    """Find and align faces in a BGR frame.
+
+    Returns [{"face": aligned BGR uint8 crop, "facial_area": {x, y, w, h, ...},
+    "confidence": float}], skipping detections below `min_confidence`.
+    The crop holds the same pixels represent() would feed the model.
+
+    With `roi` and/or `detection_width` (see detection_view) the detector
+    only scans the door area, shrunk; boxes are mapped back to frame
+    coordinates and the crops cut from the full-resolution frame, so the
+    model sees the same detail as before.
+    """
+    image, scale, offset = detection_view(frame, roi, detection_width)
+    # 'enforce_detection=False' avoids crashing when no face is present
+    extracted = load_deepface().extract_faces(img_path=image, detector_backend=detector_backend,
+                                              enforce_detection=False, align=scale == 1.0)
+    faces = []
+    for face in extracted:
+        if face.get("confidence", 0) < min_confidence:
+            continue
+        area = to_frame_area(face["facial_area"], scale, offset)
+        if scale == 1.0:
+            # extract_faces returns RGB floats in [0, 1]; represent() flips them back to BGR for the model
+            crop = (face["face"][:, :, ::-1] * 255).astype(np.uint8)
+        else:
+            crop = _aligned_crop(frame, area)
+        faces.append({"face": crop, "facial_area": area, "confidence": face["confidence"]})
+    return faces
+
+
+def _resize_with_padding(img, target_h, target_w):
+    # Same letterboxing as deepface's preprocessing.resize_image: keep aspect ratio, zero-pad
+    factor = min(target_h / img.shape[0], target_w / img.shape[1])
+    img = cv2.resize(img, (max(1, int(img.shape[1] * factor)), max(1, int(img.shape[0] * factor))))
+    diff_h = target_h - img.shape[0]
+    diff_w = target_w - img.shape[1]
+    img = np.pad(img, ((diff_h // 2, diff_h - diff_h // 2), (diff_w // 2, diff_w - diff_w // 2), (0, 0)),
+                 "constant")
+    if img.shape[:2] != (target_h, target_w):
+        img = cv2.resize(img, (target_w, target_h))
+    return img
+
+
+class FaceEmbedder:
+    """One loaded recognition model that embeds any number of face crops per forward pass.
+
+    DeepFace.represent() runs the model once per face; here crops from one or
+    many frames (or cameras) are stacked into a single batch. Preprocessing
+    mirrors represent(): the aligned crop in BGR channel order scaled to
+    [0, 1], letterboxed to the model input size. With an
+    embed_cache.EmbeddingCache in `cache`, near-identical crops skip the
+    forward pass.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, cache=None):
+        self.model_name = model_name
+        self.cache = cache
+        self.model = load_deepface().build_model(model_name)
+        if getattr(self.model, "input_shape", None):
+            # deepface clients report (width, height)
+            self.input_w, self.input_h = self.model.input_shape[:2]
+        else:
+            self.input_h, self.input_w = self.model.model.input_shape[1:3]
+        self._lock = threading.Lock()
+
+    def preprocess(self, crop):
+        img = crop.astype(np.float32) / 255.0
+        return _resize_with_padding(img, self.input_h, self.input_w)
+
+    def embed(self, crops, max_batch=32):
+        """(len(crops), dim) float32 embeddings for BGR uint8 face crops."""
+        if len(crops) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is not None:
+            return self.cache.embed(crops, lambda misses: self._forward(misses, max_batch))
+        return self._forward(crops, max_batch)
+
+    def _forward(self, crops, max_batch):
+        outputs = []
+        for start in range(0, len(crops), max_batch):
+            batch = np.stack([self.preprocess(crop) for crop in crops[start:start + max_batch]])
+            # Keras models are not guaranteed thread-safe; callers from several stages share one model
+            with self._lock:
+                keras_model = getattr(self.model, "model", None)
+                # Not every client wraps Keras: SFace's .model is OpenCV's FaceRecognizerSF
+                if hasattr(keras_model, "predict_on_batch"):
+                    out = np.asarray(keras_model(batch, training=False))
+                else:
+                    out = np.array([self.model.forward(img[np.newaxis]) for img in batch])
+            outputs.append(out.reshape(len(batch), -1).astype(np.float32))
+        return np.concatenate(outputs)
+
+
+class OpenCVEmbedder:
+    """FaceEmbedder counterpart for an "opencv" model in embedding_models: a local ONNX file run by cv2.dnn.
+
+    Needs neither deepface nor TensorFlow. Crops are resized straight to the
+    model input, as OpenCV's FaceRecognizerSF does with its aligned faces.
+    """
+
+    def __init__(self, model_name, cache=None):
+        info = embedding_models.model_info(model_name)
+        if not os.path.exists(info["path"]):
+            raise FileNotFoundError(f"Model file for {model_name} not found at {info['path']} "
+                                    "(see embedding_models.py for where to get it)")
+        self.model_name = model_name
+        self.cache = cache
+        self.net = cv2.dnn.readNet(info["path"])
+        self.input_w, self.input_h = info["input_size"]
+        self.scale, self.mean, self.swap_rb = info["scale"], info["mean"], info["swap_rb"]
+        self.max_batch = info.get("max_batch")
+        self._lock = threading.Lock()
+
+    def embed(self, crops, max_batch=32):
+        """(len(crops), dim) float32 embeddings for BGR uint8 face crops."""
+        if len(crops) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is not None:
+            return self.cache.embed(crops, lambda misses: self._forward(misses, max_batch))
+        return self._forward(crops, max_batch)
+
+    def _forward(self, crops, max_batch):
+        max_batch = min(max_batch, self.max_batch or max_batch)
+        outputs = []
+        for start in range(0, len(crops), max_batch):
+            batch = crops[start:start + max_batch]
+            blob = cv2.dnn.blobFromImages(batch, self.scale, (self.input_w, self.input_h), self.mean,
+                                          self.swap_rb, False)
+            # A cv2.dnn.Net holds its input between setInput and forward
+            with self._lock:
+                self.net.setInput(blob)
+                out = self.net.forward()
+            outputs.append(out.reshape(len(batch), -1).astype(np.float32))
+        return np.concatenate(outputs)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name=MODEL_NAME):
+    """Process-wide shared embedder for `model_name`, so every stage and camera uses one copy of the model.
+
+    A FaceEmbedder for deepface models, an OpenCVEmbedder for local cv2.dnn ones (see embedding_models).
+    """
+    with _embedders_lock:
+        if model_name not in _embedders:
+            backend = embedding_models.model_info(model_name)["backend"]
+            _embedders[model_name] = (OpenCVEmbedder if backend == "opencv" else FaceEmbedder)(model_name)
+        return _embedders[model_name]
+
+
+def embed_faces(faces, model_name=MODEL_NAME):
+    """Embeddings for detected face crops in one batched forward pass (detection already ran)."""
+    return get_embedder(model_name).embed([face["face"] for face in faces])
+
+
+def analyze_frame(frame, model_name=MODEL_NAME, min_confidence=0.5, roi=None, detection_width=None):
+    """Detect and embed every face in a frame: [{"facial_area", "confidence", "embedding"}].
+
+    Self-contained so it can run in inference_pool worker processes.
+    """
+    faces = detect_faces(frame, min_confidence=min_confidence, roi=roi, detection_width=detection_width)
+    embeddings = embed_faces(faces, model_name)
+    return [{"facial_area": face["facial_area"], "confidence": face["confidence"], "embedding": embedding}
+            for face, embedding in zip(faces, embeddings)]
+
+
+def warm_up(model_name=MODEL_NAME, detector_backend=DETECTOR_BACKEND):
+    """Import deepface, build the detector and model and run one dummy inference through each,
+    so the first real face does not pay for any of it."""
+    detect_faces(np.zeros((120, 120, 3), dtype=np.uint8), detector_backend)
+    # Straight to the model: a cached blank crop would not warm anything up
+    get_embedder(model_name)._forward([np.zeros((64, 64, 3), dtype=np.uint8)], max_batch=1)
+
+
+def start_warm_up(model_name=MODEL_NAME, detector_backend=DETECTOR_BACKEND):
+    """Run warm_up() on a background thread; the returned Future resolves to the seconds it took.
+
+    Lets the gallery load and the camera open while TensorFlow initializes.
+    """
+    future = Future()
+
+    def run():
+        start = time.perf_counter()
+        try:
+            warm_up(model_name, detector_backend)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(time.perf_counter() - start)
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+    return future
+
+
+def largest_face(faces):
+    """The biggest detected face, i.e. the person standing closest to the camera (None if no faces)."""
+    return max(faces, key=lambda f: f["facial_area"]["w"] * f["facial_area"]["h"], default=None)
+
+
+def capture_enrollment_samples(cap, n_samples=ENROLL_SAMPLES, interval=0.3, max_frames=100,
+                               min_confidence=0.5, model_name=MODEL_NAME):
+    """Embeddings of `n_samples` frames read from `cap`, at least `interval` seconds apart.
+
+    Frames without a confident face are skipped; gives up after `max_frames`
+    reads. Returns a (samples, dim) array that may hold fewer rows (or none).
+    The small pose and lighting changes between frames are what make a
+    multi-sample template robust at the door.
+    """
+    crops, last = [], 0.0
+    for _ in range(max_frames):
+        if len(crops) >= n_samples:
+            break
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if time.monotonic() - last < interval:
+            continue
+        face = largest_face(detect_faces(frame, min_confidence=min_confidence))
+        if face is not None:
+            crops.append(face["face"])
+            last = time.monotonic()
+    if not crops:
+        return np.zeros((0, 0), dtype=np.float32)
+    return get_embedder(model_name).embed(crops)
+
+
+def match_faces(faces, embeddings, matcher, threshold, unknown_name="Guest / Unknown"):
+    """Access decisions for detected faces, scoring all of them against the gallery in one pass."""
+    matches = matcher.best_matches(embeddings) if len(embeddings) else []
+    results = []
+    for face, (best_match, similarity) in zip(faces, matches):
+        granted = similarity >= threshold
+        results.append({
+            "name": best_match if granted else unknown_name,
+            "similarity": similarity,
+            "region": face["facial_area"],  # x, y, w, h
+            "granted": granted
+        })
+    return results
+
+
+def faces_to_embed(faces):
+    """Faces the tracker flagged for a fresh embedding (all faces when untracked)."""
+    return [face for face in faces if face.get("needs_embedding", True)]
+
+
+def decide_faces(faces, embeddings, matcher, threshold, unknown_name="Guest / Unknown", tracker=None):
+    """Decisions for every face in `faces`, given embeddings for faces_to_embed(faces) only.
+
+    Fresh decisions are stored on their track; the remaining faces reuse the
+    track's last decision, so a person standing at the door is embedded once
+    per refresh interval instead of once per processed frame.
+    """
+    fresh = faces_to_embed(faces)
+    fresh_results = match_faces(fresh, embeddings, matcher, threshold, unknown_name)
+    if tracker is None:
+        return fresh_results
+    for face, result in zip(fresh, fresh_results):
+        result["track_id"] = face["track_id"]
+        tracker.record(face["track_id"], result)
+
+    fresh_iter = iter(fresh_results)
+    results = []
+    for face in faces:
+        if face.get("needs_embedding", True):
+            results.append(next(fresh_iter))
+        else:
+            cached = tracker.cached_result(face)
+            if cached is not None:
+                results.append(cached)
+    return results
+
+
+def draw_results(frame, results, denied_label="Access Denied", banner_origin=(10, 50), banner_scale=1.2,
+                 scale=1.0):
+    """Draw boxes, labels and the ACCESS GRANTED banner onto `frame` in place.
+
+    `scale` maps result regions onto a resized copy of the frame they were found in.
+    """
+    for res in results:
+        r = res["region"]
+        if scale != 1.0:
+            r = {k: int(r[k] * scale) for k in ("x", "y", "w", "h")}
+        color = (0, 255, 0) if res["granted"] else (0, 0, 255)
+        label = f"{res['name']} ({res['similarity']:.2f})" if res["granted"] else denied_label
+
+        cv2.rectangle(frame, (r['x'], r['y']), (r['x'] + r['w'], r['y'] + r['h']), color, 2)
+        cv2.putText(frame, label, (r['x'], r['y'] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+        if res["granted"]:
+            cv2.putText(frame, "ACCESS GRANTED", banner_origin,
+                        cv2.FONT_HERSHEY_SIMPLEX, banner_scale, (0, 255, 0), 3)
+
+
+def camera_source(cap, mirror=False):
+    """Pipeline source reading `cap`; each call returns a frame job dict, or None when the stream ends."""
+    frame_ids = itertools.count()
+
+    def read():
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        if mirror:
+            frame = cv2.flip(frame, 1)
+        return {"frame_id": next(frame_ids), "captured_at": time.time(), "frame": frame}
+
+    return read
+
+
+def add_recognition_stages(pipeline, get_matcher, threshold, model_name=MODEL_NAME,
+                           min_confidence=0.5, unknown_name="Guest / Unknown", pool=None, tracker=None,
+                           roi=None, detection_width=None):
+    """Append detect -> embed -> match stages to `pipeline`.
+
+    Each stage adds its output to the frame job dict ("faces", "embeddings",
+    "results"). `get_matcher` is called per frame so a live-updated gallery
+    is picked up without restarting the pipeline. With a tracker.FaceTracker,
+    only new or changed faces are embedded and the rest reuse their track's
+    decision. With an inference_pool.InferencePool, detection and embedding
+    run in its worker processes instead, with one in-flight frame per worker
+    (the tracker is not used there since workers always embed). `roi` and
+    `detection_width` limit what the detector scans (see detect_faces); a
+    pool applies its own analyze settings.
+    """
+    def detect(job):
+        job["faces"] = detect_faces(job["frame"], min_confidence=min_confidence, roi=roi,
+                                    detection_width=detection_width)
+        if tracker is not None:
+            tracker.assign(job["faces"], job["captured_at"])
+        return job
+
+    def embed(job):
+        job["embeddings"] = embed_faces(faces_to_embed(job["faces"]), model_name)
+        return job
+
+    def infer(job):
+        job["faces"] = pool.infer(job["frame"], job["frame_id"])
+        job["embeddings"] = [face["embedding"] for face in job["faces"]]
+        return job
+
+    last_frame_id = -1
+
+    def match(job):
+        nonlocal last_frame_id
+        # Parallel inference can finish frames slightly out of order; never go back in time
+        if job["frame_id"] < last_frame_id:
+            return None
+        last_frame_id = job["frame_id"]
+        job["results"] = decide_faces(job["faces"], job["embeddings"], get_matcher(), threshold, unknown_name,
+                                      tracker if pool is None else None)
+        job["completed_at"] = time.time()
+        return job
+
+    if pool is not None:
+        pipeline.add_stage("infer", infer, queue_size=pool.workers, workers=pool.workers)
+    else:
+        pipeline.add_stage("detect", detect).add_stage("embed", embed)
+    return pipeline.add_stage("match", match)
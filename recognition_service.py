@@ -0,0 +1,373 @@
+"""Local recognition service: POST a frame, get access decisions back.
+
+For turnstile controllers and check-in kiosks that have their own camera.
+An asyncio HTTP server (TCP or Unix socket) decodes and detects each
+request on a thread pool. The face crops of all requests arriving within
+`batch_window` seconds of each other are then embedded in one forward pass
+and matched against the gallery in one search (MicroBatcher).
+
+    python recognition_service.py --listen 127.0.0.1:8088
+    python recognition_service.py --listen unix:/run/entry-recognize.sock
+
+    curl --data-binary @face.jpg -H "Content-Type: image/jpeg" "http://127.0.0.1:8088/recognize?door=kiosk1"
+    curl --data-binary @frame.bgr "http://127.0.0.1:8088/recognize?width=640&height=480"   # raw BGR bytes
+
+Requests beyond `max_pending` in flight get 503 at once. Requests not
+answered within `request_timeout` seconds get 504. GET /health reports
+the gallery and queue state, and GET /metrics the Prometheus metrics
+(see metrics.py). One request per connection.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+import database
+import embedding_models
+import recognition
+from access_log import AccessLogWriter
+from events import decision_event
+from gallery_cache import GalleryCache
+from metrics import FACE_BUCKETS, Metrics
+
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+THRESHOLD = embedding_models.threshold_for(recognition.MODEL_NAME)
+BATCH_WINDOW = 0.005  # seconds to wait for more requests after the first one arrives
+MAX_BATCH_FACES = 32
+MAX_PENDING = 64  # requests in flight before new ones are turned away with 503
+REQUEST_TIMEOUT = 2.0
+MAX_BODY_BYTES = 16 * 1024 * 1024
+# Below the default buckets: the batch window itself is a few milliseconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.0)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def decode_frame(body: bytes, content_type: str = "", width: Optional[int] = None,
+                 height: Optional[int] = None) -> np.ndarray:
+    """BGR frame from an encoded image (JPEG, PNG, ...) or, with width and height, raw BGR bytes."""
+    if width and height:
+        if len(body) != width * height * 3:
+            raise RequestError(400, f"Raw frame is {len(body)} bytes, expected {width}x{height}x3")
+        return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+    if cv2 is None:
+        raise RequestError(400, "Encoded images need OpenCV; send raw BGR with width and height")
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise RequestError(400, f"Could not decode the request body as an image ({content_type or 'no type'})")
+    return frame
+
+
+class MicroBatcher:
+    """Collects work items from concurrent coroutines and runs them through `process` together.
+
+    The first item starts a batch; items arriving within `window` seconds
+    join it, up to `max_size` in total (counted with `size`). `process(items)`
+    runs on `executor` and returns one result per item. One batch runs at a
+    time, and items arriving meanwhile form the next one.
+    """
+
+    def __init__(self, process: Callable[[list], list], window: float = BATCH_WINDOW,
+                 max_size: int = MAX_BATCH_FACES, size: Callable = len, executor=None,
+                 on_batch: Optional[Callable[[int, float], None]] = None):
+        self.process = process
+        self.window = window
+        self.max_size = max_size
+        self.size = size
+        self.executor = executor
+        self.on_batch = on_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._task = None
+
+    def start(self) -> "MicroBatcher":
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def submit(self, items: list) -> list:
+        """Results for `items`, processed in a batch with whatever else arrives alongside."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = self.size(batch[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_size:
+                timeout = deadline - loop.time()
+                try:
+                    entry = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(entry)
+                size += self.size(entry[0])
+            # Requests that timed out while queued are not worth a forward pass
+            batch = [(items, future) for items, future in batch if not future.done()]
+            if not batch:
+                continue
+            flat = [item for items, _ in batch for item in items]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.process, flat)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(flat)
+            if self.on_batch is not None:
+                self.on_batch(len(flat), time.perf_counter() - start)
+            offset = 0
+            for items, future in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class RecognitionService:
+    """Decodes, detects, micro-batches embedding + matching, and answers over HTTP.
+
+    `get_matcher()` returns the current gallery matcher (e.g. a GalleryCache's).
+    `detect(frame)` returns recognition.detect_faces()-style faces.
+    `embed(crops)` returns their embeddings. Both default to the deepface
+    model, and the benchmarks plug in stubs.
+    """
+
+    def __init__(self, get_matcher: Callable, threshold: float = THRESHOLD, detect: Optional[Callable] = None,
+                 embed: Optional[Callable] = None, batch_window: float = BATCH_WINDOW,
+                 max_batch_faces: int = MAX_BATCH_FACES, max_pending: int = MAX_PENDING,
+                 request_timeout: float = REQUEST_TIMEOUT, workers: int = 4, access_log=None,
+                 metrics: Optional[Metrics] = None, unknown_name: str = "Guest / Unknown"):
+        self.get_matcher = get_matcher
+        self.threshold = threshold
+        self.detect = detect or recognition.detect_faces
+        self.embed = embed or (lambda crops: recognition.get_embedder().embed(crops, max_batch=max_batch_faces))
+        self.batch_window = batch_window
+        self.max_batch_faces = max_batch_faces
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.access_log = access_log
+        self.metrics = metrics or Metrics()
+        self.unknown_name = unknown_name
+        self.in_flight = 0
+        # Decoding and detection for `workers` requests at a time; batches get their own thread
+        # so a queue of detections never delays a forward pass
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="recognize")
+        self._model_executor = ThreadPoolExecutor(1, thread_name_prefix="recognize-batch")
+        self.batcher = None
+        self._server = None
+
+    def _decide(self, faces: List[dict]) -> List[dict]:
+        # Runs on the executor for a whole batch: one forward pass, one gallery search
+        embeddings = self.embed([face["face"] for face in faces])
+        return recognition.match_faces(faces, embeddings, self.get_matcher(), self.threshold, self.unknown_name)
+
+    def _on_batch(self, faces: int, seconds: float):
+        self.metrics.observe("batch_faces", faces, buckets=FACE_BUCKETS)
+        self.metrics.observe("batch_seconds", seconds)
+
+    async def start(self, listen: str = "127.0.0.1:8088") -> "RecognitionService":
+        """Listen on "HOST:PORT" or "unix:/path.sock"."""
+        self.batcher = MicroBatcher(self._decide, self.batch_window, self.max_batch_faces,
+                                    executor=self._model_executor, on_batch=self._on_batch).start()
+        if listen.startswith("unix:"):
+            self._server = await asyncio.start_unix_server(self._handle, path=listen[len("unix:"):])
+        else:
+            host, _, port = listen.rpartition(":")
+            self._server = await asyncio.start_server(self._handle, host or "127.0.0.1", int(port))
+        return self
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()
+
+    async def recognize(self, frame: np.ndarray, door: Optional[str] = None) -> dict:
+        start = time.time()
+        loop = asyncio.get_running_loop()
+        faces = await loop.run_in_executor(self.executor, self.detect, frame)
+        results = await self.batcher.submit(faces) if faces else []
+        job = {"captured_at": start, "completed_at": time.time()}
+        events = [decision_event(result, job, door) for result in results]
+        if self.access_log is not None:
+            for event in events:
+                self.access_log.emit(event)
+        self.metrics.observe("faces_per_frame", len(faces), buckets=FACE_BUCKETS)
+        for result in results:
+            self.metrics.inc("decisions_total", outcome="granted" if result["granted"] else "denied")
+        return {"faces": [{k: event[k] for k in ("name", "granted", "similarity", "region")} for event in events],
+                "latency_ms": round(1000 * (job["completed_at"] - start), 1)}
+
+    def health(self) -> dict:
+        return {"status": "ok", "members": len(self.get_matcher()), "in_flight": self.in_flight,
+                "batches": self.batcher.batches,
+                "faces_per_batch": round(self.batcher.items / self.batcher.batches, 2) if self.batcher.batches else 0.0}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        self.in_flight += 1
+        try:
+            status, content_type, body = await asyncio.wait_for(self._respond(reader), self.request_timeout)
+        except RequestError as e:
+            status, content_type, body = e.status, "application/json", json.dumps({"error": str(e)})
+        except asyncio.TimeoutError:
+            status, content_type, body = 504, "application/json", json.dumps({"error": "Request timed out"})
+        except Exception as e:
+            status, content_type, body = 500, "application/json", json.dumps({"error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.in_flight -= 1
+        self.metrics.inc("requests_total", status=str(status))
+        self.metrics.observe("request_seconds", time.perf_counter() - start, buckets=REQUEST_BUCKETS)
+        payload = body.encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("latin-1") + payload)
+            await writer.drain()
+            writer.close()
+        except ConnectionError:
+            pass
+
+    async def _respond(self, reader: asyncio.StreamReader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            raise RequestError(400, "Malformed request line")
+        method, target = request_line[0].upper(), request_line[1]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        path, _, query = target.partition("?")
+        params = dict(urllib.parse.parse_qsl(query))
+
+        if path == "/health" and method == "GET":
+            return 200, "application/json", json.dumps(self.health())
+        if path == "/metrics" and method == "GET":
+            return 200, "text/plain; version=0.0.4; charset=utf-8", self.metrics.render()
+        if path != "/recognize":
+            raise RequestError(404, f"No such endpoint {path!r}")
+        if method != "POST":
+            raise RequestError(405, "Use POST with the frame as the request body")
+        length = int(headers.get("content-length") or 0)
+        if not length:
+            raise RequestError(400, "Empty request body")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        # Read the body even when shedding load: closing on unread data resets the client's connection
+        body = await reader.readexactly(length)
+        if self.in_flight > self.max_pending:
+            raise RequestError(503, "Too many requests in flight")
+        try:
+            width, height = int(params.get("width", 0)), int(params.get("height", 0))
+        except ValueError:
+            raise RequestError(400, "width and height must be integers")
+        frame = await asyncio.get_running_loop().run_in_executor(
+            self.executor, decode_frame, body, headers.get("content-type", ""), width, height)
+        return 200, "application/json", json.dumps(await self.recognize(frame, params.get("door")))
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.batcher is not None:
+            await self.batcher.close()
+        self.executor.shutdown(wait=False)
+        self._model_executor.shutdown(wait=False)
+
+
+async def run(args):
+    # Model build and warm-up overlap the gallery load
+    warm_up = recognition.start_warm_up(args.model)
+    database.init_db()
+    gallery = GalleryCache(verify_threshold=args.threshold, model_name=args.model, snapshot=not args.no_snapshot)
+    gallery.start()
+    await asyncio.wrap_future(warm_up)
+    access_log = AccessLogWriter().start()
+    embedder = recognition.get_embedder(args.model)
+    service = RecognitionService(
+        lambda: gallery.matcher, args.threshold,
+        detect=functools.partial(recognition.detect_faces, min_confidence=args.min_confidence),
+        embed=functools.partial(embedder.embed, max_batch=args.max_batch),
+        batch_window=args.batch_window / 1000, max_batch_faces=args.max_batch, max_pending=args.max_pending,
+        request_timeout=args.timeout, workers=args.workers, access_log=access_log)
+    await service.start(args.listen)
+    print(f"Recognition service on {args.listen}, {len(gallery)} members. Ctrl+C to stop.", file=sys.stderr)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+        gallery.stop()
+        access_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local recognition service with request micro-batching.")
+    parser.add_argument("--listen", default="127.0.0.1:8088", help="HOST:PORT or unix:/path.sock")
+    parser.add_argument("--model", default=recognition.MODEL_NAME, choices=list(embedding_models.MODELS),
+                        help="embedding model; only members embedded with it are loaded")
+    parser.add_argument("--threshold", type=float, default=None, help="default: the model's threshold")
+    parser.add_argument("--min-confidence", type=float, default=0.5)
+    parser.add_argument("--batch-window", type=float, default=1000 * BATCH_WINDOW,
+                        help="milliseconds to wait for concurrent requests to batch with (0: no waiting)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_FACES, help="faces per forward pass")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING,
+                        help="requests in flight before new ones get 503")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="seconds before a request gets 504")
+    parser.add_argument("--workers", type=int, default=4, help="threads decoding and detecting requests")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="load a private copy of the gallery instead of mapping the shared snapshot file")
+    args = parser.parse_args()
+    if args.threshold is None:
+        args.threshold = embedding_models.threshold_for(args.model)
+
+    if not recognition.deepface_available():
+        print("Error: deepface is not installed. Install with: pip install deepface")
+        return
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
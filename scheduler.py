@@ -0,0 +1,130 @@
+"""Decides which captured frames are worth running recognition on."""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Optional heavy dependencies: import if available, otherwise handle gracefully
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+
+class AdaptiveScheduler:
+    """Replaces a fixed "every Nth frame" rule with one driven by motion and measured cost.
+
+    Every captured frame is shrunk to a small grayscale thumbnail and diffed
+    against the previous one (well under a millisecond). Recognition then runs:
+
+    - every `min_interval` seconds while there is motion (and for `hold`
+      seconds after it stops) or a face in view is not yet granted,
+    - every `present_interval` seconds while only granted members are in view,
+    - every `idle_interval` seconds on an empty, still scene,
+
+    but never more often than the CPU budget allows. `cpu_budget` is the
+    fraction of one core recognition may use: with inference measured at
+    200 ms and a budget of 0.5, at most one frame per 400 ms is processed.
+
+    Use should_process as the pipeline's should_process and feed finished
+    jobs back through observe() so latency and face state are tracked.
+    """
+
+    def __init__(self, cpu_budget: float = 0.5, min_interval: float = 0.05, present_interval: float = 0.5,
+                 idle_interval: float = 2.0, hold: float = 1.0, motion_threshold: float = 0.01,
+                 pixel_delta: int = 25, thumb_width: int = 80):
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.present_interval = present_interval
+        self.idle_interval = idle_interval
+        self.hold = hold
+        self.motion_threshold = motion_threshold
+        self.pixel_delta = pixel_delta
+        self.thumb_width = thumb_width
+        self.frames = 0
+        self.processed = 0
+        self.motion = 0.0
+        self.cost = 0.0  # smoothed seconds per recognised frame
+        self.state = "idle"
+        self._faces = 0
+        self._unresolved = False
+        self._prev = None
+        self._last_motion = float("-inf")
+        self._last_run = float("-inf")
+        self._lock = threading.Lock()
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        if cv2 is not None:
+            small = cv2.resize(frame, (self.thumb_width, max(1, h * self.thumb_width // w)),
+                               interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        step = max(1, w // self.thumb_width)
+        small = frame[::step, ::step]
+        return (small.mean(axis=2) if small.ndim == 3 else small).astype(np.uint8)
+
+    def measure_motion(self, frame) -> float:
+        """Fraction of thumbnail pixels that changed by more than `pixel_delta` since the last frame."""
+        small = self._thumbnail(frame)
+        prev, self._prev = self._prev, small
+        if prev is None or prev.shape != small.shape:
+            return 1.0
+        diff = np.abs(small.astype(np.int16) - prev)
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def _interval(self, now: float) -> float:
+        if self._unresolved or now - self._last_motion <= self.hold:
+            self.state, interval = "active", self.min_interval
+        elif self._faces:
+            self.state, interval = "present", self.present_interval
+        else:
+            self.state, interval = "idle", self.idle_interval
+        budget = self.cost / self.cpu_budget if self.cpu_budget > 0 else 0.0
+        return max(interval, budget)
+
+    def current_interval(self) -> float:
+        """Seconds between processed frames in the current state (at least the CPU budget allows)."""
+        with self._lock:
+            return self._interval(time.time())
+
+    def should_process(self, job: Dict[str, Any]) -> bool:
+        now = job.get("captured_at") or time.time()
+        motion = self.measure_motion(job["frame"])
+        with self._lock:
+            self.frames += 1
+            self.motion = motion
+            if motion >= self.motion_threshold:
+                self._last_motion = now
+            if now - self._last_run < self._interval(now):
+                return False
+            self._last_run = now
+            self.processed += 1
+            return True
+
+    def observe(self, job: Dict[str, Any], seconds: Optional[float] = None) -> None:
+        """Record a finished job: its results and how long recognition took (default: since capture)."""
+        if seconds is None:
+            seconds = job.get("completed_at", time.time()) - job["captured_at"]
+        results = job.get("results", [])
+        with self._lock:
+            self.cost = seconds if self.cost == 0.0 else 0.8 * self.cost + 0.2 * seconds
+            self._faces = len(results)
+            self._unresolved = any(not res["granted"] for res in results)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "frames": self.frames,
+                "processed": self.processed,
+                "ratio": self.processed / self.frames if self.frames else 0.0,
+                "motion": self.motion,
+                "cost_ms": 1000 * self.cost,
+                "interval_ms": 1000 * self._interval(time.time()),
+            }
+
+    def format_stats(self) -> str:
+        s = self.snapshot()
+        return (f"scheduler: {s['state']}, processed {s['processed']}/{s['frames']} frames ({s['ratio']:.0%}), "
+                f"recognition {s['cost_ms']:.0f}ms, interval {s['interval_ms']:.0f}ms")
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A scratch members.db in a temporary directory (snapshots and indexes land next to it)."""
+    path = str(tmp_path / "members.db")
+    monkeypatch.setattr(database, "DB_NAME", path)
+    yield path
+    database.close_connection()
+
+
+@pytest.fixture
+def vectors():
+    """Random unit-free embeddings: vectors(n, dim=64) -> (n, dim) float32."""
+    rng = np.random.default_rng(0)
+    return lambda n, dim=64: rng.normal(size=(n, dim)).astype(np.float32)
@@ -0,0 +1,41 @@
+import database
+from access_log import DROP_NEWEST, AccessLogWriter
+
+
+def event(name, time, granted=True, door="front"):
+    return {"time": time, "door": door, "name": name, "granted": granted, "similarity": 0.9}
+
+
+def test_repeated_grants_are_deduplicated_per_door(db):
+    writer = AccessLogWriter(dedup_window=30.0)
+    assert writer.emit(event("alice", 1000.0))
+    assert not writer.emit(event("alice", 1010.0))
+    assert writer.emit(event("alice", 1010.0, door="back"))
+    assert writer.emit(event("alice", 1031.0))
+    # denials are always logged
+    assert writer.emit(event("Unknown", 1000.0, granted=False))
+    assert writer.emit(event("Unknown", 1001.0, granted=False))
+    writer.close()
+    assert writer.deduped == 1
+    assert len(database.get_access_events()) == 5
+
+
+def test_events_are_written_in_batches(db):
+    writer = AccessLogWriter(batch_size=10, flush_interval=60.0, dedup_window=0.0).start()
+    for i in range(25):
+        writer.emit(event(f"member{i}", 1000.0 + i))
+    writer.flush(timeout=5.0)
+    writer.close()
+    assert writer.written == 25
+    assert writer.batches == 3
+    assert [e["name"] for e in database.get_access_events(limit=2)] == ["member24", "member23"]
+
+
+def test_full_queue_drops_by_policy(db):
+    writer = AccessLogWriter(max_pending=2, policy=DROP_NEWEST, dedup_window=0.0)
+    assert writer.emit(event("a", 1.0))
+    assert writer.emit(event("b", 2.0))
+    assert not writer.emit(event("c", 3.0))
+    writer.close()
+    assert writer.dropped == 1
+    assert sorted(e["name"] for e in database.get_access_events()) == ["a", "b"]
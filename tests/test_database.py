@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+import numpy as np
+
+import database
+
+# members table as created before embeddings were stored as BLOBs
+JSON_MEMBERS_SQL = '''
+    CREATE TABLE members (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        embedding TEXT NOT NULL,
+        membership_type TEXT DEFAULT 'Premium',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def make_json_db(path, members):
+    conn = sqlite3.connect(path)
+    conn.execute(JSON_MEMBERS_SQL)
+    conn.executemany('INSERT INTO members (name, embedding, membership_type) VALUES (?, ?, ?)',
+                     [(name, json.dumps([float(x) for x in embedding]), membership_type)
+                      for name, embedding, membership_type in members])
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_json_embeddings_to_blobs(db, vectors):
+    embeddings = vectors(3, 16)
+    make_json_db(db, [("alice", embeddings[0], "Premium"), ("bob", embeddings[1], "Basic"),
+                      ("carol", embeddings[2], "Premium")])
+
+    database.init_db()
+
+    conn = sqlite3.connect(db)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == database.SCHEMA_VERSION
+    rows = conn.execute('SELECT name, typeof(embedding), embedding_dim, embedding_model, membership_type '
+                        'FROM members ORDER BY id').fetchall()
+    conn.close()
+    assert rows == [("alice", "blob", 16, database.DEFAULT_MODEL, "Premium"),
+                    ("bob", "blob", 16, database.DEFAULT_MODEL, "Basic"),
+                    ("carol", "blob", 16, database.DEFAULT_MODEL, "Premium")]
+
+    ids, names, matrix = database.load_embedding_matrix(database.DEFAULT_MODEL)
+    assert names == ["alice", "bob", "carol"]
+    np.testing.assert_allclose(matrix, embeddings, rtol=1e-6)
+
+
+def test_migrated_database_records_changes(db, vectors):
+    make_json_db(db, [("alice", vectors(1, 16)[0], "Premium")])
+    database.init_db()
+    # Rows carried over by the migration are not changes; the triggers only see later writes
+    assert database.get_change_seq() == 0
+
+    member_id = database.add_member("bob", vectors(1, 16)[0])
+    database.upsert_members([("bob", vectors(1, 16)[0])])
+    database.delete_members(["bob"])
+
+    ops = [(member, op) for _, member, op in database.get_changes_since(0)]
+    assert ops == [(member_id, "insert"), (member_id, "update"), (member_id, "delete")]
+    assert database.get_changes_since(database.get_change_seq()) == []
+
+
+def test_init_db_is_idempotent(db, vectors):
+    database.add_member("alice", vectors(1, 16)[0])
+    database.close_connection()
+    database.init_db()
+    assert [m["name"] for m in database.list_members()] == ["alice"]
+
+
+def test_upsert_counts_inserts_and_updates(db, vectors):
+    a, b, c = vectors(3, 16)
+    # a name given twice is stored once, with its last embedding
+    assert database.upsert_members([("alice", b), ("alice", a), ("bob", b)]) == (2, 0)
+    assert database.upsert_members([("alice", c), ("alice", a), ("carol", c)]) == (1, 1)
+
+    _, names, matrix = database.load_embedding_matrix(database.DEFAULT_MODEL)
+    assert sorted(names) == ["alice", "bob", "carol"]
+    np.testing.assert_allclose(matrix[names.index("alice")], a, rtol=1e-6)
+
+
+def test_upsert_leaves_other_models_alone(db, vectors):
+    a, b = vectors(2, 16)
+    database.add_member("alice", a, model_name="Facenet")
+    assert database.upsert_members([("alice", b)]) == (1, 0)
+    _, _, matrix = database.load_embedding_matrix("Facenet")
+    np.testing.assert_allclose(matrix[0], a, rtol=1e-6)
+
+
+def test_multi_sample_member_stores_centroid_and_samples(db, vectors):
+    samples = vectors(4, 16)
+    member_id = database.add_member("alice", samples)
+    _, _, matrix = database.load_embedding_matrix(database.DEFAULT_MODEL)
+    np.testing.assert_allclose(matrix[0], database.template_centroid(samples), rtol=1e-5)
+    assert database.load_samples([member_id])[member_id].shape == (4, 16)
+
+    # upserting a single embedding drops the old samples
+    database.upsert_members([("alice", samples[0])])
+    assert database.load_samples([member_id]) == {}
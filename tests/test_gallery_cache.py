@@ -0,0 +1,82 @@
+import numpy as np
+
+import database
+from compact_gallery import CompactMatcher
+from gallery_cache import GalleryCache
+
+from test_database import make_json_db
+
+
+def test_sync_after_migrating_json_database(db, vectors):
+    embeddings = vectors(3, 16)
+    make_json_db(db, [("alice", embeddings[0], "Premium"), ("bob", embeddings[1], "Premium")])
+
+    cache = GalleryCache(model_name=database.DEFAULT_MODEL)
+    assert cache.load() == 2
+    assert cache.sync() is False
+
+    database.add_member("carol", embeddings[2])
+    assert cache.sync() is True
+    assert cache.matcher.best_matches(embeddings[2])[0][0] == "carol"
+
+    database.delete_members(["alice"])
+    assert cache.sync() is True
+    assert len(cache) == 2
+    assert "alice" not in set(cache.matcher.names)
+    assert cache.sync() is False
+
+
+def test_sync_applies_updates_in_place(db, vectors):
+    a, b = vectors(2, 16)
+    database.add_member("alice", a)
+    cache = GalleryCache(model_name=database.DEFAULT_MODEL)
+    cache.load()
+
+    database.upsert_members([("alice", b)])
+    assert cache.sync() is True
+    assert len(cache) == 1
+    name, similarity = cache.matcher.best_matches(b)[0]
+    assert name == "alice" and similarity > 0.99
+
+
+def test_sync_reports_changes(db, vectors):
+    seen = []
+    cache = GalleryCache(model_name=database.DEFAULT_MODEL,
+                         on_change=lambda cache, upserted, removed: seen.append((upserted, removed)))
+    cache.load()
+    database.add_members([("alice", vectors(1, 16)[0]), ("bob", vectors(1, 16)[0])])
+    cache.sync()
+    database.delete_members(["bob"])
+    cache.sync()
+    assert seen == [(2, 0), (0, 1)]
+
+
+def test_snapshot_defers_adds_but_not_deletes(db, vectors):
+    a, b = vectors(2, 16)
+    database.add_member("alice", a)
+    cache = GalleryCache(model_name=database.DEFAULT_MODEL, snapshot=True, snapshot_interval=3600.0)
+    assert cache.load() == 1
+
+    # a fresh snapshot is kept for the interval, so the new member waits for the next export
+    database.add_member("bob", b)
+    assert cache.sync() is False
+    assert len(cache) == 1
+
+    database.delete_members(["alice"])
+    assert cache.sync() is True
+    assert list(cache.matcher.names) == ["bob"]
+
+
+def test_pca_gallery_fits_basis_once_members_arrive(db, vectors):
+    cache = GalleryCache(model_name=database.DEFAULT_MODEL, compact="pca", pca_dim=8)
+    assert cache.load() == 0
+    assert isinstance(cache.matcher, CompactMatcher)
+    assert cache.matcher.needs_refit
+
+    embeddings = vectors(20, 16)
+    database.add_members([(f"member{i}", e) for i, e in enumerate(embeddings)])
+    assert cache.sync() is True
+    assert isinstance(cache.matcher, CompactMatcher)
+    assert not cache.matcher.needs_refit
+    assert len(cache) == 20
+    assert cache.matcher.best_matches(embeddings[7])[0][0] == "member7"
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from compact_gallery import CompactMatcher
+from matcher import GalleryMatcher
+
+THRESHOLD = 0.6
+
+
+def test_best_match_and_empty_gallery(vectors):
+    embeddings = vectors(5)
+    matcher = GalleryMatcher(embeddings, ["a", "b", "c", "d", "e"])
+    name, similarity = matcher.best_matches(embeddings[3])[0]
+    assert name == "d" and similarity == pytest.approx(1.0, abs=1e-5)
+    assert GalleryMatcher().best_matches(embeddings[:2]) == [(None, -1.0), (None, -1.0)]
+
+
+def test_with_changes_replaces_and_removes_by_id(vectors):
+    a, b, c = vectors(3)
+    matcher = GalleryMatcher(np.stack([a, b]), ["a", "b"], [1, 2])
+    patched = matcher.with_changes(remove_ids=[1], embeddings=c[np.newaxis], names=["b"], ids=[2])
+    assert list(patched.ids) == [2]
+    assert patched.best_matches(c)[0][0] == "b"
+    # the original is untouched
+    assert len(matcher) == 2
+    assert matcher.with_changes(remove_ids=[1, 2]).best_matches(a) == [(None, -1.0)]
+
+
+def test_samples_rerank_the_best_candidates(vectors):
+    a, b, sample = vectors(3)
+    matcher = GalleryMatcher(np.stack([a, b]), ["a", "b"], [1, 2], samples={2: np.stack([b, sample])})
+    name, similarity = matcher.best_matches(sample)[0]
+    assert name == "b" and similarity == pytest.approx(1.0, abs=1e-5)
+
+
+@pytest.fixture
+def gallery(vectors):
+    return GalleryMatcher(vectors(2000), [f"member{i}" for i in range(2000)], range(2000))
+
+
+def test_ivf_grant_decisions_match_exact(gallery, vectors):
+    index = IVFIndex.build(gallery, nprobe=1, verify_threshold=THRESHOLD)
+    rng = np.random.default_rng(1)
+    members = gallery.matrix[rng.choice(len(gallery), 100, replace=False)]
+    queries = np.vstack([members + 0.3 * rng.normal(size=members.shape) / np.sqrt(gallery.dim),
+                         vectors(100)])
+
+    exact = gallery.best_matches(queries)
+    approx = index.best_matches(queries)
+    assert [s >= THRESHOLD for _, s in approx] == [s >= THRESHOLD for _, s in exact]
+    assert sum(s >= THRESHOLD for _, s in exact) == 100
+    # denied queries were re-scored against the whole gallery
+    for (name, similarity), (exact_name, exact_similarity) in zip(approx[100:], exact[100:]):
+        assert name == exact_name and similarity == pytest.approx(exact_similarity, abs=1e-5)
+
+
+def test_ivf_rebind_finds_new_members(gallery, vectors):
+    index = IVFIndex.build(gallery, verify_threshold=THRESHOLD)
+    newcomer = vectors(1)
+    patched = gallery.with_changes(remove_ids=[0], embeddings=newcomer, names=["newcomer"], ids=[5000])
+    rebound = index.rebind(patched)
+    assert len(rebound) == len(gallery)
+    assert rebound.best_matches(newcomer)[0][0] == "newcomer"
+    assert rebound.best_matches(gallery.matrix[0])[0][0] != "member0"
+
+
+def test_ivf_survives_save_and_load(gallery, tmp_path):
+    index = IVFIndex.build(gallery, nprobe=4)
+    path = str(tmp_path / "gallery.ivf.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path, gallery, nprobe=4)
+    assert loaded is not None
+    assert loaded.best_matches(gallery.matrix[:10]) == index.best_matches(gallery.matrix[:10])
+    # a gallery that no longer matches the saved lists is rejected
+    assert IVFIndex.load(path, gallery.with_changes(remove_ids=[0]), nprobe=4) is None
+
+
+@pytest.mark.parametrize("mode", ["float16", "int8"])
+def test_compact_matcher_agrees_with_exact(gallery, vectors, mode):
+    compact = CompactMatcher.build([(gallery.ids, gallery.names, gallery.matrix)], mode)
+    queries = gallery.matrix[:50]
+    assert [n for n, _ in compact.best_matches(queries)] == [n for n, _ in gallery.best_matches(queries)]
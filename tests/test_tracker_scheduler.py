@@ -0,0 +1,71 @@
+import numpy as np
+
+from scheduler import AdaptiveScheduler
+from tracker import FaceTracker
+
+
+def face(x, y=50, size=40):
+    return {"facial_area": {"x": x, "y": y, "w": size, "h": size}}
+
+
+def test_tracker_reuses_decisions_until_the_box_moves():
+    tracker = FaceTracker(refresh_interval=10.0)
+    first = tracker.assign([face(100)], now=0.0)[0]
+    assert first["needs_embedding"]
+    tracker.record(first["track_id"], {"name": "alice", "granted": True})
+
+    same = tracker.assign([face(102)], now=0.1)[0]
+    assert same["track_id"] == first["track_id"] and not same["needs_embedding"]
+    assert tracker.cached_result(same)["name"] == "alice"
+
+    moved = tracker.assign([face(115)], now=0.2)[0]
+    assert moved["track_id"] == first["track_id"] and moved["needs_embedding"]
+
+    refreshed = tracker.assign([face(115)], now=20.0)[0]
+    assert refreshed["track_id"] != first["track_id"]  # unseen for longer than max_age
+
+
+def test_tracker_keeps_tracks_across_slow_frames():
+    interval = [2.0]
+    tracker = FaceTracker(max_age=1.0, refresh_interval=10.0, interval=lambda: interval[0])
+    first = tracker.assign([face(100)], now=0.0)[0]
+    tracker.record(first["track_id"], {"name": "alice", "granted": True})
+    later = tracker.assign([face(100)], now=3.0)[0]
+    assert later["track_id"] == first["track_id"] and not later["needs_embedding"]
+
+
+def test_tracker_separates_two_faces():
+    tracker = FaceTracker()
+    faces = tracker.assign([face(0), face(300)], now=0.0)
+    assert faces[0]["track_id"] != faces[1]["track_id"]
+    again = tracker.assign([face(302), face(2)], now=0.1)
+    assert [f["track_id"] for f in again] == [faces[1]["track_id"], faces[0]["track_id"]]
+
+
+def job(frame, at):
+    return {"frame": frame, "captured_at": 1000.0 + at}
+
+
+def test_scheduler_slows_down_on_a_still_empty_scene():
+    scheduler = AdaptiveScheduler(cpu_budget=1.0, min_interval=0.05, idle_interval=2.0, hold=1.0)
+    still = np.zeros((120, 160, 3), dtype=np.uint8)
+    assert scheduler.should_process(job(still, 0.0))  # first frame counts as motion
+    assert scheduler.should_process(job(still, 0.5))  # still within `hold` of it
+    assert not scheduler.should_process(job(still, 1.6))
+    assert scheduler.state == "idle"
+    assert not scheduler.should_process(job(still, 2.4))
+    assert scheduler.should_process(job(still, 2.6))
+
+
+def test_scheduler_runs_often_while_something_moves():
+    scheduler = AdaptiveScheduler(cpu_budget=1.0, min_interval=0.05)
+    frames = [np.full((120, 160, 3), v, dtype=np.uint8) for v in (0, 200)]
+    processed = [scheduler.should_process(job(frames[i % 2], 0.1 * i)) for i in range(10)]
+    assert all(processed)
+    assert scheduler.state == "active"
+
+
+def test_scheduler_respects_the_cpu_budget():
+    scheduler = AdaptiveScheduler(cpu_budget=0.5, min_interval=0.05)
+    scheduler.observe({"captured_at": 0.0, "results": [{"granted": False}]}, seconds=0.2)
+    assert scheduler.current_interval() == 0.4
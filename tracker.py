@@ -0,0 +1,143 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+def box_iou(a: dict, b: dict) -> float:
+    """Intersection-over-union of two facial_area dicts ({x, y, w, h})."""
+    x1 = max(a["x"], b["x"])
+    y1 = max(a["y"], b["y"])
+    x2 = min(a["x"] + a["w"], b["x"] + b["w"])
+    y2 = min(a["y"] + a["h"], b["y"] + b["h"])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centre_distance(a: dict, b: dict) -> float:
+    dx = (a["x"] + a["w"] / 2) - (b["x"] + b["w"] / 2)
+    dy = (a["y"] + a["h"] / 2) - (b["y"] + b["h"] / 2)
+    return (dx * dx + dy * dy) ** 0.5
+
+
+class Track:
+    def __init__(self, track_id: int, box: dict, now: float):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = now
+        self.requested_at: Optional[float] = None
+        self.box_at_request: Optional[dict] = None
+        self.result: Optional[dict] = None
+
+
+class FaceTracker:
+    """Keeps a track id per face across frames so identities are not re-embedded every frame.
+
+    assign() matches new detections to existing tracks (greedy IoU, falling
+    back to centre distance for fast movement) and flags which faces need a
+    fresh embedding: a new track, a box that moved or resized substantially
+    since the last embedding, or a decision older than `refresh_interval`.
+    Everything else reuses the track's last decision via cached_result().
+
+    A track is dropped once unseen for `max_age` seconds. Only processed
+    frames refresh it, so with `interval` (a callable returning the current
+    seconds between processed frames, e.g. AdaptiveScheduler.current_interval)
+    `max_age` and `pending_timeout` are raised to twice that interval: an
+    idle scheduler would otherwise expire every track between two frames.
+
+    Safe to call from different pipeline stage threads.
+    """
+
+    def __init__(self, min_iou: float = 0.3, change_iou: float = 0.6, refresh_interval: float = 2.0,
+                 pending_timeout: float = 1.0, max_age: float = 1.0,
+                 interval: Optional[Callable[[], float]] = None):
+        self.min_iou = min_iou
+        self.change_iou = change_iou
+        self.refresh_interval = refresh_interval
+        self.pending_timeout = pending_timeout
+        self.max_age = max_age
+        self.interval = interval
+        self.tracks: Dict[int, Track] = {}
+        self.embeds_requested = 0
+        self.embeds_skipped = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def assign(self, faces: List[dict], now: Optional[float] = None) -> List[dict]:
+        """Set face["track_id"] and face["needs_embedding"] on each detected face (in place)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            pairs = []
+            for fi, face in enumerate(faces):
+                for track in self.tracks.values():
+                    iou = box_iou(face["facial_area"], track.box)
+                    if iou >= self.min_iou:
+                        pairs.append((iou, fi, track.track_id))
+                    elif _centre_distance(face["facial_area"], track.box) < 0.5 * max(track.box["w"], track.box["h"]):
+                        pairs.append((0.0, fi, track.track_id))
+            pairs.sort(key=lambda p: -p[0])
+
+            matched_faces, matched_tracks = {}, set()
+            for _, fi, track_id in pairs:
+                if fi in matched_faces or track_id in matched_tracks:
+                    continue
+                matched_faces[fi] = track_id
+                matched_tracks.add(track_id)
+
+            for fi, face in enumerate(faces):
+                box = face["facial_area"]
+                track = self.tracks.get(matched_faces.get(fi))
+                if track is None:
+                    track = Track(next(self._ids), box, now)
+                    self.tracks[track.track_id] = track
+                track.box = box
+                track.last_seen = now
+                face["track_id"] = track.track_id
+                face["needs_embedding"] = self._needs_embedding(track, box, now)
+                if face["needs_embedding"]:
+                    track.requested_at = now
+                    track.box_at_request = box
+                    self.embeds_requested += 1
+                else:
+                    self.embeds_skipped += 1
+        return faces
+
+    def _stretched(self, seconds: float) -> float:
+        return max(seconds, 2 * self.interval()) if self.interval is not None else seconds
+
+    def _needs_embedding(self, track: Track, box: dict, now: float) -> bool:
+        if track.requested_at is None:
+            return True
+        if track.result is None:
+            # An embedding is in flight; ask again only if it seems to have been dropped
+            return now - track.requested_at > self._stretched(self.pending_timeout)
+        if box_iou(box, track.box_at_request) < self.change_iou:
+            return True
+        return now - track.requested_at > self.refresh_interval
+
+    def _expire(self, now: float) -> None:
+        max_age = self._stretched(self.max_age)
+        for track_id in [t.track_id for t in self.tracks.values() if now - t.last_seen > max_age]:
+            del self.tracks[track_id]
+
+    def record(self, track_id: int, result: dict) -> None:
+        """Store the decision computed from a fresh embedding for this track."""
+        with self._lock:
+            track = self.tracks.get(track_id)
+            if track is not None:
+                track.result = result
+
+    def cached_result(self, face: dict) -> Optional[dict]:
+        """The track's last decision, moved to the face's current box (None if unknown)."""
+        with self._lock:
+            track = self.tracks.get(face.get("track_id"))
+            if track is None or track.result is None:
+                return None
+            return dict(track.result, region=face["facial_area"], cached=True)
+
+    @property
+    def skip_ratio(self) -> float:
+        total = self.embeds_requested + self.embeds_skipped
+        return self.embeds_skipped / total if total else 0.0
@@ -1,24 +1,57 @@
-import math
-from typing import Iterable
-
-
-def cosine_similarity(v1: Iterable[float], v2: Iterable[float]) -> float:
-    """Calculate cosine similarity between two equal-length vectors.
-
-    Returns 0.0 if either vector has zero magnitude.
-    Accepts any iterable of numbers (lists, tuples, generators).
-    """
-    x = list(v1)
-    y = list(v2)
-
-    if len(x) != len(y):
-        raise ValueError("Vectors must be the same length")
-
-    dot = sum(a * b for a, b in zip(x, y))
-    norm_x = math.sqrt(sum(a * a for a in x))
-    norm_y = math.sqrt(sum(b * b for b in y))
-
-    if norm_x == 0 or norm_y == 0:
-        return 0.0
-
-    return dot / (norm_x * norm_y)
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+
+def cosine_similarity(v1: Iterable[float], v2: Iterable[float]) -> float:
+    """Calculate cosine similarity between two equal-length vectors.
+
+    Returns 0.0 if either vector has zero magnitude.
+    Accepts any iterable of numbers (lists, tuples, generators).
+    """
+    x = list(v1)
+    y = list(v2)
+
+    if len(x) != len(y):
+        raise ValueError("Vectors must be the same length")
+
+    dot = sum(a * b for a, b in zip(x, y))
+    norm_x = math.sqrt(sum(a * a for a in x))
+    norm_y = math.sqrt(sum(b * b for b in y))
+
+    if norm_x == 0 or norm_y == 0:
+        return 0.0
+
+    return dot / (norm_x * norm_y)
+
+
+class PhaseTimer:
+    """Wall-clock duration of named startup phases, reported as one line.
+
+    `start` is a time.perf_counter() value (default: now), so a script can
+    take it before its own imports and count them as the first phase.
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - begin)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases.append((name, seconds))
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def format(self) -> str:
+        parts = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        return f"Startup took {self.total:.2f}s: {parts}"